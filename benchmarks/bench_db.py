@@ -0,0 +1,267 @@
+"""
+Бенчмарк методов DatabaseManager на больших объемах данных.
+
+База наполняется seeder'ом до каждого масштаба по очереди (1M, 10M,
+50M отзывов - дозаписью), после каждого наполнения каждый метод
+вызывается --repeat раз подряд с аргументами, похожими на боевые:
+популярные номера ищут чаще, пользователи - из наполненных. Итог -
+таблица p50/p99 по методам и масштабам и рост p99 от первого масштаба
+к последнему: видно, какой запрос сломается первым.
+
+Методу дается не больше --budget секунд на масштаб: тяжелые запросы
+(полный перебор номеров, рассылка по всем) успевают меньше повторов.
+
+Использование:
+    python -m benchmarks.bench_db [--scales 1M,10M,50M] [--repeat 200] [--methods get_reviews_by_plate,...]
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/postgres python -m benchmarks.bench_db --scales 1M
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from benchmarks.postgres import disposable_database
+from benchmarks.scenarios import make_missing_plate, make_plate
+from benchmarks.seeder import FIRST_SCALE_USER_ID, PLATE_ZIPF, ScaleSeeder, parse_count
+from benchmarks.stats import percentile
+from benchmarks.workload import ZipfSampler
+from config import config
+from database.db_manager import DatabaseManager, db
+from database.slow_query import slow_query_log
+from utils.fingerprint import fingerprint, simhash_bands
+from utils.logger import logger
+
+# Служебные методы: не запросы бота
+SKIPPED_METHODS = {'init_pool', 'close_pool', 'init_tables', 'acquire'}
+
+
+class Arguments:
+    """Аргументы вызовов на текущем масштабе"""
+
+    def __init__(self, reviews: int, users: int, plates: int, plate_zipf: float, seed: int):
+        self.rng = random.Random(seed)
+        self.reviews = reviews
+        self.users = users
+        self.plates = plates
+        self._popular = ZipfSampler(plates, plate_zipf, self.rng)
+
+    def review_id(self) -> int:
+        return self.rng.randint(1, self.reviews)
+
+    def user_id(self) -> int:
+        return FIRST_SCALE_USER_ID + self.rng.randrange(self.users)
+
+    def plate(self) -> str:
+        """Номер с учетом популярности: так ищут живые пользователи"""
+        return make_plate(self._popular.sample())
+
+    def rare_plate(self) -> str:
+        """Номер из длинного хвоста"""
+        return make_plate(self.rng.randrange(self.plates // 2, self.plates))
+
+    def text(self) -> str:
+        return f"Бенчмарк {self.rng.getrandbits(32)}"
+
+
+def _fingerprint_args(a: Arguments) -> tuple:
+    fp = fingerprint(a.text())
+    return fp.text_hash, simhash_bands(fp.simhash)
+
+
+def _save_fingerprint_args(a: Arguments) -> tuple:
+    simhash = a.rng.getrandbits(63)
+    # У наполненных отзывов отпечаток уже есть: замеряется путь ON CONFLICT DO NOTHING
+    return (a.review_id(), a.user_id(), a.plate(), a.rng.getrandbits(63), simhash, simhash_bands(simhash))
+
+
+# Метод -> аргументы одного вызова
+CASES: Dict[str, Callable[[Arguments], tuple]] = {
+    'create_or_update_user': lambda a: (a.user_id(), 'bench', 'Bench User'),
+    'get_user': lambda a: (a.user_id(),),
+    'is_user_banned': lambda a: (a.user_id(),),
+    'mark_user_unreachable': lambda a: (a.user_id(),),
+    'mark_user_reachable': lambda a: (a.user_id(),),
+    'get_users_to_reprobe': lambda a: (500, 24),
+    'touch_reachability_check': lambda a: ([a.user_id() for _ in range(100)],),
+    'get_broadcast_recipients': lambda a: (),
+    'create_review': lambda a: (a.plate(), a.rng.randint(1, 5), a.text(), a.user_id()),
+    'get_reviews_by_plate': lambda a: (a.plate(),),
+    'get_review_stats': lambda a: (a.plate(),),
+    'iter_reviewed_plates': lambda a: (),
+    'get_reviewed_plates_after': lambda a: (a.review_id(), 10000),
+    'get_reviews_max_id': lambda a: (),
+    'estimate_review_count': lambda a: (),
+    'delete_reviews_by_plate': lambda a: (a.rare_plate(),),
+    'find_duplicate_candidates': _fingerprint_args,
+    'count_recent_user_plate_reviews': lambda a: (a.user_id(), a.plate(), 24),
+    'save_review_fingerprint': _save_fingerprint_args,
+    'get_duplicate_clusters': lambda a: (10,),
+    'subscribe_to_plate': lambda a: (a.user_id(), a.plate()),
+    'unsubscribe_from_plate': lambda a: (a.user_id(), a.plate()),
+    'get_user_subscriptions': lambda a: (a.user_id(),),
+    'get_plate_subscribers': lambda a: (a.plate(),),
+    'get_user_subscription_tier': lambda a: (a.user_id(),),
+    'set_user_subscription': lambda a: (a.user_id(), 'premium', 30),
+    'increment_usage': lambda a: (a.user_id(), a.rng.choice(('search', 'review'))),
+    'get_daily_usage': lambda a: (a.user_id(),),
+    'get_admin_stats': lambda a: (),
+    'set_car_reaction': lambda a: (a.plate(), a.user_id(), a.rng.choice(('like', 'dislike'))),
+    'get_car_reactions': lambda a: (a.plate(),),
+    'get_user_reaction': lambda a: (a.plate(), a.user_id()),
+    'save_query_plan': lambda a: ('bench', 'SELECT 1', 'bench', 1.0, None, [], '{}'),
+    'get_slow_query_summary': lambda a: (10,),
+    'get_query_plan': lambda a: (1,),
+}
+# Поиск отсутствующего номера - отдельная строка отчета
+MISS_CASES = {'get_reviews_by_plate_miss': lambda a: (make_missing_plate(a.rng),)}
+
+
+def public_methods() -> List[str]:
+    """Запросы DatabaseManager: публичные корутины и асинхронные генераторы"""
+    return [
+        name for name, member in vars(DatabaseManager).items()
+        if not name.startswith('_') and name not in SKIPPED_METHODS
+        and (inspect.iscoroutinefunction(member) or inspect.isasyncgenfunction(member))
+    ]
+
+
+async def call(method: Callable[..., Any], args: tuple):
+    result = method(*args)
+    if inspect.isasyncgen(result):
+        async for _ in result:
+            pass
+    else:
+        await result
+
+
+async def bench_method(method: Callable[..., Awaitable], make_args: Callable[[Arguments], tuple],
+                       arguments: Arguments, repeat: int, budget: float) -> Dict[str, Any]:
+    """Задержки в миллисекундах; ошибки считаются отдельно"""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + budget
+    for _ in range(repeat):
+        args = make_args(arguments)
+        start = time.perf_counter()
+        try:
+            await call(method, args)
+        except Exception as e:
+            errors += 1
+            logger.warning("Ошибка %s%s: %s", method.__name__, args, e)
+        else:
+            latencies.append((time.perf_counter() - start) * 1000)
+        if time.perf_counter() >= deadline:
+            break
+    values = sorted(latencies)
+    return {
+        'calls': len(values),
+        'errors': errors,
+        'p50': round(percentile(values, 50), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'max': round(values[-1], 2) if values else 0.0,
+    }
+
+
+def selected_cases(names: Optional[List[str]]) -> Dict[str, Callable[[Arguments], tuple]]:
+    cases = {**CASES, **MISS_CASES}
+    if names:
+        cases = {name: cases[name] for name in names}
+    return cases
+
+
+async def run(args) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    cases = selected_cases(args.methods)
+    results: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    async with disposable_database() as database_url:
+        config.DATABASE_URL = database_url
+        # Журнал медленных запросов и фоновые EXPLAIN ANALYZE искажают замеры
+        slow_query_log.threshold = 0
+        await db.init_pool()
+        try:
+            await db.init_tables()
+            seeder = ScaleSeeder(db.pool, args.seed, args.zipf)
+            for scale in args.scales:
+                print(f"⏳ Наполнение до {scale:,} отзывов...")
+                started = time.perf_counter()
+                await seeder.grow_to(scale, db.init_tables)
+                print(f"   готово за {time.perf_counter() - started:.0f} с")
+
+                users, plates = seeder.targets(scale)
+                arguments = Arguments(scale, users, plates, args.zipf, args.seed)
+                results[scale] = {}
+                for name, make_args in cases.items():
+                    method = getattr(db, name.removesuffix('_miss'))
+                    results[scale][name] = await bench_method(
+                        method, make_args, arguments, args.repeat, args.budget
+                    )
+                    r = results[scale][name]
+                    print(f"   {name:<34} p50 {r['p50']:>9.2f}  p99 {r['p99']:>9.2f} мс  ({r['calls']} выз.)")
+        finally:
+            await db.close_pool()
+    return results
+
+
+def format_report(results: Dict[int, Dict[str, Dict[str, Any]]], slow_ms: float) -> str:
+    """Таблица p50/p99 по масштабам; методы по убыванию p99 на последнем масштабе"""
+    scales = list(results)
+    last = results[scales[-1]]
+    names = sorted(last, key=lambda name: last[name]['p99'], reverse=True)
+
+    header = f"{'метод':<34}" + ''.join(f"{_scale_label(s) + ' p50/p99 мс':>24}" for s in scales) + f"{'рост p99':>10}"
+    lines = [header, '-' * len(header)]
+    for name in names:
+        cells = ''.join(
+            f"{results[s][name]['p50']:>11.2f} /{results[s][name]['p99']:>10.2f}" for s in scales
+        )
+        first, final = results[scales[0]][name]['p99'], last[name]['p99']
+        growth = f"x{final / first:.1f}" if first > 0 else '-'
+        mark = ' ⚠️' if final >= slow_ms else ''
+        lines.append(f"{name:<34}{cells}{growth:>10}{mark}")
+    return '\n'.join(lines)
+
+
+def _scale_label(scale: int) -> str:
+    return f"{scale // 1_000_000}M" if scale % 1_000_000 == 0 else f"{scale // 1000}k"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк методов БД на больших объемах")
+    parser.add_argument('--scales', default='1M,10M,50M',
+                        type=lambda s: sorted(parse_count(part) for part in s.split(',') if part.strip()),
+                        help="число отзывов через запятую (1M, 500k...)")
+    parser.add_argument('--methods', type=lambda s: [name.strip() for name in s.split(',') if name.strip()],
+                        help="только эти методы (по умолчанию все)")
+    parser.add_argument('--repeat', type=int, default=200, help="вызовов метода на масштаб")
+    parser.add_argument('--budget', type=float, default=60, help="секунд на метод на масштаб")
+    parser.add_argument('--zipf', type=float, default=PLATE_ZIPF, help="показатель Ципфа популярности номеров")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--slow-ms', type=float, default=100, help="отметить методы с p99 не меньше, мс")
+    parser.add_argument('--json', help="сохранить результаты в файл")
+    parser.add_argument('--log-level', default='ERROR', help="уровень логов бота на время прогона")
+    args = parser.parse_args()
+
+    known = selected_cases(None)
+    unknown = [name for name in args.methods or () if name not in known]
+    if unknown:
+        parser.error(f"неизвестные методы: {', '.join(unknown)}")
+    uncovered = [name for name in public_methods() if name not in known]
+    if uncovered:
+        print(f"⚠️ Методы без сценария (не замеряются): {', '.join(uncovered)}")
+
+    logger.setLevel(getattr(logging, args.log_level.upper(), logging.ERROR))
+    results = asyncio.run(run(args))
+
+    print()
+    print(format_report(results, args.slow_ms))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({str(scale): methods for scale, methods in results.items()}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
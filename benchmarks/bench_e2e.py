@@ -0,0 +1,199 @@
+"""
+Сквозной бенчмарк бота: обновления идут через Dispatcher.feed_update
+со всеми middleware, FSM и настоящей PostgreSQL, запросы к Bot API -
+в локальный фейковый сервер.
+
+База одноразовая (benchmarks/postgres.py): свой кластер через initdb или
+временная база на сервере из BENCH_DATABASE_URL.
+
+Для каждого сценария печатаются пропускная способность и p50/p95/p99.
+С --baseline прогон сравнивается с сохраненным и завершается с кодом 1,
+если какой-то сценарий стал хуже больше чем на --tolerance.
+
+Использование:
+    python -m benchmarks.bench_e2e [--scenarios search_hit,broadcast] [--ops 500] [--concurrency 20]
+    python -m benchmarks.bench_e2e --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_e2e --baseline benchmarks/baseline.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.postgres import disposable_database
+from benchmarks.scenarios import ADMIN_USER_ID, SCENARIOS, BenchContext, Broadcast, Scenario, seed
+from benchmarks.stats import ScenarioResult, find_regressions, format_table, load_results, save_results
+from bot import create_bot, create_dispatcher
+from config import config
+from database.db_manager import db
+from database.slow_query import slow_query_log
+from utils import background
+from utils.logger import logger
+from utils.outbound import outbound
+from utils.plate_filter import plate_filter
+
+BENCH_TOKEN = '123456789:BENCHMARK-fake-token-for-local-api'
+
+
+async def drive(ctx: BenchContext, scenario: Scenario, ops: int, concurrency: int,
+                latencies: List[float]) -> int:
+    """Выполняет ops операций в concurrency потоков; возвращает число ошибок"""
+    remaining = ops
+    errors = 0
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                await scenario.run_op(ctx)
+            except Exception as e:
+                errors += 1
+                logger.warning("Ошибка операции %s: %s", scenario.name, e)
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return errors
+
+
+async def run_scenario(ctx: BenchContext, scenario: Scenario, args) -> ScenarioResult:
+    if isinstance(scenario, Broadcast):
+        latencies = await scenario.run(ctx, args.broadcast_timeout)
+        if latencies is None:
+            return ScenarioResult.from_latencies(scenario.name, [], 1, 0.0, 0)
+        return ScenarioResult.from_latencies(
+            scenario.name, latencies, 0, max(latencies, default=0.0), sum(ctx.api.calls.values())
+        )
+
+    await drive(ctx, scenario, args.warmup, args.concurrency, [])
+
+    concurrency = ctx.dp['concurrency']
+    timeouts = concurrency.timeouts
+    ctx.api.reset()
+    latencies: List[float] = []
+    started = time.perf_counter()
+    errors = await drive(ctx, scenario, args.ops, args.concurrency, latencies)
+    duration = time.perf_counter() - started
+    errors += concurrency.timeouts - timeouts
+    return ScenarioResult.from_latencies(
+        scenario.name, latencies, errors, duration, sum(ctx.api.calls.values())
+    )
+
+
+@asynccontextmanager
+async def bench_environment(args) -> AsyncIterator[BenchContext]:
+    """Фейковый Bot API, одноразовая база с данными, бот и диспетчер"""
+    api = FakeTelegramServer(latency=args.api_latency / 1000, jitter=args.api_jitter / 1000)
+    await api.start()
+    try:
+        async with disposable_database() as database_url:
+            # Бенчмарк работает только со своей базой и своим фейковым Telegram
+            config.DATABASE_URL = database_url
+            config.BOT_TOKEN = BENCH_TOKEN
+            config.ADMIN_ID = ADMIN_USER_ID
+            config.THROTTLE_ENABLED = args.throttle
+            # Журнал медленных запросов и фоновые EXPLAIN ANALYZE искажают замеры
+            slow_query_log.threshold = 0
+            outbound.rate = args.outbound_rate
+            outbound.burst = max(outbound.burst, int(args.outbound_rate // 10))
+
+            bot = create_bot(session=api.session())
+            dp = create_dispatcher()
+            await db.init_pool()
+            try:
+                await db.init_tables()
+                ctx = BenchContext(bot, dp, api, users=args.users, plates=args.plates)
+
+                print(f"⏳ Наполнение БД: {args.users} пользователей, {args.plates} номеров...")
+                await seed(ctx, args.reviews_per_plate, args.subscribers)
+                if config.PLATE_FILTER_ENABLED:
+                    plate_filter.start(db)
+                    while not plate_filter.ready:
+                        await asyncio.sleep(0.05)
+                yield ctx
+            finally:
+                await background.drain(5)
+                await plate_filter.stop()
+                await dp.storage.close()
+                await db.close_pool()
+                await bot.session.close()
+    finally:
+        await api.stop()
+
+
+async def run(args) -> List[ScenarioResult]:
+    async with bench_environment(args) as ctx:
+        results = []
+        for name in args.scenarios:
+            print(f"▶️  {name}...")
+            results.append(await run_scenario(ctx, SCENARIOS[name], args))
+        return results
+
+
+def add_environment_arguments(parser: argparse.ArgumentParser):
+    """Параметры окружения, общие для бенчмарка и генератора нагрузки"""
+    parser.add_argument('--users', type=int, default=1000, help="пользователей в БД")
+    parser.add_argument('--plates', type=int, default=500, help="номеров с отзывами")
+    parser.add_argument('--reviews-per-plate', type=int, default=5, help="до стольких отзывов на номер")
+    parser.add_argument('--subscribers', type=int, default=2, help="подписчиков на номер")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument('--api-jitter', type=float, default=0.0, help="случайная добавка к задержке, мс")
+    parser.add_argument('--outbound-rate', type=float, default=10000,
+                        help="лимит планировщика исходящих, запросов/с (в проде OUTBOUND_RATE)")
+    parser.add_argument('--throttle', action='store_true', help="включить анти-флуд")
+    parser.add_argument('--log-level', default='WARNING', help="уровень логов бота на время прогона")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк бота")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        type=lambda s: [name.strip() for name in s.split(',') if name.strip()],
+                        help=f"через запятую: {', '.join(SCENARIOS)}")
+    parser.add_argument('--ops', type=int, default=500, help="операций на сценарий")
+    parser.add_argument('--warmup', type=int, default=20, help="операций прогрева (не учитываются)")
+    parser.add_argument('--concurrency', type=int, default=20, help="одновременных пользователей")
+    add_environment_arguments(parser)
+    parser.add_argument('--broadcast-timeout', type=float, default=120, help="секунд на рассылку")
+    parser.add_argument('--json', help="сохранить результаты в файл")
+    parser.add_argument('--save-baseline', help="сохранить результаты как базовый прогон")
+    parser.add_argument('--baseline', help="сравнить с базовым прогоном")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="допустимое ухудшение относительно базового прогона (доля)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(unknown)}")
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f"нет файла базового прогона: {args.baseline}")
+
+    logger.setLevel(getattr(logging, args.log_level.upper(), logging.WARNING))
+    results = asyncio.run(run(args))
+
+    print()
+    print(format_table(results))
+
+    if args.json:
+        save_results(results, args.json)
+    if args.save_baseline:
+        save_results(results, args.save_baseline)
+        print(f"\n💾 Базовый прогон сохранен: {args.save_baseline}")
+    if args.baseline:
+        problems = find_regressions(results, load_results(args.baseline), args.tolerance)
+        if problems:
+            print(f"\n❌ Ухудшения больше {args.tolerance:.0%}:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"\n✅ В пределах {args.tolerance:.0%} от базового прогона")
+
+
+if __name__ == '__main__':
+    main()
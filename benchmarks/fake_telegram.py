@@ -0,0 +1,168 @@
+"""
+Локальная замена Telegram Bot API для бенчмарков.
+
+aiohttp-сервер принимает запросы бота по тем же путям, что и
+api.telegram.org (/bot<token>/<method>), запоминает каждый вызов и
+отвечает правдоподобным результатом. Задержка ответа задается, чтобы
+видеть, как бот ведет себя при медленном Telegram.
+
+Сервер работает в своем потоке со своим event loop: его разбор запросов
+не должен попадать в замеры бота.
+
+    api = FakeTelegramServer(latency=0.05)
+    await api.start()
+    bot = create_bot(session=api.session())
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+BOT_ID = 100000001
+BOT_USER = {'id': BOT_ID, 'is_bot': True, 'first_name': 'Bench Bot', 'username': 'bench_bot'}
+
+# Методы, которые возвращают отправленное или измененное сообщение
+MESSAGE_METHODS = {
+    'sendmessage', 'sendphoto', 'sendvideo', 'senddocument', 'sendlocation',
+    'editmessagetext', 'editmessagecaption', 'editmessagereplymarkup',
+}
+
+
+@dataclass
+class ApiCall:
+    """Один запрос бота"""
+    method: str
+    chat_id: Optional[int]
+    at: float
+    text: Optional[str] = None
+    callback_query_id: Optional[str] = None
+    # Когда запрос пришел (at - когда на него ответили)
+    received: float = 0.0
+
+
+class FakeTelegramServer:
+    """Сервер Bot API, который ничего не доставляет"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.host = host
+        self.port = port
+        # Вызывается в потоке сервера на каждый запрос
+        self.on_call: Optional[Callable[[ApiCall], None]] = None
+        self.calls: Counter = Counter()
+        self.log: List[ApiCall] = []
+        self._message_ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def session(self) -> AiohttpSession:
+        """Сессия бота, направленная на этот сервер"""
+        return AiohttpSession(api=TelegramAPIServer.from_base(self.url))
+
+    async def start(self):
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, args=(ready,), name='fake-telegram', daemon=True)
+        self._thread.start()
+        await asyncio.to_thread(ready.wait)
+        if self._error:
+            raise self._error
+
+    async def stop(self):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    def _serve(self, ready: threading.Event):
+        """Поток сервера"""
+        loop = self._loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._setup())
+        except BaseException as e:
+            self._error = e
+            ready.set()
+            loop.close()
+            return
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(self._runner.cleanup())
+            loop.close()
+
+    async def _setup(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def reset(self):
+        """Забывает вызовы (между сценариями)"""
+        self.calls.clear()
+        self.log.clear()
+
+    async def wait_for(self, method: str, count: int, timeout: float) -> bool:
+        """Ждет, пока метод вызовут count раз; False по таймауту"""
+        method = method.lower()
+        deadline = time.monotonic() + timeout
+        while self.calls[method] < count:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        received = time.perf_counter()
+        method = request.match_info['method'].lower()
+        form = await request.post()
+        chat_id = form.get('chat_id')
+        chat_id = int(chat_id) if chat_id and str(chat_id).lstrip('-').isdigit() else None
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.random() * self.jitter)
+
+        call = ApiCall(method, chat_id, time.perf_counter(),
+                       text=form.get('text') or form.get('caption'),
+                       callback_query_id=form.get('callback_query_id'), received=received)
+        self.calls[method] += 1
+        self.log.append(call)
+        if self.on_call:
+            self.on_call(call)
+        return web.json_response({'ok': True, 'result': self._result(method, form, chat_id)})
+
+    def _result(self, method: str, form, chat_id: Optional[int]) -> Any:
+        if method == 'getme':
+            return BOT_USER
+        if method == 'getchat':
+            return {'id': chat_id or 0, 'type': 'private', 'accent_color_id': 0, 'max_reaction_count': 0}
+        if method not in MESSAGE_METHODS:
+            return True
+        message_id = form.get('message_id')
+        message: Dict[str, Any] = {
+            'message_id': int(message_id) if message_id else next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id or 0, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if 'text' in form:
+            message['text'] = form['text']
+        return message
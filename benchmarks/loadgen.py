@@ -0,0 +1,359 @@
+"""
+Генератор нагрузки: кривая насыщения одного процесса бота.
+
+Поток обновлений (benchmarks/workload.py) подается ступенями с заданной
+частотой: 25, 50, 100... обновлений в секунду. Частота выдерживается
+независимо от ответов бота (открытая модель), задержка считается от
+запланированного момента отправки - отставание генератора тоже видно
+в p99. На каждой ступени: достигнутая частота и p50/p95/p99. Ступень
+"max" - без ограничения частоты, --concurrency пользователей шлют
+обновления подряд.
+
+Цели:
+- direct: в этом же процессе через Dispatcher.feed_update, с одноразовой
+  базой и фейковым Bot API, как в benchmarks.bench_e2e;
+- webhook: POST на вебхук запущенного инстанса. Генератор поднимает
+  фейковый Bot API на --api-port, бот нужно запустить с
+  TELEGRAM_API_URL=http://127.0.0.1:<api-port> и большим OUTBOUND_RATE.
+  Задержка - до первого ответа бота на это обновление: ответа на callback
+  или запроса в чат пользователя после отправки, кроме уведомлений.
+
+Использование:
+    python -m benchmarks.loadgen --rates 50,100,200,400,800 --step-duration 30
+    python -m benchmarks.loadgen --mix search=80,react=20 --rates max --concurrency 50
+    python -m benchmarks.loadgen --target webhook --url http://127.0.0.1:8080/webhook --secret ...
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from benchmarks.bench_e2e import add_environment_arguments, bench_environment
+from benchmarks.fake_telegram import ApiCall, FakeTelegramServer
+from benchmarks.scenarios import FIRST_USER_ID, BenchContext, UpdateFactory
+from benchmarks.stats import percentile
+from benchmarks.workload import DEFAULT_MIX, Workload, parse_mix
+from utils.logger import logger
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Исходы отправки одного обновления
+OK, ERROR, REJECTED, TIMEOUT = 'ok', 'error', 'rejected', 'timeout'
+
+# Уведомления подписчикам - не ответ на обновление получателя
+NOTIFICATION_MARK = '🔔'
+
+
+class DirectTarget:
+    """Обновления в диспетчер этого процесса"""
+
+    def __init__(self, ctx: BenchContext):
+        self.ctx = ctx
+
+    async def send(self, user_id: int, raw: Dict[str, Any]) -> Tuple[str, float]:
+        try:
+            await self.ctx.feed(self.ctx.updates.validate(raw))
+        except Exception as e:
+            logger.warning("Ошибка обработки обновления: %s", e)
+            return ERROR, time.perf_counter()
+        return OK, time.perf_counter()
+
+    def timeouts(self) -> int:
+        """Обновления, не уложившиеся в дедлайн ConcurrencyMiddleware"""
+        return self.ctx.dp['concurrency'].timeouts
+
+
+class WebhookTarget:
+    """Обновления на вебхук запущенного инстанса; ответ ловит фейковый Bot API"""
+
+    def __init__(self, url: str, secret: str, api: FakeTelegramServer, timeout: float):
+        self.url = url
+        self.secret = secret
+        self.api = api
+        self.timeout = timeout
+        # user_id -> (ответ, момент отправки)
+        self._waiting: Dict[int, Tuple[asyncio.Future, float]] = {}
+        # id callback'а -> user_id
+        self._callbacks: Dict[str, int] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._session = aiohttp.ClientSession(headers={SECRET_HEADER: self.secret})
+        self.api.on_call = lambda call: self._loop.call_soon_threadsafe(self._on_call, call)
+
+    async def stop(self):
+        self.api.on_call = None
+        if self._session:
+            await self._session.close()
+
+    def _on_call(self, call: ApiCall):
+        """Первый запрос бота, отвечающий на ожидаемое обновление"""
+        if call.callback_query_id is not None:
+            user_id = self._callbacks.get(call.callback_query_id)
+        else:
+            user_id = call.chat_id
+            if call.text and call.text.startswith(NOTIFICATION_MARK):
+                return
+        waiting = self._waiting.get(user_id)
+        if waiting is None:
+            return
+        future, posted_at = waiting
+        # Запросы, пришедшие до отправки, относятся к предыдущему обновлению
+        if call.received >= posted_at and not future.done():
+            future.set_result(call.at)
+
+    async def send(self, user_id: int, raw: Dict[str, Any]) -> Tuple[str, float]:
+        future = self._loop.create_future()
+        callback_id = (raw.get('callback_query') or {}).get('id')
+        if callback_id is not None:
+            self._callbacks[callback_id] = user_id
+        self._waiting[user_id] = (future, time.perf_counter())
+        try:
+            async with self._session.post(self.url, json=raw) as response:
+                if response.status == 503:
+                    return REJECTED, time.perf_counter()
+                if response.status != 200:
+                    return ERROR, time.perf_counter()
+            return OK, await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return TIMEOUT, time.perf_counter()
+        except aiohttp.ClientError as e:
+            logger.warning("Ошибка отправки на вебхук: %s", e)
+            return ERROR, time.perf_counter()
+        finally:
+            if callback_id is not None:
+                self._callbacks.pop(callback_id, None)
+            if user_id in self._waiting and self._waiting[user_id][0] is future:
+                del self._waiting[user_id]
+
+    def timeouts(self) -> int:
+        return 0
+
+
+@dataclass
+class StepResult:
+    """Одна ступень кривой; задержки в миллисекундах"""
+    offered: Optional[float]
+    achieved: float
+    sent: int
+    completed: int
+    p50: float
+    p95: float
+    p99: float
+    errors: int
+    rejected: int
+    timeouts: int
+    starved: int
+    sustained: bool = False
+
+
+class LoadRunner:
+    """Подает поток обновлений на цель ступенями"""
+
+    def __init__(self, workload: Workload, target, drain: float):
+        self.workload = workload
+        self.target = target
+        self.drain = drain
+
+    async def run_step(self, rate: Optional[float], duration: float, concurrency: int) -> StepResult:
+        latencies: List[float] = []
+        outcomes: Dict[str, int] = dict.fromkeys((OK, ERROR, REJECTED, TIMEOUT), 0)
+        tasks = set()
+        sent = starved = in_window = 0
+        timeouts_before = self.target.timeouts()
+        start = time.perf_counter()
+        end = start + duration
+
+        async def one(user_id: int, raw: Dict[str, Any], scheduled: float):
+            nonlocal in_window
+            try:
+                outcome, finished = await self.target.send(user_id, raw)
+                outcomes[outcome] += 1
+                if outcome == OK:
+                    latencies.append(finished - scheduled)
+                    if finished <= end:
+                        in_window += 1
+            finally:
+                self.workload.done(user_id)
+
+        if rate:
+            # Открытая модель: отправка по расписанию, не дожидаясь ответов
+            interval = 1 / rate
+            scheduled = start
+            while scheduled < end:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                item = self.workload.next_update()
+                if item is None:
+                    starved += 1
+                else:
+                    sent += 1
+                    task = asyncio.create_task(one(*item, scheduled))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                scheduled += interval
+        else:
+            # Закрытая модель: concurrency пользователей шлют подряд
+            async def worker():
+                nonlocal sent
+                while time.perf_counter() < end:
+                    item = self.workload.next_update()
+                    if item is None:
+                        await asyncio.sleep(0.001)
+                        continue
+                    sent += 1
+                    await one(*item, time.perf_counter())
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        if tasks:
+            _, pending = await asyncio.wait(set(tasks), timeout=self.drain)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            outcomes[TIMEOUT] += len(pending)
+
+        ms = sorted(v * 1000 for v in latencies)
+        return StepResult(
+            offered=rate,
+            achieved=round(in_window / duration, 1),
+            sent=sent,
+            completed=outcomes[OK],
+            p50=round(percentile(ms, 50), 2),
+            p95=round(percentile(ms, 95), 2),
+            p99=round(percentile(ms, 99), 2),
+            errors=outcomes[ERROR],
+            rejected=outcomes[REJECTED],
+            timeouts=outcomes[TIMEOUT] + self.target.timeouts() - timeouts_before,
+            starved=starved,
+        )
+
+
+def is_sustained(step: StepResult, p99_limit: float) -> bool:
+    """Процесс держит ступень: частота достигнута, p99 в норме, без потерь"""
+    if step.rejected or step.timeouts or step.errors:
+        return False
+    if step.offered and step.achieved < step.offered * 0.95:
+        return False
+    return step.p99 <= p99_limit
+
+
+def format_curve(steps: List[StepResult]) -> str:
+    header = (f"{'подано/с':>10}{'обработано/с':>14}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}"
+              f"{'ошиб.':>7}{'отказ':>7}{'таймаут':>9}{'нет польз.':>12}")
+    lines = [header, '-' * len(header)]
+    for s in steps:
+        offered = f"{s.offered:.0f}" if s.offered else 'max'
+        mark = '✅' if s.sustained else '❌'
+        lines.append(
+            f"{offered:>10}{s.achieved:>14.1f}{s.p50:>10.2f}{s.p95:>10.2f}{s.p99:>10.2f}"
+            f"{s.errors:>7}{s.rejected:>7}{s.timeouts:>9}{s.starved:>12}  {mark}"
+        )
+    return '\n'.join(lines)
+
+
+def parse_rates(text: str) -> List[Optional[float]]:
+    return [None if part.strip() == 'max' else float(part) for part in text.split(',') if part.strip()]
+
+
+async def run_curve(args, workload: Workload, target) -> List[StepResult]:
+    runner = LoadRunner(workload, target, args.drain)
+    if args.warmup > 0:
+        print(f"⏳ Прогрев {args.warmup:.0f} с...")
+        await runner.run_step(args.rates[0], args.warmup, args.concurrency)
+
+    steps = []
+    for rate in args.rates:
+        print(f"▶️  {f'{rate:.0f} обн/с' if rate else 'max'} на {args.step_duration:.0f} с...")
+        step = await runner.run_step(rate, args.step_duration, args.concurrency)
+        step.sustained = is_sustained(step, args.p99_limit)
+        steps.append(step)
+        if not step.sustained and not args.full_curve:
+            break
+    return steps
+
+
+async def run(args) -> List[StepResult]:
+    mix = parse_mix(args.mix)
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+
+    if args.target == 'direct':
+        async with bench_environment(args) as ctx:
+            workload = Workload(ctx.updates, mix, user_ids, args.plates, args.zipf)
+            return await run_curve(args, workload, DirectTarget(ctx))
+
+    api = FakeTelegramServer(
+        latency=args.api_latency / 1000, jitter=args.api_jitter / 1000, host=args.api_host, port=args.api_port
+    )
+    await api.start()
+    print(f"🧪 Фейковый Bot API: {api.url} (запустите бота с TELEGRAM_API_URL={api.url})")
+    target = WebhookTarget(args.url, args.secret, api, args.response_timeout)
+    await target.start()
+    try:
+        workload = Workload(UpdateFactory(None), mix, user_ids, args.plates, args.zipf)
+        return await run_curve(args, workload, target)
+    finally:
+        await target.stop()
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор нагрузки: кривая насыщения")
+    parser.add_argument('--target', choices=('direct', 'webhook'), default='direct')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"доли сессий (по умолчанию {DEFAULT_MIX})")
+    parser.add_argument('--zipf', type=float, default=1.1, help="показатель Ципфа популярности номеров")
+    parser.add_argument('--rates', default='25,50,100,200,400,800', type=parse_rates,
+                        help="ступени, обновлений/с через запятую; max - без ограничения")
+    parser.add_argument('--step-duration', type=float, default=30, help="секунд на ступень")
+    parser.add_argument('--warmup', type=float, default=5, help="секунд прогрева на первой ступени")
+    parser.add_argument('--concurrency', type=int, default=50, help="пользователей на ступени max")
+    parser.add_argument('--drain', type=float, default=15, help="секунд на дообработку после ступени")
+    parser.add_argument('--p99-limit', type=float, default=500, help="p99, при котором ступень провалена, мс")
+    parser.add_argument('--full-curve', action='store_true', help="не останавливаться на первой проваленной ступени")
+    parser.add_argument('--csv', help="сохранить кривую в CSV")
+    add_environment_arguments(parser)
+    webhook = parser.add_argument_group('webhook')
+    webhook.add_argument('--url', help="URL вебхука инстанса")
+    webhook.add_argument('--secret', default='', help="WEBHOOK_SECRET инстанса")
+    webhook.add_argument('--api-host', default='127.0.0.1', help="адрес фейкового Bot API")
+    webhook.add_argument('--api-port', type=int, default=8081, help="порт фейкового Bot API")
+    webhook.add_argument('--response-timeout', type=float, default=15, help="ожидание ответа бота, с")
+    args = parser.parse_args()
+
+    if args.target == 'webhook' and not args.url:
+        parser.error("для --target webhook нужен --url")
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    logger.setLevel(getattr(logging, args.log_level.upper(), logging.WARNING))
+    steps = asyncio.run(run(args))
+
+    print()
+    print(format_curve(steps))
+    sustained = [s for s in steps if s.sustained and s.offered]
+    if sustained:
+        best = sustained[-1]
+        print(f"\n📈 Процесс держит ~{best.achieved:.0f} обн/с при p99 {best.p99:.0f} мс (порог {args.p99_limit:.0f} мс)")
+    else:
+        print(f"\n📉 Ни одна ступень не уложилась в p99 {args.p99_limit:.0f} мс без потерь")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(asdict(steps[0])) if steps else [])
+            writer.writeheader()
+            for step in steps:
+                writer.writerow(asdict(step))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Одноразовая PostgreSQL для бенчмарков.
+
+Если задан BENCH_DATABASE_URL, на этом сервере создается временная база
+bench_<случайный суффикс> и удаляется после прогона (нужно право CREATEDB).
+Иначе initdb поднимает отдельный кластер во временном каталоге: без
+fsync, только unix-сокет, удаляется вместе с каталогом. Рабочую базу
+бенчмарк не трогает никогда.
+"""
+import asyncio
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import asyncpg
+
+# Кластер только для замеров: надежность записи не нужна
+SERVER_OPTIONS = (
+    "-c fsync=off -c synchronous_commit=off -c full_page_writes=off "
+    "-c listen_addresses='' -c max_connections=200 -c shared_buffers=256MB"
+)
+
+
+def _find_binary(name: str) -> Optional[str]:
+    path = shutil.which(name)
+    if path:
+        return path
+    # Debian/Ubuntu не кладут серверные утилиты в PATH
+    candidates = sorted(glob.glob(f'/usr/lib/postgresql/*/bin/{name}'))
+    return candidates[-1] if candidates else None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class EphemeralPostgres:
+    """Кластер PostgreSQL во временном каталоге"""
+
+    def __init__(self):
+        self.initdb = _find_binary('initdb')
+        self.pg_ctl = _find_binary('pg_ctl')
+        self.directory: Optional[str] = None
+        self.port = _free_port()
+
+    @property
+    def url(self) -> str:
+        return f"postgresql://bench@/postgres?host={self.directory}&port={self.port}"
+
+    def start(self):
+        if not (self.initdb and self.pg_ctl):
+            raise RuntimeError("initdb/pg_ctl не найдены: установите PostgreSQL или задайте BENCH_DATABASE_URL")
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            raise RuntimeError("PostgreSQL не запускается от root: задайте BENCH_DATABASE_URL")
+
+        self.directory = tempfile.mkdtemp(prefix='bench-pg-')
+        data = os.path.join(self.directory, 'data')
+        subprocess.run(
+            [self.initdb, '-D', data, '-U', 'bench', '-A', 'trust', '-E', 'UTF8', '--no-sync'],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        subprocess.run(
+            [self.pg_ctl, '-D', data, '-l', os.path.join(self.directory, 'postgres.log'), '-w',
+             '-o', f"-p {self.port} -k {self.directory} {SERVER_OPTIONS}", 'start'],
+            check=True, stdout=subprocess.DEVNULL
+        )
+
+    def stop(self):
+        if self.directory is None:
+            return
+        subprocess.run(
+            [self.pg_ctl, '-D', os.path.join(self.directory, 'data'), '-m', 'immediate', '-w', 'stop'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+
+
+def _with_database(url: str, name: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=f'/{name}'))
+
+
+@asynccontextmanager
+async def disposable_database() -> AsyncIterator[str]:
+    """URL пустой базы, которая исчезнет после выхода из блока"""
+    server_url = os.getenv('BENCH_DATABASE_URL')
+    if server_url:
+        name = f"bench_{uuid.uuid4().hex[:8]}"
+        conn = await asyncpg.connect(server_url)
+        try:
+            await conn.execute(f'CREATE DATABASE {name}')
+        finally:
+            await conn.close()
+        try:
+            yield _with_database(server_url, name)
+        finally:
+            conn = await asyncpg.connect(server_url)
+            try:
+                await conn.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+            finally:
+                await conn.close()
+        return
+
+    cluster = EphemeralPostgres()
+    await asyncio.to_thread(cluster.start)
+    try:
+        yield cluster.url
+    finally:
+        await asyncio.to_thread(cluster.stop)
@@ -0,0 +1,259 @@
+"""
+Воспроизведение записанного трафика (utils/update_recorder.py) через
+Dispatcher.feed_update на одноразовой базе с фейковым Bot API.
+
+Обновления подаются по исходному расписанию, ускоренному в --speed раз
+(0 - без пауз), паузы длиннее --max-gap сокращаются. Задержка считается
+от запланированного момента подачи до конца обработки (открытый цикл):
+если бот не успевает, задержка растет вместе с очередью.
+
+Перед воспроизведением все пользователи записи заводятся в базе (запись
+могла начаться посреди их сессий), а номера, которые в записи ищут,
+получают отзывы - чтобы поиски попадали туда же, куда и в проде.
+
+Итог - таблица по действиям (команды, кнопки меню, ввод номера,
+callback-префиксы) и по всему трафику; с --baseline прогон сравнивается
+с сохраненным, как в bench_e2e.
+
+Использование:
+    python -m benchmarks.replay logs/updates.jsonl.gz --speed 10
+    python -m benchmarks.replay logs/updates.jsonl.gz --speed 0 --save-baseline benchmarks/replay_baseline.json
+    python -m benchmarks.replay logs/updates.jsonl.gz --speed 10 --baseline benchmarks/replay_baseline.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from benchmarks.bench_e2e import add_environment_arguments, bench_environment
+from benchmarks.scenarios import BenchContext, make_comment
+from benchmarks.stats import ScenarioResult, find_regressions, format_table, load_results, save_results
+from config import config
+from database.db_manager import db
+from utils.logger import logger
+from utils.update_recorder import ADMIN_PSEUDO_ID, read_recording, recording_files, sender_id
+from utils.validators import canonical_plate, validate_plate
+
+# Кнопки клавиатур: нажатие посреди FSM - отдельное действие в отчете
+MENU_TEXTS = {
+    "🔍 Проверить номер", "✍️ Оставить отзыв", "🚗 Мой гараж", "💬 Поддержка",
+    "🎁 Пригласить друга", "⏭ Пропустить", "❌ Отменить", "✅ Да", "❌ Нет",
+}
+MESSAGE_CONTENT = ('photo', 'video', 'location', 'contact', 'document', 'voice', 'sticker', 'successful_payment')
+
+OTHER = 'прочее'
+
+
+def action_of(update: Dict[str, Any]) -> str:
+    """Короткое имя действия для отчета"""
+    message = update.get('message')
+    if message:
+        text = message.get('text')
+        if text:
+            if text.startswith('/'):
+                return text.split()[0].split('@')[0]
+            if text in MENU_TEXTS:
+                return text
+            return 'номер' if validate_plate(text)[0] else 'текст'
+        for content in MESSAGE_CONTENT:
+            if content in message:
+                return content
+        return 'message'
+    callback = update.get('callback_query')
+    if callback:
+        return f"cb:{(callback.get('data') or '').split('_')[0]}"
+    return next((key for key in update if key != 'update_id'), 'update')
+
+
+def load(paths: List[Path], limit: Optional[int]) -> List[Dict[str, Any]]:
+    records = []
+    for record in read_recording(paths):
+        records.append(record)
+        if limit and len(records) >= limit:
+            break
+    return records
+
+
+def schedule(records: List[Dict[str, Any]], speed: float, max_gap: float) -> List[float]:
+    """Смещения подачи от начала прогона, секунды"""
+    offsets = []
+    offset = 0.0
+    previous = records[0]['t'] if records else 0.0
+    for record in records:
+        offset += min(max(record['t'] - previous, 0.0), max_gap)
+        previous = record['t']
+        offsets.append(offset / speed if speed > 0 else 0.0)
+    return offsets
+
+
+async def prepare(ctx: BenchContext, records: List[Dict[str, Any]], reviews_per_plate: int):
+    """Пользователи записи и отзывы на искомые номера"""
+    user_ids: Set[int] = set()
+    plates: Counter = Counter()
+    for record in records:
+        user_id = sender_id(record['u'])
+        if user_id is not None:
+            user_ids.add(user_id)
+        text = (record['u'].get('message') or {}).get('text')
+        if text and validate_plate(text)[0]:
+            plates[canonical_plate(text)] += 1
+
+    print(f"⏳ Подготовка: {len(user_ids)} пользователей, {len(plates)} номеров из записи...")
+    for user_id in user_ids:
+        await db.create_or_update_user(user_id, None, 'User')
+    authors = ctx.user_ids
+    for plate in plates:
+        for _ in range(ctx.rng.randint(1, reviews_per_plate)):
+            await db.create_review(
+                plate=plate,
+                rating=ctx.rng.randint(1, 5),
+                comment=make_comment(ctx.rng),
+                user_id=ctx.rng.choice(authors)
+            )
+
+
+async def replay(ctx: BenchContext, records: List[Dict[str, Any]], offsets: List[float],
+                 max_in_flight: int) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    lateness: List[float] = []
+    slots = asyncio.Semaphore(max_in_flight)
+    tasks: Set[asyncio.Task] = set()
+
+    async def handle(update, action: str, due: float):
+        try:
+            await ctx.feed(update)
+        except Exception as e:
+            errors[action] += 1
+            logger.warning("Ошибка обработки обновления %s: %s", action, e)
+        else:
+            latencies[action].append(time.perf_counter() - due)
+        finally:
+            slots.release()
+
+    started = time.perf_counter()
+    for record, offset in zip(records, offsets):
+        due = started + offset
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        lateness.append(max(time.perf_counter() - due, 0.0))
+        try:
+            update = ctx.updates.validate(record['u'])
+        except Exception as e:
+            slots.release()
+            errors['невалидные'] += 1
+            logger.warning("Обновление из записи не разобрано: %s", e)
+            continue
+        # Задачи стартуют в порядке создания: ConcurrencyMiddleware видит обновления пользователя по порядку
+        task = asyncio.create_task(handle(update, action_of(record['u']), due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return {
+        'latencies': latencies,
+        'errors': errors,
+        'lateness': sorted(lateness),
+        'duration': time.perf_counter() - started,
+    }
+
+
+def summarize(outcome: Dict[str, Any], api_calls: int, top: int) -> List[ScenarioResult]:
+    latencies, errors, duration = outcome['latencies'], outcome['errors'], outcome['duration']
+    everything = [value for values in latencies.values() for value in values]
+    results = [ScenarioResult.from_latencies('все', everything, sum(errors.values()), duration, api_calls)]
+
+    ranked = sorted(set(latencies) | set(errors), key=lambda a: len(latencies.get(a, ())), reverse=True)
+    other_latencies: List[float] = []
+    other_errors = 0
+    for index, action in enumerate(ranked):
+        if index < top:
+            results.append(ScenarioResult.from_latencies(
+                action, latencies.get(action, []), errors[action], duration, 0
+            ))
+        else:
+            other_latencies.extend(latencies.get(action, []))
+            other_errors += errors[action]
+    if other_latencies or other_errors:
+        results.append(ScenarioResult.from_latencies(OTHER, other_latencies, other_errors, duration, 0))
+    return results
+
+
+async def run(args) -> List[ScenarioResult]:
+    records = load(args.files, args.limit)
+    if not records:
+        raise SystemExit("❌ В записи нет обновлений")
+    offsets = schedule(records, args.speed, args.max_gap)
+    span = records[-1]['t'] - records[0]['t']
+    print(f"📼 {len(records)} обновлений за {span:.0f} с записи, прогон ~{offsets[-1]:.0f} с")
+
+    async with bench_environment(args) as ctx:
+        # Админ записан под фиксированным псевдонимом
+        config.ADMIN_ID = ADMIN_PSEUDO_ID
+        ctx.dp['concurrency'].exempt_user_ids.add(ADMIN_PSEUDO_ID)
+        await prepare(ctx, records, args.reviews_per_plate)
+        ctx.api.reset()
+        print("▶️  Воспроизведение...")
+        outcome = await replay(ctx, records, offsets, args.max_in_flight)
+        api_calls = sum(ctx.api.calls.values())
+
+    lateness = outcome['lateness']
+    if lateness:
+        print(f"⏱ Отставание подачи от расписания: макс. {lateness[-1] * 1000:.1f} мс")
+    return summarize(outcome, api_calls, args.top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанного трафика")
+    parser.add_argument('files', nargs='*', type=Path,
+                        help=f"файлы записи по порядку (по умолчанию logs/{config.RECORD_UPDATES_FILE} с ротацией)")
+    parser.add_argument('--speed', type=float, default=1.0, help="ускорение относительно записи (0 - без пауз)")
+    parser.add_argument('--max-gap', type=float, default=10.0, help="паузы записи длиннее, с, сокращаются до этой")
+    parser.add_argument('--limit', type=int, help="только первые N обновлений")
+    parser.add_argument('--max-in-flight', type=int, default=1000, help="обновлений в обработке одновременно")
+    parser.add_argument('--top', type=int, default=15, help="действий в отчете (остальные - в 'прочее')")
+    add_environment_arguments(parser)
+    parser.add_argument('--json', help="сохранить результаты в файл")
+    parser.add_argument('--save-baseline', help="сохранить результаты как базовый прогон")
+    parser.add_argument('--baseline', help="сравнить с базовым прогоном")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="допустимое ухудшение относительно базового прогона (доля)")
+    args = parser.parse_args()
+
+    args.files = args.files or recording_files(Path("logs") / config.RECORD_UPDATES_FILE)
+    missing = [str(path) for path in args.files if not path.exists()]
+    if not args.files or missing:
+        parser.error(f"нет файлов записи: {', '.join(missing) or 'logs/' + config.RECORD_UPDATES_FILE}")
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f"нет файла базового прогона: {args.baseline}")
+
+    logger.setLevel(getattr(logging, args.log_level.upper(), logging.WARNING))
+    results = asyncio.run(run(args))
+
+    print()
+    print(format_table(results))
+
+    if args.json:
+        save_results(results, args.json)
+    if args.save_baseline:
+        save_results(results, args.save_baseline)
+        print(f"\n💾 Базовый прогон сохранен: {args.save_baseline}")
+    if args.baseline:
+        problems = find_regressions(results, load_results(args.baseline), args.tolerance)
+        if problems:
+            print(f"\n❌ Ухудшения больше {args.tolerance:.0%}:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"\n✅ В пределах {args.tolerance:.0%} от базового прогона")
+
+
+if __name__ == '__main__':
+    main()
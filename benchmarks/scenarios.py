@@ -0,0 +1,236 @@
+"""
+Сценарии сквозного бенчмарка.
+
+Каждая операция сценария - одно или несколько обновлений, которые
+проходят через Dispatcher.feed_update со всеми middleware, FSM и БД,
+как обновления от Telegram. Время операции - от первого обновления
+до возврата из последнего.
+"""
+import itertools
+import random
+import string
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from benchmarks.fake_telegram import BOT_USER, FakeTelegramServer
+from database.db_manager import db
+
+# Пользователи бенчмарка: отдельный диапазон id, админ - первым
+ADMIN_USER_ID = 9_000_000
+FIRST_USER_ID = ADMIN_USER_ID + 1
+
+SKIP_TEXT = "⏭ Пропустить"
+
+COMMENT_FRAGMENTS = [
+    "подрезал меня на перекрестке", "ехал по встречке", "не включил поворотник",
+    "вежливо пропустил пешехода", "стоял на двух местах", "очень агрессивно ездит",
+    "моргал фарами всю дорогу", "спасибо водителю", "на Абая возле ТРЦ", "утром в пробке",
+    "перестраивался без поворотника", "сигналил без причины", "номер видно на видео",
+]
+
+
+# Буква Z не используется в номерах с отзывами: из нее строятся промахи
+PLATE_LETTERS = string.ascii_uppercase[:-1]
+
+
+def make_plate(index: int) -> str:
+    """Номер по порядковому индексу: 001AAA01, 002AAA02, ..."""
+    digits = index % 999 + 1
+    letters_index = index // 999
+    letters = ''
+    for _ in range(3):
+        letters += PLATE_LETTERS[letters_index % len(PLATE_LETTERS)]
+        letters_index //= len(PLATE_LETTERS)
+    region = index % 20 + 1
+    return f"{digits:03d}{letters}{region:02d}"
+
+
+def make_missing_plate(rng: random.Random) -> str:
+    """Номер, который make_plate не выдает"""
+    return f"{rng.randint(1, 999):03d}Z{rng.choice('XYZ')}{rng.choice('XYZ')}{rng.randint(1, 20):02d}"
+
+
+def make_comment(rng: random.Random) -> str:
+    """Уникальный комментарий: отпечатки не должны склеивать отзывы бенчмарка"""
+    parts = rng.sample(COMMENT_FRAGMENTS, 3)
+    return f"{', '.join(parts).capitalize()} ({rng.randint(1, 10**9)})"
+
+
+class UpdateFactory:
+    """Обновления от имени пользователей, привязанные к боту"""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def user(user_id: int) -> Dict[str, Any]:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}", 'username': f"user{user_id}"}
+
+    def raw_message(self, user_id: int, text: str) -> Dict[str, Any]:
+        """Обновление в JSON, как его присылает Telegram"""
+        return {
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': 0,
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': self.user(user_id),
+                'text': text,
+            },
+        }
+
+    def raw_callback(self, user_id: int, data: str, message_text: str = '-') -> Dict[str, Any]:
+        """Нажатие кнопки под сообщением бота, в JSON"""
+        return {
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._update_ids)),
+                'from': self.user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': next(self._message_ids),
+                    'date': 0,
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'from': BOT_USER,
+                    'text': message_text,
+                },
+            },
+        }
+
+    def validate(self, raw: Dict[str, Any]) -> Update:
+        return Update.model_validate(raw, context={'bot': self.bot})
+
+    def message(self, user_id: int, text: str) -> Update:
+        return self.validate(self.raw_message(user_id, text))
+
+    def callback(self, user_id: int, data: str, message_text: str = '-') -> Update:
+        return self.validate(self.raw_callback(user_id, data, message_text))
+
+
+class BenchContext:
+    """Все, что нужно сценариям: бот, диспетчер, фейковый API и данные"""
+
+    def __init__(self, bot: Bot, dp: Dispatcher, api: FakeTelegramServer,
+                 users: int, plates: int, seed: int = 42):
+        self.bot = bot
+        self.dp = dp
+        self.api = api
+        self.updates = UpdateFactory(bot)
+        self.rng = random.Random(seed)
+        self.user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + users))
+        self.plates = [make_plate(i) for i in range(plates)]
+        self._next_user = itertools.cycle(self.user_ids)
+
+    def next_user(self) -> int:
+        """Пользователи по кругу: лимиты на пользователя не срабатывают"""
+        return next(self._next_user)
+
+    async def feed(self, update: Update):
+        await self.dp.feed_update(self.bot, update)
+
+
+async def seed(ctx: BenchContext, reviews_per_plate: int, subscribers_per_plate: int):
+    """Пользователи, отзывы и подписки через методы DatabaseManager"""
+    await db.create_or_update_user(ADMIN_USER_ID, 'bench_admin', 'Bench Admin')
+    for user_id in ctx.user_ids:
+        await db.create_or_update_user(user_id, f"user{user_id}", f"User {user_id}")
+    for plate in ctx.plates:
+        for _ in range(ctx.rng.randint(1, reviews_per_plate)):
+            await db.create_review(
+                plate=plate,
+                rating=ctx.rng.randint(1, 5),
+                comment=make_comment(ctx.rng),
+                user_id=ctx.rng.choice(ctx.user_ids)
+            )
+        for user_id in ctx.rng.sample(ctx.user_ids, min(subscribers_per_plate, len(ctx.user_ids))):
+            await db.subscribe_to_plate(user_id, plate)
+
+
+class Scenario:
+    """Операция сценария; broadcast переопределяет весь прогон"""
+    name = ''
+
+    async def run_op(self, ctx: BenchContext):
+        raise NotImplementedError
+
+
+class SearchHit(Scenario):
+    """Поиск номера с отзывами: карточка, реакции, отзывы"""
+    name = 'search_hit'
+
+    async def run_op(self, ctx: BenchContext):
+        user_id = ctx.next_user()
+        await ctx.feed(ctx.updates.message(user_id, '/search'))
+        await ctx.feed(ctx.updates.message(user_id, ctx.rng.choice(ctx.plates)))
+
+
+class SearchMiss(Scenario):
+    """Поиск номера без отзывов (обычно отсекается фильтром номеров)"""
+    name = 'search_miss'
+
+    async def run_op(self, ctx: BenchContext):
+        user_id = ctx.next_user()
+        await ctx.feed(ctx.updates.message(user_id, '/search'))
+        await ctx.feed(ctx.updates.message(user_id, make_missing_plate(ctx.rng)))
+
+
+class ReviewFlow(Scenario):
+    """Полный отзыв: номер, оценка, комментарий, без геолокации и медиа"""
+    name = 'review_flow'
+
+    async def run_op(self, ctx: BenchContext):
+        user_id = ctx.next_user()
+        updates = ctx.updates
+        await ctx.feed(updates.message(user_id, '/review'))
+        await ctx.feed(updates.message(user_id, ctx.rng.choice(ctx.plates)))
+        await ctx.feed(updates.callback(user_id, f"rate_{ctx.rng.randint(1, 5)}"))
+        await ctx.feed(updates.message(user_id, make_comment(ctx.rng)))
+        await ctx.feed(updates.message(user_id, SKIP_TEXT))
+        await ctx.feed(updates.message(user_id, SKIP_TEXT))
+
+
+class ReactionStorm(Scenario):
+    """Много пользователей жмут реакции на несколько горячих номеров"""
+    name = 'reaction_storm'
+    hot_plates = 3
+
+    async def run_op(self, ctx: BenchContext):
+        plate = ctx.plates[ctx.rng.randrange(min(self.hot_plates, len(ctx.plates)))]
+        vote = ctx.rng.choice(('like', 'dislike'))
+        await ctx.feed(ctx.updates.callback(ctx.next_user(), f"react_{vote}_{plate}"))
+
+
+class Broadcast(Scenario):
+    """
+    Рассылка админа всем пользователям. Операция - доставка одного
+    сообщения; задержка - время от команды админа до доставки.
+    """
+    name = 'broadcast'
+
+    async def run(self, ctx: BenchContext, timeout: float) -> Optional[List[float]]:
+        """Задержки доставки или None, если рассылка не уложилась в timeout"""
+        recipients = set(await db.get_broadcast_recipients())
+        ctx.api.reset()
+        started = time.perf_counter()
+        await ctx.feed(ctx.updates.callback(ADMIN_USER_ID, 'admin_broadcast'))
+        await ctx.feed(ctx.updates.message(ADMIN_USER_ID, "📢 <b>Бенчмарк рассылки</b>"))
+
+        # Два сообщения админу (приглашение и статус) + по одному на получателя
+        done = await ctx.api.wait_for('sendMessage', len(recipients) + 2, timeout)
+        # Итоговый отчет: рассылка не должна перетекать в следующий сценарий
+        await ctx.api.wait_for('editMessageText', len(recipients) // 10 + 1, 10)
+        if not done:
+            return None
+        return [call.at - started for call in ctx.api.log
+                if call.method == 'sendmessage' and call.chat_id in recipients]
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    s.name: s for s in (SearchHit(), SearchMiss(), ReviewFlow(), ReactionStorm(), Broadcast())
+}
@@ -0,0 +1,298 @@
+"""
+Наполнение базы синтетическими данными большого объема через COPY.
+
+Размер задается числом отзывов, остальные таблицы растут пропорционально:
+пользователей в 10 раз меньше, номеров в 4 раза меньше, реакций вдвое
+меньше. Популярность номеров и возраст отзывов распределены по Ципфу:
+немного номеров с тысячами отзывов, длинный хвост с одним-двумя; свежих
+отзывов больше, чем старых. Номера - make_plate(0..N), как в сценариях
+бенчмарка и генератора нагрузки.
+
+Наполнение дозаписывает: grow_to(10M) после grow_to(1M) добавит 9M.
+На время загрузки вторичные индексы удаляются и потом создаются заново
+через init_tables - так COPY в несколько раз быстрее.
+
+Использование (база должна быть не рабочей):
+    python -m benchmarks.seeder --database-url postgresql://.../staging --reviews 1M
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import asyncpg
+
+from benchmarks.scenarios import COMMENT_FRAGMENTS, make_plate
+from benchmarks.workload import ZipfSampler
+from utils.fingerprint import simhash_bands
+
+# Пользователи наполнения - отдельный диапазон id
+FIRST_SCALE_USER_ID = 10_000_000
+
+REVIEWS_PER_USER = 10
+REVIEWS_PER_PLATE = 4
+MIN_USERS = 1000
+MIN_PLATES = 1000
+
+BATCH = 100_000
+HISTORY_DAYS = 730
+
+# Показатели Ципфа: популярность номеров и возраст отзывов (в днях)
+PLATE_ZIPF = 0.5
+AGE_ZIPF = 0.8
+
+# Доли
+DELETED_RATE = 0.01
+MEDIA_RATE = 0.1
+LOCATION_RATE = 0.3
+UNREACHABLE_RATE = 0.03
+SPAM_RATE = 0.01
+
+SCALED_TABLES = ('users', 'reviews', 'review_fingerprints', 'car_reactions', 'subscriptions', 'usage_stats')
+
+
+def parse_count(text: str) -> int:
+    """'1M' -> 1000000, '500k' -> 500000"""
+    text = text.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+class ScaleSeeder:
+    """Дозаписывает таблицы до заданного числа отзывов"""
+
+    def __init__(self, pool: asyncpg.Pool, seed: int = 42, plate_zipf: float = PLATE_ZIPF):
+        self.pool = pool
+        self.rng = random.Random(seed)
+        self.plate_zipf = plate_zipf
+        self._plates: Optional[ZipfSampler] = None
+        self._plates_count = 0
+        self._ages = ZipfSampler(HISTORY_DAYS, AGE_ZIPF, self.rng)
+        self._now = datetime.now()
+        self._comments = [
+            ', '.join(self.rng.sample(COMMENT_FRAGMENTS, 3)).capitalize() for _ in range(1000)
+        ]
+        # Повторяющиеся тексты спамеров: одни и те же отпечатки
+        self._spam = [(self.rng.getrandbits(63), self.rng.getrandbits(63)) for _ in range(50)]
+        # Спам-текст -> id первого отзыва с ним: cluster_id его повторов, как у бота
+        self._spam_clusters: Dict[int, int] = {}
+
+    @staticmethod
+    def targets(reviews: int) -> Tuple[int, int]:
+        """(пользователей, номеров) для заданного числа отзывов"""
+        return max(MIN_USERS, reviews // REVIEWS_PER_USER), max(MIN_PLATES, reviews // REVIEWS_PER_PLATE)
+
+    def plate(self) -> str:
+        return make_plate(self._plates.sample())
+
+    def created_at(self) -> datetime:
+        return self._now - timedelta(days=self._ages.sample(), seconds=self.rng.randrange(86400))
+
+    async def counts(self) -> dict:
+        async with self.pool.acquire() as conn:
+            return {
+                'users': await conn.fetchval('SELECT COUNT(*) FROM users WHERE user_id >= $1', FIRST_SCALE_USER_ID),
+                'reviews': await conn.fetchval('SELECT COUNT(*) FROM reviews'),
+                'max_review_id': await conn.fetchval('SELECT COALESCE(MAX(id), 0) FROM reviews'),
+                'car_reactions': await conn.fetchval('SELECT COUNT(*) FROM car_reactions'),
+                'subscriptions': await conn.fetchval('SELECT COUNT(*) FROM subscriptions'),
+                'usage_stats': await conn.fetchval('SELECT COUNT(*) FROM usage_stats'),
+            }
+
+    async def grow_to(self, reviews: int, init_tables=None):
+        """
+        Дозаписывает данные до reviews отзывов.
+
+        init_tables - корутина, создающая схему и индексы (DatabaseManager.init_tables):
+        вызывается после загрузки, чтобы вернуть удаленные индексы.
+        """
+        current = await self.counts()
+        users, plates = self.targets(reviews)
+        if plates != self._plates_count:
+            self._plates = ZipfSampler(plates, self.plate_zipf, self.rng)
+            self._plates_count = plates
+
+        dropped = await self._drop_secondary_indexes()
+        try:
+            await self._copy('users', ('user_id', 'username', 'full_name', 'joined_at', 'last_active',
+                                       'unreachable_since'),
+                             self._users(current['users'], users))
+            await self._copy_reviews(current['max_review_id'], reviews - current['reviews'], users)
+            await self._copy_staged('car_reactions', ('plate', 'user_id', 'vote_type', 'created_at'),
+                                    self._reactions(reviews // 2 - current['car_reactions'], users))
+            await self._copy_staged('subscriptions', ('user_id', 'plate', 'subscribed_at'),
+                                    self._subscriptions(users // 5 - current['subscriptions'], users))
+            await self._copy_staged('usage_stats', ('user_id', 'date', 'searches', 'reviews'),
+                                    self._usage(users * 2 - current['usage_stats'], users))
+        finally:
+            if init_tables is not None:
+                started = time.perf_counter()
+                await init_tables()
+                print(f"  индексы ({len(dropped)}) восстановлены за {time.perf_counter() - started:.0f} с")
+
+        async with self.pool.acquire() as conn:
+            await conn.execute("SELECT setval(pg_get_serial_sequence('reviews', 'id'), "
+                               "(SELECT COALESCE(MAX(id), 1) FROM reviews))")
+            await conn.execute('ANALYZE')
+
+    # --- ГЕНЕРАЦИЯ СТРОК ---
+
+    def _users(self, start: int, stop: int) -> Iterator[tuple]:
+        for i in range(start, stop):
+            user_id = FIRST_SCALE_USER_ID + i
+            joined = self.created_at()
+            unreachable = joined if self.rng.random() < UNREACHABLE_RATE else None
+            yield user_id, f"user{user_id}", f"User {user_id}", joined, joined, unreachable
+
+    def _user_id(self, users: int) -> int:
+        return FIRST_SCALE_USER_ID + self.rng.randrange(users)
+
+    async def _copy_reviews(self, max_id: int, count: int, users: int):
+        """Отзывы и их отпечатки с явными id: отпечатки ссылаются на отзывы"""
+        if count <= 0:
+            return
+        rng = self.rng
+        review_columns = ('id', 'plate', 'rating', 'comment', 'photo_id', 'latitude', 'longitude',
+                          'user_id', 'created_at', 'is_deleted')
+        fingerprint_columns = ('review_id', 'user_id', 'plate', 'text_hash', 'simhash',
+                               'band0', 'band1', 'band2', 'band3', 'cluster_id', 'created_at')
+        started = time.perf_counter()
+        next_id = max_id + 1
+        end_id = next_id + count
+        while next_id < end_id:
+            reviews, fingerprints = [], []
+            for review_id in range(next_id, min(next_id + BATCH, end_id)):
+                plate = self.plate()
+                user_id = self._user_id(users)
+                created = self.created_at()
+                located = rng.random() < LOCATION_RATE
+                reviews.append((
+                    review_id, plate, rng.randint(1, 5),
+                    f"{rng.choice(self._comments)} #{review_id}",
+                    f"photo_{review_id}" if rng.random() < MEDIA_RATE else None,
+                    43.2 + rng.random() if located else None,
+                    76.8 + rng.random() if located else None,
+                    user_id, created, rng.random() < DELETED_RATE,
+                ))
+                if rng.random() < SPAM_RATE:
+                    spam = rng.randrange(len(self._spam))
+                    text_hash, simhash = self._spam[spam]
+                    cluster_id = self._spam_clusters.setdefault(spam, review_id)
+                else:
+                    text_hash, simhash = rng.getrandbits(63), rng.getrandbits(63)
+                    cluster_id = review_id
+                fingerprints.append((
+                    review_id, user_id, plate, text_hash, simhash, *simhash_bands(simhash),
+                    cluster_id, created,
+                ))
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.copy_records_to_table('reviews', records=reviews, columns=review_columns)
+                    await conn.copy_records_to_table(
+                        'review_fingerprints', records=fingerprints, columns=fingerprint_columns
+                    )
+            next_id += len(reviews)
+            done = next_id - max_id - 1
+            print(f"  reviews: {done:,}/{count:,} ({done / (time.perf_counter() - started):,.0f} строк/с)")
+
+    def _reactions(self, count: int, users: int) -> Iterator[tuple]:
+        for _ in range(max(count, 0)):
+            yield (self.plate(), self._user_id(users), 'like' if self.rng.random() < 0.6 else 'dislike',
+                   self.created_at())
+
+    def _subscriptions(self, count: int, users: int) -> Iterator[tuple]:
+        for _ in range(max(count, 0)):
+            yield self._user_id(users), self.plate(), self.created_at()
+
+    def _usage(self, count: int, users: int) -> Iterator[tuple]:
+        today = self._now.date()
+        for _ in range(max(count, 0)):
+            day = today - timedelta(days=self._ages.sample() % 30)
+            yield self._user_id(users), day, self.rng.randint(0, 20), self.rng.randint(0, 3)
+
+    # --- ЗАГРУЗКА ---
+
+    async def _copy(self, table: str, columns: Tuple[str, ...], rows: Iterator[tuple]):
+        started = time.perf_counter()
+        total = 0
+        for batch in _batches(rows):
+            async with self.pool.acquire() as conn:
+                await conn.copy_records_to_table(table, records=batch, columns=columns)
+            total += len(batch)
+        if total:
+            print(f"  {table}: +{total:,} за {time.perf_counter() - started:.0f} с")
+
+    async def _copy_staged(self, table: str, columns: Tuple[str, ...], rows: Iterator[tuple]):
+        """COPY во временную таблицу и перенос без дублей первичного ключа"""
+        started = time.perf_counter()
+        total = 0
+        column_list = ', '.join(columns)
+        async with self.pool.acquire() as conn:
+            await conn.execute(f'CREATE TEMP TABLE IF NOT EXISTS stage_{table} (LIKE {table})')
+            for batch in _batches(rows):
+                async with conn.transaction():
+                    await conn.copy_records_to_table(f'stage_{table}', records=batch, columns=columns)
+                    result = await conn.execute(
+                        f'INSERT INTO {table} ({column_list}) SELECT {column_list} FROM stage_{table} '
+                        f'ON CONFLICT DO NOTHING'
+                    )
+                    await conn.execute(f'TRUNCATE stage_{table}')
+                total += int(result.split()[-1])
+        if total:
+            print(f"  {table}: +{total:,} за {time.perf_counter() - started:.0f} с")
+
+    async def _drop_secondary_indexes(self) -> List[str]:
+        """Удаляет индексы, не обслуживающие первичные ключи и ограничения уникальности"""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT i.indexrelid::regclass::text AS name
+                FROM pg_index i
+                WHERE i.indrelid::regclass::text = ANY($1::text[])
+                  AND NOT i.indisprimary AND NOT i.indisunique
+            ''', list(SCALED_TABLES))
+            for row in rows:
+                await conn.execute(f'DROP INDEX IF EXISTS {row["name"]}')
+            return [row['name'] for row in rows]
+
+
+def _batches(rows: Iterator[tuple]) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def seed_database(database_url: str, reviews: int, seed: int, plate_zipf: float):
+    from config import config
+    from database.db_manager import db
+
+    config.DATABASE_URL = database_url
+    await db.init_pool()
+    try:
+        await db.init_tables()
+        seeder = ScaleSeeder(db.pool, seed, plate_zipf)
+        started = time.perf_counter()
+        await seeder.grow_to(reviews, db.init_tables)
+        print(f"✅ {reviews:,} отзывов за {time.perf_counter() - started:.0f} с: {await seeder.counts()}")
+    finally:
+        await db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Наполнение базы синтетическими данными через COPY")
+    parser.add_argument('--database-url', required=True, help="НЕ рабочая база: данные дозаписываются")
+    parser.add_argument('--reviews', type=parse_count, default=parse_count('1M'), help="отзывов (1M, 500k...)")
+    parser.add_argument('--zipf', type=float, default=PLATE_ZIPF, help="показатель Ципфа популярности номеров")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(seed_database(args.database_url, args.reviews, args.seed, args.zipf))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Сводка замеров и сравнение с сохраненным базовым прогоном.
+"""
+import json
+import math
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга; значения должны быть отсортированы"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@dataclass
+class ScenarioResult:
+    """Итог одного сценария; задержки в миллисекундах"""
+    name: str
+    ops: int
+    errors: int
+    duration: float
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+    api_calls_per_op: float
+
+    @classmethod
+    def from_latencies(cls, name: str, latencies: List[float], errors: int,
+                       duration: float, api_calls: int) -> 'ScenarioResult':
+        """latencies - секунды на операцию"""
+        values = sorted(latencies)
+        ms = [v * 1000 for v in values]
+        ops = len(values)
+        return cls(
+            name=name,
+            ops=ops,
+            errors=errors,
+            duration=round(duration, 3),
+            throughput=round(ops / duration, 1) if duration > 0 else 0.0,
+            p50=round(percentile(ms, 50), 2),
+            p95=round(percentile(ms, 95), 2),
+            p99=round(percentile(ms, 99), 2),
+            max=round(ms[-1], 2) if ms else 0.0,
+            api_calls_per_op=round(api_calls / ops, 2) if ops else 0.0,
+        )
+
+
+def format_table(results: List[ScenarioResult]) -> str:
+    header = f"{'сценарий':<16}{'опер.':>8}{'ошиб.':>7}{'опер/с':>10}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'API/оп':>8}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        lines.append(
+            f"{r.name:<16}{r.ops:>8}{r.errors:>7}{r.throughput:>10.1f}"
+            f"{r.p50:>10.2f}{r.p95:>10.2f}{r.p99:>10.2f}{r.api_calls_per_op:>8.2f}"
+        )
+    return '\n'.join(lines)
+
+
+def save_results(results: List[ScenarioResult], path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({r.name: asdict(r) for r in results}, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path: str) -> Dict[str, dict]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def find_regressions(results: List[ScenarioResult], baseline: Dict[str, dict],
+                     tolerance: float) -> List[str]:
+    """
+    Ухудшения относительно базового прогона больше tolerance (доля):
+    рост p50/p95/p99 или падение пропускной способности.
+    Сценарии, которых нет в базовом прогоне, не сравниваются.
+    """
+    problems = []
+    for r in results:
+        base = baseline.get(r.name)
+        if not base:
+            continue
+        for key in ('p50', 'p95', 'p99'):
+            old, new = base[key], getattr(r, key)
+            if old > 0 and new > old * (1 + tolerance):
+                problems.append(f"{r.name}: {key} {old:.2f} -> {new:.2f} мс (+{(new / old - 1) * 100:.0f}%)")
+        old, new = base['throughput'], r.throughput
+        if old > 0 and new < old * (1 - tolerance):
+            problems.append(f"{r.name}: пропускная способность {old:.1f} -> {new:.1f} опер/с")
+        if r.errors > base.get('errors', 0):
+            problems.append(f"{r.name}: ошибок {base.get('errors', 0)} -> {r.errors}")
+    return problems
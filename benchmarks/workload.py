@@ -0,0 +1,126 @@
+"""
+Синтетический поток обновлений для генератора нагрузки.
+
+Поток строится из сессий виртуальных пользователей: поиск (/search и
+номер), отзыв (все шаги FSM), реакция (react_-кнопка), гараж (меню и
+просмотр авто). Доли сессий задает смесь, популярность номеров - закон
+Ципфа: несколько номеров ищут постоянно, большинство - почти никогда.
+
+У каждого пользователя не больше одного обновления в обработке: как и
+живой человек, он ждет ответа бота перед следующим шагом.
+"""
+import itertools
+import random
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from benchmarks.scenarios import SKIP_TEXT, UpdateFactory, make_comment, make_missing_plate, make_plate
+
+GARAGE_TEXT = "🚗 Мой гараж"
+
+DEFAULT_MIX = 'search=55,review=10,react=25,garage=10'
+
+# Доля поисков по номерам, которых нет в базе
+MISS_RATE = 0.3
+
+
+class ZipfSampler:
+    """Индексы 0..n-1 с вероятностью ~ 1 / (ранг + 1) ** s"""
+
+    def __init__(self, n: int, s: float = 1.1, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
+        self._cumulative = array('d', itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+        self._total = self._cumulative[-1]
+
+    def sample(self) -> int:
+        return bisect_left(self._cumulative, self.rng.random() * self._total)
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'search=55,react=25' -> {'search': 55.0, 'react': 25.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SESSION_KINDS:
+            raise ValueError(f"неизвестный тип сессии: {name} (есть: {', '.join(SESSION_KINDS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("пустая смесь")
+    return mix
+
+
+class Workload:
+    """Виртуальные пользователи и их сессии"""
+
+    def __init__(self, factory: UpdateFactory, mix: Dict[str, float], user_ids: List[int],
+                 plates: int, zipf_s: float = 1.1, seed: int = 42):
+        self.factory = factory
+        self.rng = random.Random(seed)
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.plates = ZipfSampler(plates, zipf_s, self.rng)
+        self._idle: Deque[int] = deque(user_ids)
+        self._sessions: Dict[int, Iterator[Dict[str, Any]]] = {}
+        self._greeted: Set[int] = set()
+        self.started: Dict[str, int] = dict.fromkeys(self.kinds, 0)
+
+    def plate(self) -> str:
+        return make_plate(self.plates.sample())
+
+    def next_update(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """(пользователь, обновление) или None, если все пользователи ждут ответа"""
+        if not self._idle:
+            return None
+        user_id = self._idle.popleft()
+        if user_id not in self._greeted:
+            # Первое обновление пользователя - /start: бот заводит его в users
+            self._greeted.add(user_id)
+            return user_id, self.factory.raw_message(user_id, '/start')
+        session = self._sessions.get(user_id)
+        update = next(session, None) if session else None
+        if update is None:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            self.started[kind] += 1
+            session = self._sessions[user_id] = SESSION_KINDS[kind](self, user_id)
+            update = next(session)
+        return user_id, update
+
+    def done(self, user_id: int):
+        """Бот ответил: пользователь готов к следующему шагу"""
+        self._idle.append(user_id)
+
+
+def search_session(w: Workload, user_id: int) -> Iterator[Dict[str, Any]]:
+    yield w.factory.raw_message(user_id, '/search')
+    plate = make_missing_plate(w.rng) if w.rng.random() < MISS_RATE else w.plate()
+    yield w.factory.raw_message(user_id, plate)
+
+
+def review_session(w: Workload, user_id: int) -> Iterator[Dict[str, Any]]:
+    yield w.factory.raw_message(user_id, '/review')
+    yield w.factory.raw_message(user_id, w.plate())
+    yield w.factory.raw_callback(user_id, f"rate_{w.rng.randint(1, 5)}")
+    yield w.factory.raw_message(user_id, make_comment(w.rng))
+    yield w.factory.raw_message(user_id, SKIP_TEXT)
+    yield w.factory.raw_message(user_id, SKIP_TEXT)
+
+
+def react_session(w: Workload, user_id: int) -> Iterator[Dict[str, Any]]:
+    vote = w.rng.choice(('like', 'dislike'))
+    yield w.factory.raw_callback(user_id, f"react_{vote}_{w.plate()}")
+
+
+def garage_session(w: Workload, user_id: int) -> Iterator[Dict[str, Any]]:
+    yield w.factory.raw_message(user_id, GARAGE_TEXT)
+    yield w.factory.raw_callback(user_id, f"view_car_{w.plate()}")
+
+
+SESSION_KINDS = {
+    'search': search_session,
+    'review': review_session,
+    'react': react_session,
+    'garage': garage_session,
+}
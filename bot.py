@@ -3,13 +3,40 @@ Driver Rating KZ Pro - Telegram Bot
 Главный файл запуска бота
 """
 import asyncio
+import signal
 import sys
+from contextlib import suppress
+from typing import Optional
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BotCommand
 
 from config import config
 from database.db_manager import db
+from database.fsm_storage import PostgresStorage
+from middlewares.concurrency import setup_concurrency
+from middlewares.log_context import setup_log_context
+from middlewares.metrics import TelegramMetricsMiddleware, setup_handler_metrics
+from middlewares.recording import setup_recording
+from middlewares.throttling import setup_throttling
+from middlewares.tracing import TelegramTracingMiddleware, setup_tracing
+from utils import background
+from utils.flood_control import retry_middleware
+from utils.loop_watchdog import loop_watchdog
+from utils.memory_profiler import memory_profiler
+from utils.metrics import registry, start_metrics_server
+from utils.outbound import outbound, outbound_priority, OutboundSchedulerMiddleware, Priority
+from utils.reachability import ReachabilityProber
+from utils.plate_cache import plate_cache
+from utils.plate_filter import plate_filter
 from utils.logger import logger
+from utils.tracing import tracer
+from utils.update_recorder import update_recorder
+from web.webhook import WebhookServer
 
 # Импортируем роутеры
 from handlers import user_handlers, payment_handlers, admin_handlers
@@ -35,7 +62,175 @@ async def set_bot_commands(bot: Bot):
     logger.info("✅ Команды бота установлены")
 
 
-async def on_startup(bot: Bot):
+def create_storage() -> BaseStorage:
+    """Создает FSM-хранилище согласно конфигурации"""
+    if config.FSM_STORAGE == 'postgres':
+        return PostgresStorage(
+            db,
+            state_ttl=config.FSM_STATE_TTL,
+            cleanup_interval=config.FSM_CLEANUP_INTERVAL,
+            cleanup_batch=config.FSM_CLEANUP_BATCH,
+            cache_ttl=config.FSM_CACHE_TTL,
+            cache_size=config.FSM_CACHE_SIZE
+        )
+    return MemoryStorage()
+
+
+def create_bot(session: Optional[BaseSession] = None) -> Bot:
+    """Создает бота; все его запросы идут через слой повторов и приоритетный планировщик"""
+    if session is None and config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
+    bot = Bot(token=config.BOT_TOKEN, session=session)
+    if config.TRACING_ENABLED:
+        # Первой: span включает паузы flood control и ожидание планировщика
+        bot.session.middleware(TelegramTracingMiddleware())
+    # Порядок важен: пауза flood control выдерживается до получения токена планировщика
+    bot.session.middleware(retry_middleware)
+    bot.session.middleware(OutboundSchedulerMiddleware(outbound))
+    if config.METRICS_ENABLED:
+        # Последней: меряем сам запрос, без ожидания планировщика и пауз
+        bot.session.middleware(TelegramMetricsMiddleware())
+    return bot
+
+
+def create_dispatcher(record_updates: bool = True) -> Dispatcher:
+    """
+    Создает диспетчер с хранилищем и роутерами (без startup/shutdown хуков).
+    
+    record_updates=False - не записывать обновления, даже если запись включена
+    (воркеры supervisor.py: записывает супервизор).
+    """
+    dp = Dispatcher(storage=create_storage())
+    
+    # Запись входящего трафика для benchmarks/replay.py
+    if config.RECORD_UPDATES_ENABLED and record_updates:
+        setup_recording(dp)
+    
+    # Span на обновление - до остальных middleware, чтобы учесть их время
+    if config.TRACING_ENABLED:
+        setup_tracing(dp)
+    
+    # update_id, user_id и имя обработчика в каждой записи лога
+    setup_log_context(dp)
+    
+    # Анти-флуд: лишние действия отбрасываются до блокировки пользователя и обращения к БД
+    if config.THROTTLE_ENABLED:
+        dp['throttling'] = setup_throttling(dp, config.get_throttle_rates(), config.THROTTLE_BURST)
+    
+    # Ограничиваем параллелизм и сериализуем обновления каждого пользователя
+    dp['concurrency'] = setup_concurrency(
+        dp, config.MAX_CONCURRENT_UPDATES, config.UPDATE_TIMEOUT, exempt_user_ids=(config.ADMIN_ID,)
+    )
+    
+    # Время и ошибки каждого обработчика
+    if config.METRICS_ENABLED:
+        setup_handler_metrics(dp)
+    
+    # Регистрируем роутеры
+    dp.include_router(user_handlers.router)
+    dp.include_router(payment_handlers.router)
+    dp.include_router(admin_handlers.router)
+    
+    return dp
+
+
+def register_gauges(dp: Dispatcher):
+    """Гейджи пула, очередей и кэшей для /metrics"""
+    def pool_connections():
+        if db.pool is None:
+            return {}
+        return {('total',): db.pool.get_size(), ('idle',): db.pool.get_idle_size()}
+    
+    registry.gauge('bot_db_pool_connections', 'Соединения пула БД', pool_connections, ('state',))
+    
+    concurrency = dp['concurrency']
+    registry.gauge('bot_updates_in_flight', 'Обновления в обработке',
+                   lambda: concurrency.stats()['in_flight'])
+    registry.gauge('bot_users_waiting', 'Пользователи с очередью обновлений',
+                   lambda: concurrency.stats()['waiting_users'])
+    registry.gauge('bot_outbound_queue_depth', 'Очередь исходящих запросов по приоритету',
+                   lambda: {(name,): s['depth'] for name, s in outbound.stats().items()}, ('priority',))
+    registry.gauge('bot_db_single_flight_in_flight', 'Уникальные запросы на чтение в полете',
+                   lambda: db.single_flight_stats()['in_flight'])
+    registry.gauge('bot_plate_cache_entries', 'Карточек в кэше',
+                   lambda: plate_cache.stats()['size'])
+    registry.gauge('bot_plate_cache_hit_rate', 'Доля попаданий в кэш карточек, %',
+                   lambda: plate_cache.stats()['hit_rate'])
+    
+    throttling = dp.get('throttling')
+    if throttling:
+        registry.gauge('bot_throttle_buckets', 'Ведер анти-флуда в памяти',
+                       lambda: throttling.stats()['buckets'])
+
+
+async def start_services(bot: Bot, dispatcher: Dispatcher, primary: bool = True,
+                         metrics_port: Optional[int] = None):
+    """
+    Запускает фоновые службы процесса.
+    
+    Общие для обычного запуска и воркеров супервизора (supervisor.py).
+    
+    Args:
+        bot: Экземпляр бота
+        dispatcher: Диспетчер процесса
+        primary: Выполнять задачи на всю базу (очистка FSM, перепроверка
+            пользователей) - у супервизора только в воркере 0
+        metrics_port: Порт /metrics (по умолчанию METRICS_PORT)
+    """
+    # Эндпоинт метрик для Prometheus
+    if config.METRICS_ENABLED:
+        register_gauges(dispatcher)
+        dispatcher['metrics_runner'] = await start_metrics_server(
+            config.METRICS_HOST, config.METRICS_PORT if metrics_port is None else metrics_port
+        )
+    
+    if primary:
+        # Запускаем очистку просроченных FSM-состояний
+        if isinstance(dispatcher.storage, PostgresStorage):
+            dispatcher.storage.start_cleanup()
+        
+        # Перепроверяем пользователей, заблокировавших бота
+        prober = ReachabilityProber(
+            bot,
+            interval=config.REACHABILITY_PROBE_INTERVAL,
+            batch=config.REACHABILITY_PROBE_BATCH,
+            recheck_hours=config.REACHABILITY_RECHECK_HOURS
+        )
+        prober.start()
+        dispatcher['reachability_prober'] = prober
+    
+    # Фильтр номеров с отзывами строится в фоне
+    if config.PLATE_FILTER_ENABLED:
+        plate_filter.start(db)
+    
+    # Поиск синхронного кода, блокирующего event loop
+    if config.LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start()
+    
+    # Отчеты админу о росте памяти
+    if config.MEMORY_WATCH_ENABLED:
+        memory_profiler.start_watch(bot, config.MEMORY_WATCH_INTERVAL, config.MEMORY_WATCH_THRESHOLD_MB)
+
+
+async def stop_services(dispatcher: Dispatcher):
+    """Останавливает фоновые службы процесса; пул БД еще открыт"""
+    prober = dispatcher.get('reachability_prober')
+    if prober:
+        await prober.stop()
+    # Уведомления и рассылка дорабатывают, пока пул БД открыт
+    await background.drain(config.BACKGROUND_DRAIN_TIMEOUT)
+    await plate_filter.stop()
+    await memory_profiler.stop_watch()
+    await loop_watchdog.stop()
+    tracer.stop()
+    update_recorder.stop()
+    
+    metrics_runner = dispatcher.get('metrics_runner')
+    if metrics_runner:
+        await metrics_runner.cleanup()
+
+
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
     """Действия при запуске бота"""
     logger.info("🚀 Запуск бота...")
     
@@ -45,43 +240,94 @@ async def on_startup(bot: Bot):
     # Создаем таблицы если их нет
     await db.init_tables()
     
+    await start_services(bot, dispatcher)
+    
     # Устанавливаем команды
     await set_bot_commands(bot)
     
     # Уведомляем админа о запуске
     try:
-        await bot.send_message(
-            config.ADMIN_ID,
-            "✅ <b>Бот запущен!</b>\n\n"
-            "Все системы работают нормально.",
-            parse_mode="HTML"
-        )
+        with outbound_priority(Priority.TRANSACTIONAL):
+            await bot.send_message(
+                config.ADMIN_ID,
+                "✅ <b>Бот запущен!</b>\n\n"
+                "Все системы работают нормально.",
+                parse_mode="HTML"
+            )
     except Exception as e:
-        logger.warning(f"Не удалось уведомить админа о запуске: {e}")
+        logger.warning("Не удалось уведомить админа о запуске: %s", e)
     
     logger.info("✅ Бот успешно запущен!")
 
 
-async def on_shutdown(bot: Bot):
+async def on_shutdown(bot: Bot, dispatcher: Dispatcher):
     """Действия при остановке бота"""
     logger.info("🛑 Остановка бота...")
     
+    await stop_services(dispatcher)
+    
     # Закрываем пул соединений
     await db.close_pool()
     
     # Уведомляем админа об остановке
     try:
-        await bot.send_message(
-            config.ADMIN_ID,
-            "⚠️ <b>Бот остановлен</b>",
-            parse_mode="HTML"
-        )
+        with outbound_priority(Priority.TRANSACTIONAL):
+            await bot.send_message(
+                config.ADMIN_ID,
+                "⚠️ <b>Бот остановлен</b>",
+                parse_mode="HTML"
+            )
     except Exception as e:
-        logger.warning(f"Не удалось уведомить админа об остановке: {e}")
+        logger.warning("Не удалось уведомить админа об остановке: %s", e)
     
     logger.info("✅ Бот остановлен")
 
 
+async def run_polling(bot: Bot, dp: Dispatcher):
+    """Получение обновлений через long polling"""
+    # Снимаем вебхук, иначе getUpdates вернет ошибку конфликта
+    await bot.delete_webhook(drop_pending_updates=False)
+    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Получение обновлений через вебхук (aiohttp-сервер)"""
+    server = WebhookServer(
+        bot, dp,
+        queue_size=config.WEBHOOK_QUEUE_SIZE,
+        workers=config.WEBHOOK_WORKERS
+    )
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop_event.set)
+    
+    if config.METRICS_ENABLED:
+        registry.gauge('bot_webhook_queue_size', 'Обновления в очереди вебхука', server.queue.qsize)
+    
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await server.start(config.WEBAPP_HOST, config.WEBAPP_PORT)
+        
+        # Несколько инстансов за балансировщиком ставят один и тот же URL - это безопасно
+        await bot.set_webhook(
+            config.get_webhook_url(),
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=100
+        )
+        logger.info("✅ Вебхук установлен: %s", config.get_webhook_url())
+        
+        await stop_event.wait()
+        logger.info("🛑 Получен сигнал остановки")
+    finally:
+        # Вебхук не снимаем: его продолжают обслуживать другие инстансы
+        await server.stop()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+
+
 async def main():
     """Главная функция запуска бота"""
     
@@ -91,25 +337,22 @@ async def main():
         sys.exit(1)
     
     # Создаем бота и диспетчер
-    bot = Bot(token=config.BOT_TOKEN)
-    dp = Dispatcher()
-    
-    # Регистрируем роутеры
-    dp.include_router(user_handlers.router)
-    dp.include_router(payment_handlers.router)
-    dp.include_router(admin_handlers.router)
+    bot = create_bot()
+    dp = create_dispatcher()
     
     # Регистрируем startup/shutdown хуки
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
     
     try:
-        # Запускаем polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if config.BOT_MODE == 'webhook':
+            await run_webhook(bot, dp)
+        else:
+            await run_polling(bot, dp)
     except KeyboardInterrupt:
         logger.info("⌨️ Получен сигнал остановки (Ctrl+C)")
     except Exception as e:
-        logger.error(f"❌ Критическая ошибка: {e}")
+        logger.error("❌ Критическая ошибка: %s", e)
         raise
     finally:
         await bot.session.close()
@@ -121,5 +364,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("👋 Бот остановлен пользователем")
     except Exception as e:
-        logger.critical(f"💥 Фатальная ошибка: {e}")
+        logger.critical("💥 Фатальная ошибка: %s", e)
         sys.exit(1)
@@ -16,9 +16,38 @@ class Config:
     # Telegram Bot
     BOT_TOKEN: str = os.getenv('BOT_TOKEN', '')
     ADMIN_ID: int = int(os.getenv('ADMIN_ID', '0'))
+    # Сервер Bot API (пусто - api.telegram.org): локальный Bot API или фейковый для нагрузочных тестов
+    TELEGRAM_API_URL: str = os.getenv('TELEGRAM_API_URL', '')
+    
+    # Режим получения обновлений: polling или webhook
+    BOT_MODE: str = os.getenv('BOT_MODE', 'polling').lower()
+    
+    # Webhook (используется при BOT_MODE=webhook)
+    WEBHOOK_BASE_URL: str = os.getenv('WEBHOOK_BASE_URL', '')
+    WEBHOOK_PATH: str = os.getenv('WEBHOOK_PATH', '/webhook')
+    WEBHOOK_SECRET: str = os.getenv('WEBHOOK_SECRET', '')
+    WEBAPP_HOST: str = os.getenv('WEBAPP_HOST', '0.0.0.0')
+    WEBAPP_PORT: int = int(os.getenv('WEBAPP_PORT', '8080'))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+    WEBHOOK_WORKERS: int = int(os.getenv('WEBHOOK_WORKERS', '16'))
     
     # Database
     DATABASE_URL: str = os.getenv('DATABASE_URL', '')
+    DB_POOL_MIN_SIZE: int = int(os.getenv('DB_POOL_MIN_SIZE', '5'))
+    DB_POOL_MAX_SIZE: int = int(os.getenv('DB_POOL_MAX_SIZE', '20'))
+    
+    # Многопроцессный режим (supervisor.py)
+    WORKERS: int = int(os.getenv('WORKERS', '0'))  # 0 = по числу ядер
+    WORKER_QUEUE_SIZE: int = int(os.getenv('WORKER_QUEUE_SIZE', '1000'))
+    WORKER_HEARTBEAT_TIMEOUT: int = int(os.getenv('WORKER_HEARTBEAT_TIMEOUT', '30'))
+    
+    # FSM-хранилище: postgres (общее для всех реплик) или memory
+    FSM_STORAGE: str = os.getenv('FSM_STORAGE', 'postgres').lower()
+    FSM_STATE_TTL: int = int(os.getenv('FSM_STATE_TTL', '86400'))  # секунды
+    FSM_CLEANUP_INTERVAL: int = int(os.getenv('FSM_CLEANUP_INTERVAL', '300'))
+    FSM_CLEANUP_BATCH: int = int(os.getenv('FSM_CLEANUP_BATCH', '1000'))
+    FSM_CACHE_TTL: float = float(os.getenv('FSM_CACHE_TTL', '0'))  # 0 = кэш выключен
+    FSM_CACHE_SIZE: int = int(os.getenv('FSM_CACHE_SIZE', '10000'))
     
     # Payment
     KASPI_PHONE: str = os.getenv('KASPI_PHONE', '+77770000000')
@@ -28,15 +57,93 @@ class Config:
     # Logging
     LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE: str = os.getenv('LOG_FILE', 'bot.log')
+    LOG_FORMAT: str = os.getenv('LOG_FORMAT', 'text').lower()  # text | json
+    
+    # Метрики Prometheus (/metrics на отдельном порту)
+    METRICS_ENABLED: bool = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_HOST: str = os.getenv('METRICS_HOST', '0.0.0.0')
+    METRICS_PORT: int = int(os.getenv('METRICS_PORT', '9100'))
+    
+    # Трассировка обновлений (OTLP JSON в logs/TRACE_FILE)
+    TRACING_ENABLED: bool = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+    TRACE_SAMPLE_RATE: float = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+    TRACE_SLOW_MS: float = float(os.getenv('TRACE_SLOW_MS', '1000'))  # 0 - только выборка
+    TRACE_FILE: str = os.getenv('TRACE_FILE', 'traces.jsonl')
+    
+    # Журнал медленных запросов (0 - выключен) и доля EXPLAIN ANALYZE для них
+    SLOW_QUERY_MS: float = float(os.getenv('SLOW_QUERY_MS', '0'))
+    SLOW_QUERY_EXPLAIN_RATE: float = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', '0.1'))
+    
+    # Наблюдение за ростом памяти (tracemalloc; также /memwatch в админке)
+    MEMORY_WATCH_ENABLED: bool = os.getenv('MEMORY_WATCH_ENABLED', 'false').lower() == 'true'
+    MEMORY_WATCH_INTERVAL: float = float(os.getenv('MEMORY_WATCH_INTERVAL', '900'))  # секунды
+    MEMORY_WATCH_THRESHOLD_MB: float = float(os.getenv('MEMORY_WATCH_THRESHOLD_MB', '50'))
+    
+    # Сторож event loop: стек и обработчик при блокировке дольше порога
+    LOOP_WATCHDOG_ENABLED: bool = os.getenv('LOOP_WATCHDOG_ENABLED', 'true').lower() == 'true'
+    LOOP_LAG_THRESHOLD_MS: float = float(os.getenv('LOOP_LAG_THRESHOLD_MS', '250'))
+    
+    # Запись обезличенных входящих обновлений (gzip JSONL в logs/RECORD_UPDATES_FILE)
+    RECORD_UPDATES_ENABLED: bool = os.getenv('RECORD_UPDATES_ENABLED', 'false').lower() == 'true'
+    RECORD_UPDATES_FILE: str = os.getenv('RECORD_UPDATES_FILE', 'updates.jsonl.gz')
+    RECORD_UPDATES_SECRET: str = os.getenv('RECORD_UPDATES_SECRET', '')
+    RECORD_UPDATES_SAMPLE_RATE: float = float(os.getenv('RECORD_UPDATES_SAMPLE_RATE', '1.0'))  # доля пользователей
+    RECORD_UPDATES_MAX_MB: float = float(os.getenv('RECORD_UPDATES_MAX_MB', '100'))
     
     # Features
     ENABLE_REFERRAL_SYSTEM: bool = os.getenv('ENABLE_REFERRAL_SYSTEM', 'true').lower() == 'true'
     ENABLE_ANALYTICS: bool = os.getenv('ENABLE_ANALYTICS', 'true').lower() == 'true'
     
+    # Параллельная обработка обновлений
+    MAX_CONCURRENT_UPDATES: int = int(os.getenv('MAX_CONCURRENT_UPDATES', '40'))
+    UPDATE_TIMEOUT: float = float(os.getenv('UPDATE_TIMEOUT', '15'))  # секунды
+    # Сколько ждать фоновые задачи (уведомления, рассылку) при остановке
+    BACKGROUND_DRAIN_TIMEOUT: float = float(os.getenv('BACKGROUND_DRAIN_TIMEOUT', '30'))  # секунды
+    
+    # Исходящие запросы к Telegram (на процесс; в supervisor.py делится между воркерами)
+    OUTBOUND_RATE: float = float(os.getenv('OUTBOUND_RATE', '25'))  # запросов в секунду
+    OUTBOUND_BURST: int = int(os.getenv('OUTBOUND_BURST', '5'))
+    
+    # Повторы запросов к Telegram при flood control и сетевых ошибках
+    TELEGRAM_MAX_RETRIES: int = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))
+    TELEGRAM_MAX_RETRY_AFTER: float = float(os.getenv('TELEGRAM_MAX_RETRY_AFTER', '30'))  # секунды
+    
+    # Перепроверка пользователей, заблокировавших бота
+    REACHABILITY_PROBE_INTERVAL: int = int(os.getenv('REACHABILITY_PROBE_INTERVAL', '60'))  # секунды
+    REACHABILITY_PROBE_BATCH: int = int(os.getenv('REACHABILITY_PROBE_BATCH', '20'))
+    REACHABILITY_RECHECK_HOURS: int = int(os.getenv('REACHABILITY_RECHECK_HOURS', '24'))
+    
+    # Кэш карточек номеров
+    PLATE_CACHE_SIZE: int = int(os.getenv('PLATE_CACHE_SIZE', '1000'))
+    PLATE_CACHE_TTL: int = int(os.getenv('PLATE_CACHE_TTL', '60'))  # секунды
+    
+    # Фильтр номеров с отзывами
+    PLATE_FILTER_ENABLED: bool = os.getenv('PLATE_FILTER_ENABLED', 'true').lower() == 'true'
+    PLATE_FILTER_CAPACITY: int = int(os.getenv('PLATE_FILTER_CAPACITY', '100000'))
+    PLATE_FILTER_REFRESH: int = int(os.getenv('PLATE_FILTER_REFRESH', '10'))  # секунды
+    PLATE_FILTER_REBUILD: int = int(os.getenv('PLATE_FILTER_REBUILD', '3600'))  # секунды
+    
     # Rate Limiting
     MAX_SEARCHES_PER_DAY_FREE: int = int(os.getenv('MAX_SEARCHES_PER_DAY_FREE', '3'))
     MAX_REVIEWS_PER_DAY: int = int(os.getenv('MAX_REVIEWS_PER_DAY', '10'))
     
+    # Анти-флуд (действий в минуту на пользователя)
+    THROTTLE_ENABLED: bool = os.getenv('THROTTLE_ENABLED', 'true').lower() == 'true'
+    THROTTLE_SEARCH_PER_MIN: float = float(os.getenv('THROTTLE_SEARCH_PER_MIN', '20'))
+    THROTTLE_REVIEW_PER_MIN: float = float(os.getenv('THROTTLE_REVIEW_PER_MIN', '30'))
+    THROTTLE_REACTION_PER_MIN: float = float(os.getenv('THROTTLE_REACTION_PER_MIN', '30'))
+    THROTTLE_CALLBACK_PER_MIN: float = float(os.getenv('THROTTLE_CALLBACK_PER_MIN', '60'))
+    THROTTLE_MESSAGE_PER_MIN: float = float(os.getenv('THROTTLE_MESSAGE_PER_MIN', '60'))
+    THROTTLE_BURST: int = int(os.getenv('THROTTLE_BURST', '5'))
+    THROTTLE_MAX_BUCKETS: int = int(os.getenv('THROTTLE_MAX_BUCKETS', '50000'))
+    
+    # Дубли и спам в отзывах
+    DUPLICATE_CHECK_ENABLED: bool = os.getenv('DUPLICATE_CHECK_ENABLED', 'true').lower() == 'true'
+    DUPLICATE_PLATE_COOLDOWN_HOURS: int = int(os.getenv('DUPLICATE_PLATE_COOLDOWN_HOURS', '24'))
+    
+    # Фильтр мата и персональных данных (словарь перечитывается при изменении)
+    PROFANITY_FILE: str = os.getenv('PROFANITY_FILE', 'data/profanity.txt')
+    
     # Subscription Pricing (в тенге)
     PRICE_BASIC: int = int(os.getenv('PRICE_BASIC', '500'))
     PRICE_PREMIUM: int = int(os.getenv('PRICE_PREMIUM', '1000'))
@@ -66,6 +173,18 @@ class Config:
         if not cls.DATABASE_URL:
             errors.append("❌ DATABASE_URL не установлен")
         
+        if cls.BOT_MODE not in ('polling', 'webhook'):
+            errors.append(f"❌ Неизвестный BOT_MODE: {cls.BOT_MODE} (ожидается polling или webhook)")
+        
+        if cls.FSM_STORAGE not in ('postgres', 'memory'):
+            errors.append(f"❌ Неизвестный FSM_STORAGE: {cls.FSM_STORAGE} (ожидается postgres или memory)")
+        
+        if cls.BOT_MODE == 'webhook':
+            if not cls.WEBHOOK_BASE_URL:
+                errors.append("❌ WEBHOOK_BASE_URL не установлен (нужен для BOT_MODE=webhook)")
+            if not cls.WEBHOOK_SECRET:
+                errors.append("❌ WEBHOOK_SECRET не установлен (нужен для BOT_MODE=webhook)")
+        
         if errors:
             print("\n🚨 ОШИБКИ КОНФИГУРАЦИИ:\n")
             for error in errors:
@@ -80,6 +199,22 @@ class Config:
         """Возвращает название региона по номеру"""
         region_code = plate[-2:] if len(plate) >= 2 else ""
         return cls.KZ_REGIONS.get(region_code, "Регион не определен")
+    
+    @classmethod
+    def get_throttle_rates(cls) -> dict:
+        """Возвращает лимиты анти-флуда в токенах в секунду"""
+        return {
+            'search': cls.THROTTLE_SEARCH_PER_MIN / 60,
+            'review': cls.THROTTLE_REVIEW_PER_MIN / 60,
+            'reaction': cls.THROTTLE_REACTION_PER_MIN / 60,
+            'callback': cls.THROTTLE_CALLBACK_PER_MIN / 60,
+            'message': cls.THROTTLE_MESSAGE_PER_MIN / 60,
+        }
+    
+    @classmethod
+    def get_webhook_url(cls) -> str:
+        """Возвращает полный URL вебхука"""
+        return cls.WEBHOOK_BASE_URL.rstrip('/') + cls.WEBHOOK_PATH
 
 
 # Экспортируем экземпляр конфигурации
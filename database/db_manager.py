@@ -1,33 +1,111 @@
 """
 Менеджер базы данных с пулом соединений и безопасными запросами.
 """
+import asyncio
+import functools
+import inspect
+import time
 import asyncpg
-from typing import List, Dict, Any, Optional
+from collections import Counter
+from typing import List, Dict, Any, Optional, AsyncIterator, Hashable
 from datetime import datetime, timedelta
 from contextlib import asynccontextmanager
 
 from config import config
+from database.slow_query import current_db_method, slow_query_log
 from utils.logger import logger
+from utils.metrics import DB_ERRORS, DB_LATENCY, DB_POOL_WAIT
+from utils.plate_cache import plate_cache
+from utils.plate_filter import plate_filter
+from utils.tracing import KIND_CLIENT, tracer
 
 
+# Сколько ключей держим в метриках схлопывания
+SINGLE_FLIGHT_TRACKED_KEYS = 1000
+
+
+def single_flight(method):
+    """
+    Одновременные вызовы метода с одинаковыми аргументами выполняют один запрос.
+    
+    Результат общий для всех ожидающих - вызывающий код не должен его изменять.
+    
+    Первый аргумент - номер: в ключ входит версия номера из plate_cache.
+    После записи (bump) новые вызовы не присоединяются к чтению, начатому
+    до нее, - иначе PlateCardCache сохранил бы старый результат под новой
+    версией и свежий отзыв не был бы виден до истечения TTL.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, plate, *args, **kwargs):
+        args = (plate, *args)
+        key = (method.__name__, args, tuple(sorted(kwargs.items())), plate_cache.version(plate))
+        return await self._single_flight(key, lambda: method(self, *args, **kwargs))
+    return wrapper
+
+
+def _timed(name: str, method):
+    span_name = f"db {name}"
+    
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = current_db_method.set(name)
+        start = time.perf_counter()
+        try:
+            with tracer.span(span_name, KIND_CLIENT, **{'db.system': 'postgresql', 'db.operation': name}):
+                return await method(*args, **kwargs)
+        except Exception as e:
+            DB_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - start, name)
+            current_db_method.reset(token)
+    return wrapper
+
+
+def instrument_queries(cls):
+    """
+    Оборачивает публичные async-методы замером времени и ошибок
+    (метрики), span трассировки и именем метода для журнала медленных запросов.
+    
+    Если все три выключены, класс не меняется - накладных расходов нет.
+    """
+    if not (config.METRICS_ENABLED or config.TRACING_ENABLED or slow_query_log.enabled):
+        return cls
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or name in ('init_pool', 'close_pool'):
+            continue
+        if inspect.iscoroutinefunction(method):
+            setattr(cls, name, _timed(name, method))
+    return cls
+
+
+@instrument_queries
 class DatabaseManager:
     """Менеджер для работы с PostgreSQL базой данных"""
     
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        # Запросы на чтение в полете: ключ -> задача
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.flights = 0
+        self.collapsed = 0
+        self._collapsed_by_key: Counter = Counter()
     
-    async def init_pool(self):
+    async def init_pool(self, min_size: Optional[int] = None, max_size: Optional[int] = None):
         """Инициализирует пул соединений"""
         try:
             self.pool = await asyncpg.create_pool(
                 config.DATABASE_URL,
-                min_size=5,
-                max_size=20,
-                command_timeout=60
+                min_size=min_size or config.DB_POOL_MIN_SIZE,
+                max_size=max_size or config.DB_POOL_MAX_SIZE,
+                command_timeout=60,
+                # Журнал медленных запросов подключается к каждому соединению
+                init=slow_query_log.attach if slow_query_log.enabled else None
             )
+            slow_query_log.start(self)
             logger.info("✅ Пул соединений с БД создан")
         except Exception as e:
-            logger.error(f"❌ Ошибка подключения к БД: {e}")
+            logger.error("❌ Ошибка подключения к БД: %s", e)
             raise
     
     async def close_pool(self):
@@ -39,9 +117,45 @@ class DatabaseManager:
     @asynccontextmanager
     async def acquire(self):
         """Контекстный менеджер для получения соединения из пула"""
+        start = time.perf_counter()
         async with self.pool.acquire() as conn:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
             yield conn
     
+    async def _single_flight(self, key: Hashable, factory):
+        """Присоединяется к запросу в полете или запускает новый"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._flight_done, key))
+            self.flights += 1
+        else:
+            self.collapsed += 1
+            self._collapsed_by_key[f"{key[0]}:{key[1][0] if key[1] else ''}"] += 1
+            if len(self._collapsed_by_key) > SINGLE_FLIGHT_TRACKED_KEYS:
+                self._collapsed_by_key = Counter(
+                    dict(self._collapsed_by_key.most_common(SINGLE_FLIGHT_TRACKED_KEYS // 2))
+                )
+        # Отмена одного ожидающего (дедлайн обновления) не отменяет запрос для остальных
+        return await asyncio.shield(task)
+    
+    def _flight_done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Ошибку уже получили ожидающие; если все отменились - не шумим в логе
+        if not task.cancelled():
+            task.exception()
+    
+    def single_flight_stats(self, top: int = 5) -> Dict[str, Any]:
+        """Метрики схлопывания одинаковых запросов"""
+        return {
+            'flights': self.flights,
+            'collapsed': self.collapsed,
+            'in_flight': len(self._inflight),
+            'top_keys': self._collapsed_by_key.most_common(top),
+        }
+    
     async def init_tables(self):
         """Создает таблицы если их нет"""
         async with self.acquire() as conn:
@@ -59,6 +173,14 @@ class DatabaseManager:
                 )
             ''')
             
+            # Недоступные пользователи (заблокировали бота, удалили аккаунт)
+            await conn.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS unreachable_since TIMESTAMP')
+            await conn.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS reachability_checked_at TIMESTAMP')
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_users_unreachable
+                ON users(reachability_checked_at NULLS FIRST) WHERE unreachable_since IS NOT NULL
+            ''')
+            
             # Таблица отзывов
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS reviews (
@@ -157,6 +279,60 @@ class DatabaseManager:
             ''')
             await conn.execute('CREATE INDEX IF NOT EXISTS idx_car_reactions_plate ON car_reactions(plate)')
             
+            # Таблица FSM-состояний (UNLOGGED: без WAL, переживает штатный рестарт,
+            # но очищается после аварийного падения сервера БД)
+            await conn.execute('''
+                CREATE UNLOGGED TABLE IF NOT EXISTS fsm_storage (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data JSONB NOT NULL DEFAULT '{}'::jsonb,
+                    expires_at TIMESTAMP NOT NULL
+                )
+            ''')
+            await conn.execute('CREATE INDEX IF NOT EXISTS idx_fsm_storage_expires ON fsm_storage(expires_at)')
+            
+            # Отпечатки текстов отзывов (поиск дублей и спама)
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS review_fingerprints (
+                    review_id INTEGER PRIMARY KEY,
+                    user_id BIGINT NOT NULL,
+                    plate TEXT NOT NULL,
+                    text_hash BIGINT NOT NULL,
+                    simhash BIGINT NOT NULL,
+                    band0 INTEGER NOT NULL,
+                    band1 INTEGER NOT NULL,
+                    band2 INTEGER NOT NULL,
+                    band3 INTEGER NOT NULL,
+                    cluster_id INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'ok' CHECK (status IN ('ok', 'flagged')),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (review_id) REFERENCES reviews(id)
+                )
+            ''')
+            await conn.execute('CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON review_fingerprints(text_hash)')
+            for band in range(4):
+                await conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_fingerprints_band{band} ON review_fingerprints(band{band})'
+                )
+            
+            # Планы медленных запросов (database/slow_query.py)
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS query_plans (
+                    id SERIAL PRIMARY KEY,
+                    query_hash TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    method TEXT,
+                    duration_ms DOUBLE PRECISION NOT NULL,
+                    explain_ms DOUBLE PRECISION,
+                    seq_scans TEXT[] NOT NULL DEFAULT '{}',
+                    plan JSONB NOT NULL,
+                    captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            await conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_query_plans_hash ON query_plans(query_hash, captured_at DESC)'
+            )
+            
             logger.info("✅ Таблицы БД инициализированы")
     
     # --- ПОЛЬЗОВАТЕЛИ ---
@@ -168,7 +344,8 @@ class DatabaseManager:
                 INSERT INTO users (user_id, username, full_name, last_active)
                 VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
                 ON CONFLICT (user_id) DO UPDATE
-                SET username = $2, full_name = $3, last_active = CURRENT_TIMESTAMP
+                SET username = $2, full_name = $3, last_active = CURRENT_TIMESTAMP,
+                    unreachable_since = NULL
             ''', user_id, username, full_name)
     
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
@@ -186,6 +363,54 @@ class DatabaseManager:
             )
             return result or False
     
+    async def mark_user_unreachable(self, user_id: int) -> None:
+        """Помечает пользователя недоступным (бот заблокирован или чат не найден)"""
+        async with self.acquire() as conn:
+            await conn.execute('''
+                UPDATE users
+                SET unreachable_since = COALESCE(unreachable_since, CURRENT_TIMESTAMP),
+                    reachability_checked_at = CURRENT_TIMESTAMP
+                WHERE user_id = $1
+            ''', user_id)
+    
+    async def mark_user_reachable(self, user_id: int) -> None:
+        """Снимает отметку недоступности"""
+        async with self.acquire() as conn:
+            await conn.execute('''
+                UPDATE users SET unreachable_since = NULL, reachability_checked_at = CURRENT_TIMESTAMP
+                WHERE user_id = $1 AND unreachable_since IS NOT NULL
+            ''', user_id)
+    
+    async def get_users_to_reprobe(self, limit: int, recheck_hours: int) -> List[int]:
+        """Недоступные пользователи, которых давно не проверяли"""
+        async with self.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT user_id FROM users
+                WHERE unreachable_since IS NOT NULL
+                  AND (reachability_checked_at IS NULL
+                       OR reachability_checked_at < CURRENT_TIMESTAMP - $2::int * INTERVAL '1 hour')
+                ORDER BY reachability_checked_at NULLS FIRST
+                LIMIT $1
+            ''', limit, recheck_hours)
+            return [row['user_id'] for row in rows]
+    
+    async def touch_reachability_check(self, user_ids: List[int]) -> None:
+        """Запоминает время последней проверки доступности"""
+        async with self.acquire() as conn:
+            await conn.execute('''
+                UPDATE users SET reachability_checked_at = CURRENT_TIMESTAMP
+                WHERE user_id = ANY($1::bigint[])
+            ''', user_ids)
+    
+    async def get_broadcast_recipients(self) -> List[int]:
+        """Получатели рассылки: не забанены и доступны"""
+        async with self.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT user_id FROM users
+                WHERE is_banned = FALSE AND unreachable_since IS NULL
+            ''')
+            return [row['user_id'] for row in rows]
+    
     # --- ОТЗЫВЫ ---
     
     async def create_review(
@@ -206,10 +431,13 @@ class DatabaseManager:
                 VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
                 RETURNING id
             ''', plate, rating, comment, user_id, photo_id, video_id, latitude, longitude)
+            plate_cache.bump(plate)
+            plate_filter.add(plate)
             
-            logger.info(f"✅ Создан отзыв #{review_id} для {plate} от пользователя {user_id}")
+            logger.info("✅ Создан отзыв #%s для %s от пользователя %s", review_id, plate, user_id)
             return review_id
     
+    @single_flight
     async def get_reviews_by_plate(self, plate: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Получает все отзывы по номеру с информацией об авторе"""
         async with self.acquire() as conn:
@@ -226,6 +454,7 @@ class DatabaseManager:
             rows = await conn.fetch(query, plate)
             return [dict(row) for row in rows]
     
+    @single_flight
     async def get_review_stats(self, plate: str) -> Dict[str, Any]:
         """Получает статистику по номеру"""
         async with self.acquire() as conn:
@@ -240,6 +469,40 @@ class DatabaseManager:
             
             return dict(stats) if stats else {'review_count': 0, 'avg_rating': 0, 'last_review_date': None}
     
+    async def iter_reviewed_plates(self, prefetch: int = 5000) -> AsyncIterator[str]:
+        """Потоково перебирает номера, по которым есть отзывы"""
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(
+                    'SELECT DISTINCT plate FROM reviews WHERE is_deleted = FALSE',
+                    prefetch=prefetch
+                ):
+                    yield row['plate']
+    
+    async def get_reviewed_plates_after(self, after_id: int, limit: int = 10000) -> List[Dict[str, Any]]:
+        """Номера отзывов с id больше заданного (по первичному ключу)"""
+        async with self.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT id, plate FROM reviews
+                WHERE id > $1 AND is_deleted = FALSE
+                ORDER BY id
+                LIMIT $2
+            ''', after_id, limit)
+            return [dict(row) for row in rows]
+    
+    async def get_reviews_max_id(self) -> int:
+        """Последний выданный id отзыва"""
+        async with self.acquire() as conn:
+            return await conn.fetchval('SELECT COALESCE(MAX(id), 0) FROM reviews')
+    
+    async def estimate_review_count(self) -> int:
+        """Оценка числа отзывов из статистики планировщика (без сканирования)"""
+        async with self.acquire() as conn:
+            estimate = await conn.fetchval(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = 'reviews'"
+            )
+            return max(estimate or 0, 0)
+    
     async def delete_reviews_by_plate(self, plate: str) -> int:
         """Мягкое удаление всех отзывов по номеру"""
         async with self.acquire() as conn:
@@ -248,10 +511,103 @@ class DatabaseManager:
                 WHERE plate = $1 AND is_deleted = FALSE
                 RETURNING COUNT(*)
             ''', plate)
+            plate_cache.bump(plate)
             
-            logger.warning(f"🗑 Удалено {count} отзывов для номера {plate}")
+            logger.warning("🗑 Удалено %s отзывов для номера %s", count, plate)
             return count or 0
     
+    # --- ДУБЛИ ОТЗЫВОВ ---
+    
+    async def find_duplicate_candidates(
+        self,
+        text_hash: int,
+        bands: tuple,
+        limit: int = 50,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Отпечатки неудаленных отзывов с тем же хешем текста или хотя бы одной
+        общей полосой SimHash.
+        
+        Точные совпадения выбираются отдельно, со своим LIMIT: случайные
+        совпадения полос у новых отзывов не вытесняют старый точный дубль.
+        Точные совпадения пользователя user_id идут первыми.
+        """
+        async with self.acquire() as conn:
+            rows = await conn.fetch('''
+                (
+                    SELECT f.review_id, f.user_id, f.plate, f.text_hash, f.simhash, f.cluster_id
+                    FROM review_fingerprints f
+                    JOIN reviews r ON r.id = f.review_id AND r.is_deleted = FALSE
+                    WHERE f.text_hash = $1
+                    ORDER BY (f.user_id = $7) DESC NULLS LAST, f.review_id DESC
+                    LIMIT $6
+                )
+                UNION ALL
+                (
+                    SELECT f.review_id, f.user_id, f.plate, f.text_hash, f.simhash, f.cluster_id
+                    FROM review_fingerprints f
+                    JOIN reviews r ON r.id = f.review_id AND r.is_deleted = FALSE
+                    WHERE f.text_hash <> $1
+                      AND (f.band0 = $2 OR f.band1 = $3 OR f.band2 = $4 OR f.band3 = $5)
+                    ORDER BY f.review_id DESC
+                    LIMIT $6
+                )
+            ''', text_hash, *bands, limit, user_id)
+            return [dict(row) for row in rows]
+    
+    async def count_recent_user_plate_reviews(self, user_id: int, plate: str, hours: int) -> int:
+        """Сколько отзывов пользователь оставил на номер за последние часы"""
+        async with self.acquire() as conn:
+            return await conn.fetchval('''
+                SELECT COUNT(*) FROM reviews
+                WHERE user_id = $1 AND plate = $2 AND is_deleted = FALSE
+                  AND created_at > CURRENT_TIMESTAMP - $3::int * INTERVAL '1 hour'
+            ''', user_id, plate, hours)
+    
+    async def save_review_fingerprint(
+        self,
+        review_id: int,
+        user_id: int,
+        plate: str,
+        text_hash: int,
+        simhash: int,
+        bands: tuple,
+        cluster_id: Optional[int] = None,
+        status: str = 'ok'
+    ) -> None:
+        """Сохраняет отпечаток отзыва"""
+        async with self.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO review_fingerprints
+                    (review_id, user_id, plate, text_hash, simhash, band0, band1, band2, band3, cluster_id, status)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+                ON CONFLICT (review_id) DO NOTHING
+            ''', review_id, user_id, plate, text_hash, simhash, *bands, cluster_id or review_id, status)
+    
+    async def get_duplicate_clusters(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Крупнейшие группы одинаковых и почти одинаковых отзывов"""
+        async with self.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT c.*, r.comment AS sample_comment
+                FROM (
+                    SELECT cluster_id,
+                           COUNT(*) AS review_count,
+                           COUNT(DISTINCT user_id) AS user_count,
+                           COUNT(DISTINCT plate) AS plate_count,
+                           COUNT(*) FILTER (WHERE status = 'flagged') AS flagged_count,
+                           MAX(created_at) AS last_seen
+                    FROM review_fingerprints
+                    GROUP BY cluster_id
+                    HAVING COUNT(*) > 1
+                    ORDER BY COUNT(*) DESC
+                    LIMIT $1
+                ) c
+                LEFT JOIN reviews r ON r.id = c.cluster_id
+                ORDER BY c.review_count DESC
+            ''', limit)
+            return [dict(row) for row in rows]
+    
     # --- ПОДПИСКИ НА АВТО ---
     
     async def subscribe_to_plate(self, user_id: int, plate: str) -> bool:
@@ -262,7 +618,7 @@ class DatabaseManager:
                     INSERT INTO subscriptions (user_id, plate)
                     VALUES ($1, $2)
                 ''', user_id, plate)
-                logger.info(f"✅ Пользователь {user_id} подписан на {plate}")
+                logger.info("✅ Пользователь %s подписан на %s", user_id, plate)
                 return True
             except asyncpg.UniqueViolationError:
                 return False
@@ -276,7 +632,7 @@ class DatabaseManager:
             ''', user_id, plate)
             deleted = result.split()[-1] != '0'
             if deleted:
-                logger.info(f"🗑 Пользователь {user_id} отписан от {plate}")
+                logger.info("🗑 Пользователь %s отписан от %s", user_id, plate)
             return deleted
     
     async def get_user_subscriptions(self, user_id: int) -> List[Dict[str, Any]]:
@@ -293,12 +649,13 @@ class DatabaseManager:
             return [dict(row) for row in rows]
     
     async def get_plate_subscribers(self, plate: str) -> List[int]:
-        """Получает список пользователей, подписанных на номер"""
+        """Получает список доступных пользователей, подписанных на номер"""
         async with self.acquire() as conn:
-            rows = await conn.fetch(
-                'SELECT user_id FROM subscriptions WHERE plate = $1',
-                plate
-            )
+            rows = await conn.fetch('''
+                SELECT s.user_id FROM subscriptions s
+                JOIN users u ON u.user_id = s.user_id
+                WHERE s.plate = $1 AND u.unreachable_since IS NULL
+            ''', plate)
             return [row['user_id'] for row in rows]
     
     # --- ПЛАТНЫЕ ПОДПИСКИ ---
@@ -332,7 +689,7 @@ class DatabaseManager:
                 SET tier = $2, expires_at = $3, started_at = CURRENT_TIMESTAMP
             ''', user_id, tier, expires_at)
             
-            logger.info(f"💎 Пользователю {user_id} установлена подписка {tier} до {expires_at}")
+            logger.info("💎 Пользователю %s установлена подписка %s до %s", user_id, tier, expires_at)
     
     # --- ЛИМИТЫ ИСПОЛЬЗОВАНИЯ ---
     
@@ -422,6 +779,13 @@ class DatabaseManager:
             'changed' - реакция изменена (с like на dislike или наоборот)
             'removed' - реакция удалена (повторное нажатие)
         """
+        try:
+            return await self._set_car_reaction(plate, user_id, vote_type)
+        finally:
+            # Счетчики в карточке номера устарели
+            plate_cache.bump(plate)
+    
+    async def _set_car_reaction(self, plate: str, user_id: int, vote_type: str) -> str:
         async with self.acquire() as conn:
             # Проверяем существующую реакцию
             existing = await conn.fetchrow(
@@ -452,6 +816,7 @@ class DatabaseManager:
                 )
                 return 'added'
     
+    @single_flight
     async def get_car_reactions(self, plate: str) -> Dict[str, int]:
         """Получает количество реакций на авто"""
         async with self.acquire() as conn:
@@ -474,6 +839,48 @@ class DatabaseManager:
             )
             return result
 
+    
+    # --- МЕДЛЕННЫЕ ЗАПРОСЫ ---
+    
+    async def save_query_plan(
+        self,
+        query_hash: str,
+        query: str,
+        method: Optional[str],
+        duration_ms: float,
+        explain_ms: Optional[float],
+        seq_scans: List[str],
+        plan: str
+    ) -> int:
+        """Сохраняет план медленного запроса"""
+        async with self.acquire() as conn:
+            return await conn.fetchval('''
+                INSERT INTO query_plans (query_hash, query, method, duration_ms, explain_ms, seq_scans, plan)
+                VALUES ($1, $2, $3, $4, $5, $6, $7::jsonb)
+                RETURNING id
+            ''', query_hash, query, method, duration_ms, explain_ms, seq_scans, plan)
+    
+    async def get_slow_query_summary(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Медленные запросы: по одной строке на запрос, последний план"""
+        async with self.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT DISTINCT ON (query_hash)
+                    id, query_hash, query, method, explain_ms, seq_scans, captured_at,
+                    COUNT(*) OVER w AS captures,
+                    MAX(duration_ms) OVER w AS max_duration_ms
+                FROM query_plans
+                WINDOW w AS (PARTITION BY query_hash)
+                ORDER BY query_hash, captured_at DESC
+            ''')
+            rows = sorted(rows, key=lambda r: r['max_duration_ms'], reverse=True)[:limit]
+            return [dict(row) for row in rows]
+    
+    async def get_query_plan(self, plan_id: int) -> Optional[Dict[str, Any]]:
+        """Один сохраненный план"""
+        async with self.acquire() as conn:
+            row = await conn.fetchrow('SELECT * FROM query_plans WHERE id = $1', plan_id)
+            return dict(row) if row else None
+
 
 # Глобальный экземпляр менеджера БД
 db = DatabaseManager()
@@ -0,0 +1,218 @@
+"""
+FSM-хранилище aiogram поверх PostgreSQL.
+
+Состояния диалогов (ReviewForm, SearchForm, GarageForm, PaymentForm, AdminState)
+переживают рестарт и доступны всем репликам бота.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from database.db_manager import DatabaseManager
+from utils.logger import logger
+
+
+class PostgresStorage(BaseStorage):
+    """
+    Хранит состояние и данные FSM в одной строке таблицы fsm_storage.
+
+    - у каждой записи свой срок жизни (expires_at), продлевается при записи;
+    - просроченные записи удаляются фоновой задачей пачками;
+    - опциональный локальный кэш чтения (cache_ttl > 0) снимает нагрузку с БД,
+      но между репликами допускает устаревание данных на cache_ttl секунд.
+    """
+
+    # Условие повторяется в запросе, чтобы не удалить то, что успела записать другая реплика
+    _DELETE_EMPTY = '''
+        DELETE FROM fsm_storage
+        WHERE key = $1 AND state IS NULL AND data = '{}'::jsonb
+    '''
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        state_ttl: int = 86400,
+        cleanup_interval: int = 300,
+        cleanup_batch: int = 1000,
+        cache_ttl: float = 0,
+        cache_size: int = 10000,
+        key_builder: Optional[KeyBuilder] = None
+    ):
+        self.db = db
+        self.state_ttl = state_ttl
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch = cleanup_batch
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(prefix="fsm")
+        # key -> (момент устаревания, state, data)
+        self._cache: "OrderedDict[str, Tuple[float, Optional[str], Dict[str, Any]]]" = OrderedDict()
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    # --- ЛОКАЛЬНЫЙ КЭШ ---
+
+    def _cache_get(self, key: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        if not self.cache_ttl:
+            return None
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1], entry[2]
+
+    def _cache_put(self, key: str, state: Optional[str], data: Dict[str, Any]):
+        if not self.cache_ttl:
+            return
+        self._cache[key] = (time.monotonic() + self.cache_ttl, state, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # --- ЧТЕНИЕ ---
+
+    async def _load(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Читает state и data одной строкой (с учетом кэша)"""
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        async with self.db.acquire() as conn:
+            row = await conn.fetchrow('''
+                SELECT state, data FROM fsm_storage
+                WHERE key = $1 AND expires_at > CURRENT_TIMESTAMP
+            ''', key)
+
+        if row:
+            state, data = row['state'], json.loads(row['data'])
+        else:
+            state, data = None, {}
+
+        self._cache_put(key, state, data)
+        return state, data
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        return deepcopy(data)
+
+    # --- ЗАПИСЬ ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        state = state.state if isinstance(state, State) else state
+
+        async with self.db.acquire() as conn:
+            if state is None:
+                # Пустые записи не храним - таблица остается компактной
+                row = await conn.fetchrow('''
+                    UPDATE fsm_storage
+                    SET state = NULL, expires_at = CURRENT_TIMESTAMP + $2::int * INTERVAL '1 second'
+                    WHERE key = $1
+                    RETURNING data
+                ''', storage_key, self.state_ttl)
+                data = json.loads(row['data']) if row else {}
+                if row and not data:
+                    await conn.execute(self._DELETE_EMPTY, storage_key)
+            else:
+                row = await conn.fetchrow('''
+                    INSERT INTO fsm_storage (key, state, expires_at)
+                    VALUES ($1, $2, CURRENT_TIMESTAMP + $3::int * INTERVAL '1 second')
+                    ON CONFLICT (key) DO UPDATE
+                    SET state = $2,
+                        expires_at = EXCLUDED.expires_at,
+                        data = CASE WHEN fsm_storage.expires_at > CURRENT_TIMESTAMP
+                                    THEN fsm_storage.data ELSE '{}'::jsonb END
+                    RETURNING data
+                ''', storage_key, state, self.state_ttl)
+                data = json.loads(row['data'])
+
+        self._cache_put(storage_key, state, data)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        data = deepcopy(data)
+
+        async with self.db.acquire() as conn:
+            if not data:
+                row = await conn.fetchrow('''
+                    UPDATE fsm_storage
+                    SET data = '{}'::jsonb, expires_at = CURRENT_TIMESTAMP + $2::int * INTERVAL '1 second'
+                    WHERE key = $1
+                    RETURNING state
+                ''', storage_key, self.state_ttl)
+                state = row['state'] if row else None
+                if row and state is None:
+                    await conn.execute(self._DELETE_EMPTY, storage_key)
+            else:
+                state = await conn.fetchval('''
+                    INSERT INTO fsm_storage (key, data, expires_at)
+                    VALUES ($1, $2::jsonb, CURRENT_TIMESTAMP + $3::int * INTERVAL '1 second')
+                    ON CONFLICT (key) DO UPDATE
+                    SET data = EXCLUDED.data,
+                        expires_at = EXCLUDED.expires_at,
+                        state = CASE WHEN fsm_storage.expires_at > CURRENT_TIMESTAMP
+                                     THEN fsm_storage.state ELSE NULL END
+                    RETURNING state
+                ''', storage_key, json.dumps(data, ensure_ascii=False), self.state_ttl)
+
+        self._cache_put(storage_key, state, data)
+
+    # --- ОЧИСТКА ---
+
+    async def cleanup_expired(self) -> int:
+        """Удаляет просроченные записи пачками, чтобы не держать долгих блокировок"""
+        total = 0
+        while True:
+            async with self.db.acquire() as conn:
+                result = await conn.execute('''
+                    DELETE FROM fsm_storage
+                    WHERE key IN (
+                        SELECT key FROM fsm_storage
+                        WHERE expires_at <= CURRENT_TIMESTAMP
+                        LIMIT $1
+                    )
+                ''', self.cleanup_batch)
+            deleted = int(result.split()[-1])
+            total += deleted
+            if deleted < self.cleanup_batch:
+                break
+            # Отдаем соединение другим запросам между пачками
+            await asyncio.sleep(0)
+        return total
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                deleted = await self.cleanup_expired()
+                if deleted:
+                    logger.info("🧹 Удалено %s просроченных FSM-состояний", deleted)
+            except Exception as e:
+                logger.error("Ошибка очистки FSM-хранилища: %s", e)
+
+    def start_cleanup(self):
+        """Запускает фоновую очистку просроченных записей"""
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self) -> None:
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+        self._cache.clear()
@@ -0,0 +1,219 @@
+"""
+Журнал медленных запросов с автоматическим EXPLAIN.
+
+К каждому соединению пула подключается query logger asyncpg: он получает
+время выполнения каждого запроса. Запросы дольше SLOW_QUERY_MS пишутся в
+лог вместе с методом DatabaseManager и "формой" параметров (типы и длины,
+без значений - в параметрах бывают персональные данные).
+
+Для части медленных SELECT (SLOW_QUERY_EXPLAIN_RATE, не чаще раза в
+EXPLAIN_INTERVAL на один запрос) в фоне выполняется
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) с теми же параметрами на отдельном
+соединении, в откатываемой транзакции и с statement_timeout. План
+сохраняется в таблицу query_plans, админ смотрит их в админ-панели.
+Запросы на запись не анализируются: EXPLAIN ANALYZE их выполнил бы.
+
+По умолчанию журнал выключен (SLOW_QUERY_MS=0): включается на время
+расследования, бенчмарки выключают его явно.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Set
+
+from config import config
+from utils.logger import logger
+
+# Метка запросов самого журнала: их не логируем и не анализируем
+MARKER = '/* slow-query-log */'
+
+# Не анализировать один и тот же запрос чаще, секунды
+EXPLAIN_INTERVAL = 600
+EXPLAIN_TIMEOUT_MS = 10_000
+
+# Длина текста запроса в логе
+LOG_QUERY_CHARS = 300
+
+# Метод DatabaseManager, выполняющий запрос (ставит instrument_queries)
+current_db_method: ContextVar[Optional[str]] = ContextVar('current_db_method', default=None)
+
+
+def normalize_query(query: str) -> str:
+    """Запрос в одну строку"""
+    return ' '.join(query.split())
+
+
+def query_hash(normalized: str) -> str:
+    return hashlib.md5(normalized.encode()).hexdigest()[:16]
+
+
+def param_shapes(args) -> str:
+    """Типы и размеры параметров без значений: "int, str(8), list[3], None" """
+    shapes = []
+    for arg in args or ():
+        if arg is None:
+            shapes.append('None')
+        elif isinstance(arg, (str, bytes)):
+            shapes.append(f"{type(arg).__name__}({len(arg)})")
+        elif isinstance(arg, (list, tuple)):
+            shapes.append(f"{type(arg).__name__}[{len(arg)}]")
+        else:
+            shapes.append(type(arg).__name__)
+    return ', '.join(shapes) or '-'
+
+
+def is_explainable(normalized: str) -> bool:
+    """Только чтение: EXPLAIN ANALYZE выполняет запрос по-настоящему"""
+    upper = normalized.upper()
+    return upper.startswith('SELECT') and ' FOR UPDATE' not in upper and ' FOR SHARE' not in upper
+
+
+def seq_scans(plan: Dict[str, Any]) -> List[str]:
+    """Таблицы, которые план читает последовательным сканированием"""
+    result = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if node.get('Node Type') == 'Seq Scan':
+            result.append(node.get('Relation Name', '?'))
+        stack.extend(node.get('Plans', ()))
+    return sorted(set(result))
+
+
+def render_plan(plan: Dict[str, Any], limit: int = 40) -> str:
+    """Краткое текстовое дерево плана для админа"""
+    lines = []
+
+    def walk(node: Dict[str, Any], depth: int):
+        if len(lines) >= limit:
+            return
+        label = node.get('Node Type', '?')
+        if node.get('Relation Name'):
+            label += f" on {node['Relation Name']}"
+        if node.get('Index Name'):
+            label += f" using {node['Index Name']}"
+        loops = node.get('Actual Loops', 1)
+        lines.append(
+            f"{'  ' * depth}{label}: {node.get('Actual Total Time', 0):.2f} мс"
+            f" x{loops}, строк {node.get('Actual Rows', 0)}"
+            f", буферов {node.get('Shared Hit Blocks', 0)}/{node.get('Shared Read Blocks', 0)}"
+        )
+        for child in node.get('Plans', ()):
+            walk(child, depth + 1)
+
+    walk(plan, 0)
+    return '\n'.join(lines)
+
+
+class SlowQueryLog:
+    """Query logger для соединений пула"""
+
+    def __init__(self, threshold_ms: float, explain_rate: float):
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self._db = None
+        self._explained_at: Dict[str, float] = {}
+        self._explaining = False
+        self._tasks: Set[asyncio.Task] = set()
+        # Метрики
+        self.slow = 0
+        self.explained = 0
+        self.by_method: Counter = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def start(self, db):
+        """Привязывает журнал к менеджеру БД (для EXPLAIN и сохранения планов)"""
+        self._db = db
+
+    async def attach(self, conn):
+        """init пула: подключает query logger к новому соединению"""
+        conn.add_query_logger(self.on_query)
+
+    def on_query(self, record):
+        """Вызывается asyncpg после каждого запроса"""
+        if record.elapsed < self.threshold or MARKER in record.query:
+            return
+
+        method = current_db_method.get()
+        normalized = normalize_query(record.query)
+        elapsed_ms = record.elapsed * 1000
+        self.slow += 1
+        self.by_method[method or '?'] += 1
+        logger.warning(
+            "🐌 Медленный запрос %.0f мс (%s): %s | параметры: %s",
+            elapsed_ms, method or '?', normalized[:LOG_QUERY_CHARS], param_shapes(record.args)
+        )
+
+        if self._should_explain(normalized):
+            task = asyncio.get_running_loop().create_task(
+                self._explain(record.query, record.args, normalized, method, elapsed_ms)
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _should_explain(self, normalized: str) -> bool:
+        if self._db is None or self._explaining or not is_explainable(normalized):
+            return False
+        if random.random() >= self.explain_rate:
+            return False
+        now = time.monotonic()
+        key = query_hash(normalized)
+        if now - self._explained_at.get(key, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+            return False
+        self._explained_at[key] = now
+        if len(self._explained_at) > 1000:
+            self._explained_at = {k: t for k, t in self._explained_at.items() if now - t < EXPLAIN_INTERVAL}
+        return True
+
+    async def _explain(self, query: str, args, normalized: str, method: Optional[str], elapsed_ms: float):
+        """Снимает план запроса и сохраняет его"""
+        self._explaining = True
+        try:
+            async with self._db.pool.acquire() as conn:
+                transaction = conn.transaction()
+                await transaction.start()
+                try:
+                    await conn.execute(f"{MARKER} SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+                    raw = await conn.fetchval(
+                        f"{MARKER} EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *(args or ())
+                    )
+                finally:
+                    await transaction.rollback()
+
+            result = json.loads(raw)[0] if isinstance(raw, str) else raw[0]
+            plan = result['Plan']
+            scans = seq_scans(plan)
+            await self._db.save_query_plan(
+                query_hash=query_hash(normalized),
+                query=normalized,
+                method=method,
+                duration_ms=elapsed_ms,
+                explain_ms=result.get('Execution Time'),
+                seq_scans=scans,
+                plan=json.dumps(result)
+            )
+            self.explained += 1
+            if scans:
+                logger.warning("🐌 План %s: последовательное чтение %s", method or '?', ', '.join(scans))
+        except Exception as e:
+            logger.warning("Не удалось снять план медленного запроса: %s", e)
+        finally:
+            self._explaining = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'slow': self.slow,
+            'explained': self.explained,
+            'by_method': self.by_method.most_common(5),
+        }
+
+
+# Глобальный журнал процесса
+slow_query_log = SlowQueryLog(config.SLOW_QUERY_MS, config.SLOW_QUERY_EXPLAIN_RATE)
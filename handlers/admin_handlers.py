@@ -1,16 +1,30 @@
 """
 Обработчики админ-панели.
 """
-import asyncio
+import html
+import json
+from typing import Optional
 from aiogram import Router, F, Bot
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from database.db_manager import db
+from database.slow_query import render_plan, slow_query_log
+from middlewares.throttling import ThrottlingMiddleware
 from utils.logger import logger
-from utils.formatters import format_admin_stats
+from utils.formatters import (
+    format_admin_stats, format_outbound_stats, format_cache_stats, format_single_flight_stats,
+    format_throttle_stats, format_slow_queries, format_memory_report
+)
+from utils.outbound import outbound, outbound_priority, Priority
+from utils.background import spawn
+from utils.flood_control import retry_middleware, safe_send_message
+from utils.plate_cache import plate_cache
+from utils.plate_filter import plate_filter
+from utils.profiler import cpu_profiler, MAX_DURATION
+from utils.memory_profiler import memory_profiler
 from utils.validators import clean_plate
 from config import config
 from keyboards.inline_keyboards import get_admin_panel_keyboard
@@ -47,12 +61,12 @@ async def admin_panel(message: Message):
         parse_mode="HTML"
     )
     
-    logger.info(f"Админ {message.from_user.id} открыл панель управления")
+    logger.info("Админ %s открыл панель управления", message.from_user.id)
 
 
 # --- СТАТИСТИКА ---
 @router.callback_query(F.data == "admin_stats")
-async def show_stats(callback: CallbackQuery):
+async def show_stats(callback: CallbackQuery, throttling: Optional[ThrottlingMiddleware] = None):
     """Показывает статистику бота"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен")
@@ -60,6 +74,11 @@ async def show_stats(callback: CallbackQuery):
     
     stats = await db.get_admin_stats()
     text = format_admin_stats(stats)
+    text += "\n\n" + format_outbound_stats(outbound.stats(), retry_middleware.stats())
+    text += "\n\n" + format_cache_stats(plate_cache.stats(), plate_filter.stats())
+    text += "\n\n" + format_single_flight_stats(db.single_flight_stats())
+    if throttling:
+        text += "\n\n" + format_throttle_stats(throttling.stats())
     
     await callback.message.answer(text, parse_mode="HTML")
     await callback.answer()
@@ -171,56 +190,62 @@ async def broadcast_process(message: Message, state: FSMContext):
     
     broadcast_text = message.text
     
-    # Получаем всех пользователей
-    async with db.acquire() as conn:
-        users = await conn.fetch('SELECT user_id FROM users WHERE is_banned = FALSE')
-    
-    total = len(users)
-    success = 0
-    failed = 0
+    # Получаем всех пользователей (кроме заблокировавших бота)
+    user_ids = await db.get_broadcast_recipients()
     
     status_msg = await message.answer(
         f"📤 Начинаю рассылку...\n\n"
-        f"Всего пользователей: {total}"
+        f"Всего пользователей: {len(user_ids)}"
     )
     
-    bot = Bot(token=config.BOT_TOKEN)
+    await state.clear()
     
-    # Рассылка с прогрессом
-    for i, user in enumerate(users, 1):
-        try:
-            await bot.send_message(user['user_id'], broadcast_text, parse_mode="HTML")
-            success += 1
+    # Рассылка идет в фоне: она длиннее дедлайна обработки обновления
+    spawn(run_broadcast(message.bot, status_msg, broadcast_text, user_ids), name='broadcast')
+
+
+async def run_broadcast(bot: Bot, status_msg: Message, broadcast_text: str, user_ids: list):
+    """Рассылка с прогрессом (с низшим приоритетом отправки)"""
+    total = len(user_ids)
+    success = 0
+    failed = 0
+    
+    # Темп задает планировщик: рассылка уступает интерактивным ответам
+    with outbound_priority(Priority.BULK):
+        for i, user_id in enumerate(user_ids, 1):
+            if await safe_send_message(bot, user_id, broadcast_text, parse_mode="HTML"):
+                success += 1
+            else:
+                failed += 1
             
             # Обновляем статус каждые 10 пользователей
             if i % 10 == 0:
-                await status_msg.edit_text(
-                    f"📤 Рассылка в процессе...\n\n"
-                    f"Отправлено: {i}/{total}\n"
-                    f"✅ Успешно: {success}\n"
-                    f"❌ Ошибок: {failed}"
-                )
-            
-            # Задержка чтобы не словить лимит
-            await asyncio.sleep(0.05)
-            
-        except Exception as e:
-            failed += 1
-            logger.warning(f"Не удалось отправить сообщение пользователю {user['user_id']}: {e}")
+                try:
+                    await status_msg.edit_text(
+                        f"📤 Рассылка в процессе...\n\n"
+                        f"Отправлено: {i}/{total}\n"
+                        f"✅ Успешно: {success}\n"
+                        f"❌ Ошибок: {failed}"
+                    )
+                except Exception as e:
+                    logger.warning("Не удалось обновить статус рассылки: %s", e)
     
     # Итоговый отчет
-    await status_msg.edit_text(
-        f"✅ <b>Рассылка завершена!</b>\n\n"
-        f"📊 Статистика:\n"
-        f"Всего пользователей: {total}\n"
-        f"✅ Доставлено: {success}\n"
-        f"❌ Ошибок: {failed}\n"
-        f"📈 Успешность: {(success/total*100):.1f}%",
-        parse_mode="HTML"
-    )
+    try:
+        with outbound_priority(Priority.TRANSACTIONAL):
+            await status_msg.edit_text(
+                f"✅ <b>Рассылка завершена!</b>\n\n"
+                f"📊 Статистика:\n"
+                f"Всего пользователей: {total}\n"
+                f"✅ Доставлено: {success}\n"
+                f"❌ Ошибок: {failed}\n"
+                f"📈 Успешность: {(success/total*100 if total else 0):.1f}%",
+                parse_mode="HTML"
+            )
+    except Exception as e:
+        logger.warning("Не удалось отправить итог рассылки: %s", e)
     
-    await state.clear()
-    logger.info(f"Рассылка завершена: {success}/{total} успешно")
+    logger.info("Рассылка завершена: %s/%s успешно", success, total)
 
 
 # --- УДАЛЕНИЕ НОМЕРА ---
@@ -330,6 +355,179 @@ async def show_finance(callback: CallbackQuery):
     await callback.answer()
 
 
+# --- ДУБЛИ ОТЗЫВОВ ---
+@router.callback_query(F.data == "admin_duplicates")
+async def show_duplicates(callback: CallbackQuery):
+    """Показывает крупнейшие группы повторяющихся отзывов"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    clusters = await db.get_duplicate_clusters(limit=10)
+    
+    if not clusters:
+        await callback.message.answer("🧬 Повторяющихся отзывов не найдено")
+        await callback.answer()
+        return
+    
+    text = "🧬 <b>Группы повторяющихся отзывов</b>\n\n"
+    for cluster in clusters:
+        sample = html.escape((cluster['sample_comment'] or '')[:80])
+        text += (
+            f"<b>#{cluster['cluster_id']}</b>: {cluster['review_count']} отзывов, "
+            f"{cluster['user_count']} авторов, {cluster['plate_count']} номеров, "
+            f"помечено {cluster['flagged_count']}\n"
+            f"<i>{sample}</i>\n\n"
+        )
+    
+    await callback.message.answer(text, parse_mode="HTML")
+    await callback.answer()
+
+
+# --- МЕДЛЕННЫЕ ЗАПРОСЫ ---
+@router.callback_query(F.data == "admin_slow_queries")
+async def show_slow_queries(callback: CallbackQuery):
+    """Показывает медленные запросы и их сохраненные планы"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    queries = await db.get_slow_query_summary(limit=10)
+    await callback.message.answer(format_slow_queries(queries, slow_query_log.stats()), parse_mode="HTML")
+    await callback.answer()
+
+
+@router.message(Command("plan"))
+async def show_query_plan(message: Message):
+    """Показывает сохраненный план: /plan <id>"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    parts = message.text.split()
+    if len(parts) < 2 or not parts[1].isdigit():
+        await message.answer("Использование: /plan <id>")
+        return
+    
+    record = await db.get_query_plan(int(parts[1]))
+    if not record:
+        await message.answer("❌ План не найден")
+        return
+    
+    plan = json.loads(record['plan'])
+    text = (
+        f"🐌 <b>План #{record['id']}</b> ({html.escape(record['method'] or '?')}, "
+        f"{record['captured_at']:%d.%m %H:%M})\n"
+        f"Запрос: {record['duration_ms']:.0f} мс, EXPLAIN: {plan.get('Execution Time', 0):.0f} мс\n\n"
+        f"<code>{html.escape(record['query'][:500])}</code>\n\n"
+        f"<pre>{html.escape(render_plan(plan['Plan'], limit=25))}</pre>"
+    )
+    await message.answer(text, parse_mode="HTML")
+
+
+# --- ПРОФИЛИРОВАНИЕ ---
+@router.message(Command("profile"))
+async def start_cpu_profile(message: Message):
+    """CPU-профиль работающего бота: /profile [секунды]"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    parts = message.text.split()
+    seconds = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 30
+    seconds = max(1, min(seconds, MAX_DURATION))
+    
+    if cpu_profiler.running:
+        await message.answer("⏳ Профилирование уже идет")
+        return
+    
+    await message.answer(f"🔬 Снимаю CPU-профиль {seconds} с...")
+    
+    # Профиль снимается в фоне: он длиннее дедлайна обработки обновления
+    spawn(run_cpu_profile(message, seconds), name='cpu-profile')
+
+
+async def run_cpu_profile(message: Message, seconds: int):
+    """Снимает профиль и отправляет collapsed stacks документом"""
+    result = await cpu_profiler.profile(seconds)
+    if result is None:
+        await message.answer("⏳ Профилирование уже идет")
+        return
+    
+    if not result.samples:
+        await message.answer("❌ Не удалось снять ни одного семпла")
+        return
+    
+    top = "\n".join(
+        f"{count * 100 / result.samples:5.1f}%  {html.escape(name[-60:])}"
+        for name, count in result.top_functions(8)
+    )
+    document = BufferedInputFile(
+        result.collapsed().encode(),
+        filename=f"cpu-profile-{message.date:%Y%m%d-%H%M%S}.folded"
+    )
+    try:
+        with outbound_priority(Priority.TRANSACTIONAL):
+            await message.answer_document(
+                document,
+                caption=(
+                    f"🔬 <b>CPU-профиль</b>: {result.samples} семплов за {result.duration:.0f} с\n\n"
+                    f"<pre>{top}</pre>\n\n"
+                    f"flamegraph.pl или speedscope.app"
+                ),
+                parse_mode="HTML"
+            )
+    except Exception as e:
+        logger.error("❌ Не удалось отправить CPU-профиль: %s", e)
+
+
+@router.message(Command("memsnap"))
+async def memory_snapshot(message: Message):
+    """Снимок памяти и разница с предыдущим: /memsnap, /memsnap off"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    parts = message.text.split()
+    if len(parts) > 1 and parts[1] == "off":
+        memory_profiler.stop_tracing()
+        await message.answer("🧠 tracemalloc выключен, снимки сброшены")
+        return
+    
+    first = not memory_profiler.tracing
+    report = await memory_profiler.snapshot()
+    text = format_memory_report(report)
+    if first:
+        text += (
+            "\n\nℹ️ tracemalloc только что включен: учитываются выделения с этого момента. "
+            "Повторите /memsnap позже, чтобы увидеть рост. /memsnap off - выключить."
+        )
+    await message.answer(text, parse_mode="HTML")
+
+
+@router.message(Command("memwatch"))
+async def memory_watch(message: Message):
+    """Наблюдение за ростом памяти: /memwatch [минуты] [порог МБ], /memwatch off"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    parts = message.text.split()
+    if len(parts) > 1 and parts[1] == "off":
+        await memory_profiler.stop_watch()
+        await message.answer("🧠 Наблюдение за памятью остановлено")
+        return
+    
+    try:
+        minutes = float(parts[1]) if len(parts) > 1 else config.MEMORY_WATCH_INTERVAL / 60
+        threshold = float(parts[2]) if len(parts) > 2 else config.MEMORY_WATCH_THRESHOLD_MB
+    except ValueError:
+        await message.answer("Использование: /memwatch [минуты] [порог МБ] или /memwatch off")
+        return
+    
+    memory_profiler.start_watch(message.bot, max(minutes, 1) * 60, threshold)
+    await message.answer(
+        f"🧠 Снимок памяти каждые {max(minutes, 1):.0f} мин, "
+        f"отчет при росте больше {threshold:.0f} МБ"
+    )
+
+
 # --- БАН/РАЗБАН ---
 @router.callback_query(F.data == "admin_ban")
 async def ban_user_start(callback: CallbackQuery, state: FSMContext):
@@ -381,9 +579,9 @@ async def ban_user_process(message: Message, state: FSMContext):
     
     if new_status:
         await message.answer(f"🚫 Пользователь {user_id} заблокирован")
-        logger.warning(f"Пользователь {user_id} заблокирован админом")
+        logger.warning("Пользователь %s заблокирован админом", user_id)
     else:
         await message.answer(f"✅ Пользователь {user_id} разблокирован")
-        logger.info(f"Пользователь {user_id} разблокирован админом")
+        logger.info("Пользователь %s разблокирован админом", user_id)
     
     await state.clear()
@@ -3,7 +3,7 @@
 """
 import uuid
 from datetime import datetime
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -18,6 +18,7 @@ from keyboards.inline_keyboards import (
     get_payment_confirmation_keyboard
 )
 from keyboards.reply_keyboards import get_main_menu_keyboard
+from utils.outbound import outbound_priority, Priority
 
 router = Router()
 
@@ -99,7 +100,7 @@ async def select_tier(callback: CallbackQuery, state: FSMContext):
     await state.set_state(PaymentForm.waiting_for_screenshot)
     await callback.answer()
     
-    logger.info(f"Пользователь {callback.from_user.id} начал оплату {tier_name} (ID: {payment_id})")
+    logger.info("Пользователь %s начал оплату %s (ID: %s)", callback.from_user.id, tier_name, payment_id)
 
 
 # --- ОТПРАВКА ЧЕКА ---
@@ -127,16 +128,15 @@ async def process_payment_screenshot(message: Message, state: FSMContext):
         f"⏰ Время: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
     )
     
-    bot = Bot(token=config.BOT_TOKEN)
-    
     try:
-        await bot.send_photo(
-            config.ADMIN_ID,
-            message.photo[-1].file_id,
-            caption=caption,
-            reply_markup=get_payment_confirmation_keyboard(user_id, tier_name, payment_id),
-            parse_mode="HTML"
-        )
+        with outbound_priority(Priority.TRANSACTIONAL):
+            await message.bot.send_photo(
+                config.ADMIN_ID,
+                message.photo[-1].file_id,
+                caption=caption,
+                reply_markup=get_payment_confirmation_keyboard(user_id, tier_name, payment_id),
+                parse_mode="HTML"
+            )
         
         await message.answer(
             "✅ <b>Чек принят!</b>\n\n"
@@ -146,10 +146,10 @@ async def process_payment_screenshot(message: Message, state: FSMContext):
             parse_mode="HTML"
         )
         
-        logger.info(f"Чек от пользователя {user_id} отправлен админу (платеж {payment_id})")
+        logger.info("Чек от пользователя %s отправлен админу (платеж %s)", user_id, payment_id)
         
     except Exception as e:
-        logger.error(f"Ошибка отправки чека админу: {e}")
+        logger.error("Ошибка отправки чека админу: %s", e)
         await message.answer(
             "❌ Произошла ошибка при отправке чека.\n"
             "Попробуйте еще раз или свяжитесь с поддержкой."
@@ -186,21 +186,20 @@ async def confirm_payment(callback: CallbackQuery):
     await db.set_user_subscription(user_id, tier_name, tier.duration_days)
     
     # Уведомляем пользователя
-    bot = Bot(token=config.BOT_TOKEN)
-    
     try:
-        await bot.send_message(
-            user_id,
-            f"✅ <b>Платеж подтвержден!</b>\n\n"
-            f"🎉 Подписка <b>{tier.display_name}</b> активирована!\n"
-            f"⏰ Срок действия: {tier.duration_days} дней\n\n"
-            f"Спасибо за покупку! 💙\n\n"
-            f"Теперь вам доступны все возможности вашего тарифа.",
-            reply_markup=get_main_menu_keyboard(is_premium=True),
-            parse_mode="HTML"
-        )
+        with outbound_priority(Priority.TRANSACTIONAL):
+            await callback.bot.send_message(
+                user_id,
+                f"✅ <b>Платеж подтвержден!</b>\n\n"
+                f"🎉 Подписка <b>{tier.display_name}</b> активирована!\n"
+                f"⏰ Срок действия: {tier.duration_days} дней\n\n"
+                f"Спасибо за покупку! 💙\n\n"
+                f"Теперь вам доступны все возможности вашего тарифа.",
+                reply_markup=get_main_menu_keyboard(is_premium=True),
+                parse_mode="HTML"
+            )
     except Exception as e:
-        logger.error(f"Не удалось уведомить пользователя {user_id}: {e}")
+        logger.error("Не удалось уведомить пользователя %s: %s", user_id, e)
     
     # Обновляем сообщение админа
     await callback.message.edit_caption(
@@ -210,7 +209,7 @@ async def confirm_payment(callback: CallbackQuery):
     
     await callback.answer("✅ Платеж подтвержден")
     
-    logger.info(f"Платеж {payment_id} подтвержден. Пользователю {user_id} активирована подписка {tier_name}")
+    logger.info("Платеж %s подтвержден. Пользователю %s активирована подписка %s", payment_id, user_id, tier_name)
 
 
 # --- ОТКЛОНЕНИЕ ПЛАТЕЖА ---
@@ -234,22 +233,21 @@ async def reject_payment(callback: CallbackQuery):
     
     # Уведомляем пользователя
     if user_id:
-        bot = Bot(token=config.BOT_TOKEN)
-        
         try:
-            await bot.send_message(
-                user_id,
-                "❌ <b>Платеж отклонен</b>\n\n"
-                "К сожалению, ваш платеж не был подтвержден.\n"
-                "Возможные причины:\n"
-                "• Неверная сумма\n"
-                "• Неверный получатель\n"
-                "• Нечитаемый чек\n\n"
-                "Попробуйте еще раз или свяжитесь с поддержкой.",
-                parse_mode="HTML"
-            )
+            with outbound_priority(Priority.TRANSACTIONAL):
+                await callback.bot.send_message(
+                    user_id,
+                    "❌ <b>Платеж отклонен</b>\n\n"
+                    "К сожалению, ваш платеж не был подтвержден.\n"
+                    "Возможные причины:\n"
+                    "• Неверная сумма\n"
+                    "• Неверный получатель\n"
+                    "• Нечитаемый чек\n\n"
+                    "Попробуйте еще раз или свяжитесь с поддержкой.",
+                    parse_mode="HTML"
+                )
         except Exception as e:
-            logger.error(f"Не удалось уведомить пользователя {user_id}: {e}")
+            logger.error("Не удалось уведомить пользователя %s: %s", user_id, e)
     
     # Обновляем сообщение админа
     await callback.message.edit_caption(
@@ -259,7 +257,7 @@ async def reject_payment(callback: CallbackQuery):
     
     await callback.answer("❌ Платеж отклонен")
     
-    logger.warning(f"Платеж {payment_id} отклонен")
+    logger.warning("Платеж %s отклонен", payment_id)
 
 
 # --- ОТМЕНА ---
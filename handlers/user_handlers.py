@@ -2,19 +2,24 @@
 Обработчики пользовательских команд.
 """
 import uuid
-from aiogram import Router, F
+from aiogram import Bot, Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.exceptions import TelegramBadRequest
 
 from database.db_manager import db
-from utils.validators import clean_plate, validate_plate, validate_comment, validate_rating
-from utils.formatters import (
-    format_review_header, format_single_review, format_car_list,
-    format_subscription_info, format_user_stats
-)
+from utils.validators import canonical_plate, clean_plate, validate_plate, validate_comment, validate_rating
+from utils.formatters import format_car_list, format_subscription_info, format_user_stats
 from utils.logger import logger
+from utils.outbound import outbound_priority, Priority
+from utils.background import spawn
+from utils.flood_control import safe_send_message
+from utils.plate_cache import plate_cache, build_plate_card, PlateCard, ReviewCard
+from utils.plate_filter import plate_filter
+from utils.fingerprint import fingerprint, judge_duplicates, DuplicateVerdict
+from utils.text_filter import text_filter
 from config import config
 from models.subscription_tiers import get_tier, can_perform_action
 from keyboards.inline_keyboards import (
@@ -61,7 +66,7 @@ async def cmd_start(message: Message):
     if len(args) > 1 and args[1].startswith("ref_"):
         referral_code = args[1]
         # TODO: Обработка реферальной ссылки
-        logger.info(f"Пользователь {user_id} пришел по реферальной ссылке: {referral_code}")
+        logger.info("Пользователь %s пришел по реферальной ссылке: %s", user_id, referral_code)
     
     # Отправляем приветствие
     welcome_text = (
@@ -76,7 +81,36 @@ async def cmd_start(message: Message):
     keyboard = get_main_menu_keyboard()
     await message.answer(welcome_text, reply_markup=keyboard, parse_mode="HTML")
     
-    logger.info(f"Пользователь {user_id} ({username}) запустил бота")
+    logger.info("Пользователь %s (%s) запустил бота", user_id, username)
+
+
+# --- КАРТОЧКА НОМЕРА ---
+async def load_plate_card(plate: str) -> PlateCard:
+    """Загружает данные номера из БД и форматирует карточку"""
+    reviews = await db.get_reviews_by_plate(plate)
+    stats = await db.get_review_stats(plate)
+    reactions = await db.get_car_reactions(plate)
+    return build_plate_card(plate, reviews, stats, reactions)
+
+
+async def send_review_card(message: Message, review: ReviewCard):
+    """Отправляет один отзыв: видео, фото или текст"""
+    if review.video_id:
+        await message.answer_video(
+            review.video_id,
+            caption=review.caption,
+            reply_markup=review.keyboard,
+            parse_mode="HTML"
+        )
+    elif review.photo_id:
+        await message.answer_photo(
+            review.photo_id,
+            caption=review.caption,
+            reply_markup=review.keyboard,
+            parse_mode="HTML"
+        )
+    else:
+        await message.answer(review.caption, reply_markup=review.keyboard, parse_mode="HTML")
 
 
 # --- ПОИСК ПО НОМЕРУ ---
@@ -139,11 +173,13 @@ async def search_process(message: Message, state: FSMContext):
     # Увеличиваем счетчик поисков
     await db.increment_usage(user_id, 'search')
     
-    # Получаем отзывы
-    reviews = await db.get_reviews_by_plate(plate)
-    stats = await db.get_review_stats(plate)
+    # Номер, которого нет в фильтре, точно без отзывов - в БД не идем
+    card = None
+    if plate_filter.might_have_reviews(plate):
+        # Карточка номера (из кэша, если номер недавно искали)
+        card = await plate_cache.get_or_load(plate, load_plate_card)
     
-    if not reviews:
+    if card is None or not card.reviews:
         region = config.get_region_name(plate)
         await message.answer(
             f"🚗 <b>{plate}</b> ({region})\n\n"
@@ -154,30 +190,22 @@ async def search_process(message: Message, state: FSMContext):
         await state.clear()
         return
     
-    # Формируем заголовок
-    region = config.get_region_name(plate)
-    avg_rating = stats['avg_rating']
-    review_count = stats['review_count']
-    
-    # Получаем реакции на авто
-    reactions = await db.get_car_reactions(plate)
+    # Голос у каждого пользователя свой - его не кэшируем
     user_vote = await db.get_user_reaction(plate, user_id)
     
-    # Формируем заголовок с реакциями
-    header = format_review_header(plate, region, avg_rating, review_count)
-    header += f"\n\n🤝 Красавчик: {reactions['likes']}  |  🖕 Мудак: {reactions['dislikes']}"
-    
-    await message.answer(header, reply_markup=get_reaction_keyboard(plate, reactions['likes'], reactions['dislikes'], user_vote), parse_mode="HTML")
+    # Заголовок с реакциями
+    header = card.header + "\n\n" + card.reactions_line
+    await message.answer(header, reply_markup=card.reaction_keyboard(user_vote), parse_mode="HTML")
     
     # Проверяем, может ли пользователь видеть все отзывы
     tier_name = await db.get_user_subscription_tier(user_id)
     can_view_all, _ = can_perform_action(tier_name, 'view_all_reviews')
     
     # Показываем отзывы
-    for i, review in enumerate(reviews, 1):
+    for i, review in enumerate(card.reviews, 1):
         # Если не премиум и это не первый отзыв - показываем заглушку
         if i > 1 and not can_view_all:
-            hidden_count = len(reviews) - 1
+            hidden_count = len(card.reviews) - 1
             await message.answer(
                 f"🔒 <b>Скрыто еще {hidden_count} отзыв(ов)</b>\n\n"
                 f"Оформите подписку для просмотра всех отзывов!",
@@ -186,37 +214,10 @@ async def search_process(message: Message, state: FSMContext):
             )
             break
         
-        # Форматируем отзыв
-        has_media = bool(review['photo_id'] or review['video_id'])
-        author_name = review.get('author_name') or review.get('author_username') or 'Аноним'
-        caption = format_single_review(i, review['rating'], review['comment'], has_media, author_name)
-        
-        # Клавиатура с геолокацией если есть
-        keyboard = None
-        if review['latitude'] and review['longitude']:
-            from keyboards.inline_keyboards import get_location_map_keyboard
-            keyboard = get_location_map_keyboard(review['latitude'], review['longitude'])
-        
-        # Отправляем медиа или текст
-        if review['video_id']:
-            await message.answer_video(
-                review['video_id'],
-                caption=caption,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-        elif review['photo_id']:
-            await message.answer_photo(
-                review['photo_id'],
-                caption=caption,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-        else:
-            await message.answer(caption, reply_markup=keyboard, parse_mode="HTML")
+        await send_review_card(message, review)
     
     await state.clear()
-    logger.info(f"Пользователь {user_id} проверил номер {plate}")
+    logger.info("Пользователь %s проверил номер %s", user_id, plate)
 
 
 # --- ОСТАВИТЬ ОТЗЫВ ---
@@ -340,7 +341,12 @@ async def review_comment(message: Message, state: FSMContext):
         await message.answer(error_msg)
         return
     
-    await state.update_data(comment=comment)
+    # Маскируем мат, телефоны и ИИН
+    filtered = text_filter.mask(comment)
+    if filtered.changed:
+        await message.answer("ℹ️ Часть текста скрыта: нецензурные слова и личные данные не публикуются.")
+    
+    await state.update_data(comment=filtered.text)
     
     await message.answer(
         "📍 Где это произошло?\n\n"
@@ -385,6 +391,35 @@ async def review_finish(message: Message, state: FSMContext):
     photo_id = message.photo[-1].file_id if message.photo else None
     video_id = message.video.file_id if message.video else None
     
+    # Проверка на повторы и спам до записи в reviews
+    fp = None
+    verdict = DuplicateVerdict('ok')
+    if config.DUPLICATE_CHECK_ENABLED:
+        recent = await db.count_recent_user_plate_reviews(
+            user_id, data['plate'], config.DUPLICATE_PLATE_COOLDOWN_HOURS
+        )
+        if recent:
+            await message.answer(
+                f"⚠️ Вы уже оставляли отзыв на <code>{data['plate']}</code> за последние "
+                f"{config.DUPLICATE_PLATE_COOLDOWN_HOURS} ч.",
+                reply_markup=get_main_menu_keyboard(),
+                parse_mode="HTML"
+            )
+            await state.clear()
+            return
+        
+        fp = fingerprint(data['comment'])
+        candidates = await db.find_duplicate_candidates(fp.text_hash, fp.bands, user_id=user_id)
+        verdict = judge_duplicates(fp, candidates, user_id)
+        if verdict.action == 'reject':
+            await message.answer(
+                "⚠️ Вы уже публиковали такой же текст. Опишите, пожалуйста, именно эту ситуацию.",
+                reply_markup=get_main_menu_keyboard()
+            )
+            await state.clear()
+            logger.info("Отклонен повторный текст от пользователя %s (группа #%s)", user_id, verdict.cluster_id)
+            return
+    
     # Сохраняем отзыв
     review_id = await db.create_review(
         plate=data['plate'],
@@ -396,29 +431,22 @@ async def review_finish(message: Message, state: FSMContext):
         latitude=data.get('latitude'),
         longitude=data.get('longitude')
     )
+    # Отзыв сохранен: выходим из FSM сразу, даже если дальше обработку прервет дедлайн
+    await state.clear()
+    
+    if fp:
+        await db.save_review_fingerprint(
+            review_id, user_id, data['plate'], fp.text_hash, fp.simhash, fp.bands,
+            cluster_id=verdict.cluster_id,
+            status='flagged' if verdict.action == 'flag' else 'ok'
+        )
+        if verdict.action == 'flag':
+            logger.warning("🧬 Отзыв #%s совпадает с группой #%s, помечен для модерации", review_id, verdict.cluster_id)
     
     # Увеличиваем счетчик
     await db.increment_usage(user_id, 'review')
     
-    # Уведомляем подписчиков
-    subscribers = await db.get_plate_subscribers(data['plate'])
-    for subscriber_id in subscribers:
-        if subscriber_id != user_id:  # Не уведомляем самого себя
-            try:
-                from aiogram import Bot
-                from config import config as cfg
-                bot = Bot(token=cfg.BOT_TOKEN)
-                await bot.send_message(
-                    subscriber_id,
-                    f"🔔 <b>Новый отзыв на ваш автомобиль!</b>\n\n"
-                    f"🚗 Номер: <code>{data['plate']}</code>\n"
-                    f"⭐ Оценка: {'⭐' * data['rating']}\n\n"
-                    f"Проверьте детали в разделе 'Мой гараж'",
-                    parse_mode="HTML"
-                )
-            except Exception as e:
-                logger.warning(f"Не удалось уведомить пользователя {subscriber_id}: {e}")
-    
+    # Уведомления подписчиков идут в фоне: автор не ждет их отправки
     await message.answer(
         "✅ <b>Отзыв опубликован!</b>\n\n"
         "Спасибо за вклад в безопасность на дорогах! 🙏",
@@ -426,8 +454,9 @@ async def review_finish(message: Message, state: FSMContext):
         parse_mode="HTML"
     )
     
-    await state.clear()
-    logger.info(f"Пользователь {user_id} оставил отзыв #{review_id} на номер {data['plate']}")
+    spawn(notify_review_subscribers(message.bot, data['plate'], data['rating'], user_id),
+          name=f"notify-review-{review_id}")
+    logger.info("Пользователь %s оставил отзыв #%s на номер %s", user_id, review_id, data['plate'])
 
 
 # --- МОЙ ГАРАЖ ---
@@ -530,7 +559,7 @@ async def add_car_finish(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("remove_car_"))
 async def remove_car(callback: CallbackQuery):
     """Удаление авто из гаража"""
-    plate = callback.data.replace("remove_car_", "")
+    plate = canonical_plate(callback.data.replace("remove_car_", ""))
     user_id = callback.from_user.id
     
     # Удаляем авто из гаража
@@ -572,7 +601,7 @@ async def handle_reaction(callback: CallbackQuery):
     # Парсим данные: react_like_PLATE или react_dislike_PLATE
     parts = data.split("_", 2)  # ['react', 'like/dislike', 'PLATE']
     vote_type = 'like' if parts[1] == 'like' else 'dislike'
-    plate = parts[2]
+    plate = canonical_plate(parts[2])  # кнопки старых сообщений могут нести прежний ключ
     
     # Устанавливаем реакцию
     result = await db.set_car_reaction(plate, user_id, vote_type)
@@ -586,7 +615,7 @@ async def handle_reaction(callback: CallbackQuery):
     
     try:
         await callback.message.edit_reply_markup(reply_markup=new_keyboard)
-    except:
+    except TelegramBadRequest:
         pass  # Игнорируем если сообщение не изменилось
     
     # Уведомление пользователю
@@ -594,31 +623,9 @@ async def handle_reaction(callback: CallbackQuery):
         emoji = "🤝" if vote_type == 'like' else "🖕"
         await callback.answer(f"{emoji} Ваш голос учтен!")
         
-        # Уведомляем владельца авто (если он подписан на этот номер)
-        subscribers = await db.get_plate_subscribers(plate)
-        for sub_id in subscribers:
-            if sub_id != user_id:  # Не уведомляем самого себя
-                try:
-                    if vote_type == 'like':
-                        await callback.bot.send_message(
-                            sub_id,
-                            f"🔔 <b>Новая реакция!</b>\n\n"
-                            f"Кто-то выразил вам <b>Респект 🤝</b> за вождение!\n"
-                            f"🚗 Авто: <code>{plate}</code>\n\n"
-                            f"Так держать! 💪",
-                            parse_mode="HTML"
-                        )
-                    else:
-                        await callback.bot.send_message(
-                            sub_id,
-                            f"🔔 <b>Новая реакция</b>\n\n"
-                            f"Кто-то назвал вас <b>Мудаком 🖕</b> на дороге.\n"
-                            f"🚗 Авто: <code>{plate}</code>\n\n"
-                            f"Бывает... 🤷‍♂️",
-                            parse_mode="HTML"
-                        )
-                except:
-                    pass  # Пользователь заблокировал бота
+        # Уведомляем владельца авто (если он подписан на этот номер) в фоне
+        spawn(notify_reaction_subscribers(callback.bot, plate, vote_type, user_id),
+              name=f"notify-reaction-{plate}")
     elif result == 'changed':
         emoji = "🤝" if vote_type == 'like' else "🖕"
         await callback.answer(f"{emoji} Голос изменен!")
@@ -626,10 +633,46 @@ async def handle_reaction(callback: CallbackQuery):
         await callback.answer("Голос убран")
 
 
+async def notify_review_subscribers(bot: Bot, plate: str, rating: int, author_id: int):
+    """Уведомляет подписчиков номера о новом отзыве (фоновая задача)"""
+    subscribers = await db.get_plate_subscribers(plate)
+    with outbound_priority(Priority.NOTIFICATION):
+        for subscriber_id in subscribers:
+            if subscriber_id != author_id:  # Не уведомляем самого себя
+                await safe_send_message(
+                    bot,
+                    subscriber_id,
+                    f"🔔 <b>Новый отзыв на ваш автомобиль!</b>\n\n"
+                    f"🚗 Номер: <code>{plate}</code>\n"
+                    f"⭐ Оценка: {'⭐' * rating}\n\n"
+                    f"Проверьте детали в разделе 'Мой гараж'",
+                    parse_mode="HTML"
+                )
+
+
+async def notify_reaction_subscribers(bot: Bot, plate: str, vote_type: str, voter_id: int):
+    """Уведомляет подписчиков номера о новой реакции (фоновая задача)"""
+    if vote_type == 'like':
+        text = (f"🔔 <b>Новая реакция!</b>\n\n"
+                f"Кто-то выразил вам <b>Респект 🤝</b> за вождение!\n"
+                f"🚗 Авто: <code>{plate}</code>\n\n"
+                f"Так держать! 💪")
+    else:
+        text = (f"🔔 <b>Новая реакция</b>\n\n"
+                f"Кто-то назвал вас <b>Мудаком 🖕</b> на дороге.\n"
+                f"🚗 Авто: <code>{plate}</code>\n\n"
+                f"Бывает... 🤷‍♂️")
+    subscribers = await db.get_plate_subscribers(plate)
+    with outbound_priority(Priority.NOTIFICATION):
+        for sub_id in subscribers:
+            if sub_id != voter_id:  # Не уведомляем самого себя
+                await safe_send_message(bot, sub_id, text, parse_mode="HTML")
+
+
 @router.callback_query(F.data.startswith("share_"))
 async def share_plate(callback: CallbackQuery):
     """Генерирует карточку для шаринга"""
-    plate = callback.data.replace("share_", "")
+    plate = canonical_plate(callback.data.replace("share_", ""))
     
     stats = await db.get_review_stats(plate)
     
@@ -691,20 +734,20 @@ async def invite_friend(message: Message):
         ])
     )
     
-    logger.info(f"Пользователь {user_id} запросил реферальную ссылку")
+    logger.info("Пользователь %s запросил реферальную ссылку", user_id)
 
 
 # --- ПРОСМОТР АВТО ИЗ ГАРАЖА ---
 @router.callback_query(F.data.startswith("view_car_"))
 async def view_car_reviews(callback: CallbackQuery):
     """Показывает все отзывы на авто из гаража"""
-    plate = callback.data.replace("view_car_", "")
+    plate = canonical_plate(callback.data.replace("view_car_", ""))
     
-    # Получаем отзывы
-    reviews = await db.get_reviews_by_plate(plate)
-    stats = await db.get_review_stats(plate)
+    card = None
+    if plate_filter.might_have_reviews(plate):
+        card = await plate_cache.get_or_load(plate, load_plate_card)
     
-    if not reviews:
+    if card is None or not card.reviews:
         region = config.get_region_name(plate)
         await callback.message.answer(
             f"🚗 <b>{plate}</b> ({region})\n\n"
@@ -714,43 +757,11 @@ async def view_car_reviews(callback: CallbackQuery):
         await callback.answer()
         return
     
-    # Формируем заголовок
-    region = config.get_region_name(plate)
-    avg_rating = stats['avg_rating']
-    review_count = stats['review_count']
-    
-    header = format_review_header(plate, region, avg_rating, review_count)
-    await callback.message.answer(header, reply_markup=get_share_keyboard(plate), parse_mode="HTML")
+    await callback.message.answer(card.header, reply_markup=get_share_keyboard(plate), parse_mode="HTML")
     
     # Показываем все отзывы
-    for i, review in enumerate(reviews, 1):
-        has_media = bool(review['photo_id'] or review['video_id'])
-        author_name = review.get('author_name') or review.get('author_username') or 'Аноним'
-        caption = format_single_review(i, review['rating'], review['comment'], has_media, author_name)
-        
-        # Клавиатура с геолокацией если есть
-        keyboard = None
-        if review['latitude'] and review['longitude']:
-            from keyboards.inline_keyboards import get_location_map_keyboard
-            keyboard = get_location_map_keyboard(review['latitude'], review['longitude'])
-        
-        # Отправляем медиа или текст
-        if review['video_id']:
-            await callback.message.answer_video(
-                review['video_id'],
-                caption=caption,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-        elif review['photo_id']:
-            await callback.message.answer_photo(
-                review['photo_id'],
-                caption=caption,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-        else:
-            await callback.message.answer(caption, reply_markup=keyboard, parse_mode="HTML")
+    for review in card.reviews:
+        await send_review_card(callback.message, review)
     
     await callback.answer()
-    logger.info(f"Пользователь {callback.from_user.id} просмотрел отзывы на {plate} из гаража")
+    logger.info("Пользователь %s просмотрел отзывы на %s из гаража", callback.from_user.id, plate)
@@ -63,6 +63,10 @@ def get_admin_panel_keyboard() -> InlineKeyboardMarkup:
         [
             InlineKeyboardButton(text="💰 Финансы", callback_data="admin_finance"),
             InlineKeyboardButton(text="🚫 Бан/Разбан", callback_data="admin_ban")
+        ],
+        [
+            InlineKeyboardButton(text="🧬 Дубли отзывов", callback_data="admin_duplicates"),
+            InlineKeyboardButton(text="🐌 Медленные запросы", callback_data="admin_slow_queries")
         ]
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -0,0 +1,109 @@
+"""
+Ограничение параллельной обработки обновлений.
+
+- глобальный семафор не дает набрать сотни корутин на пул из 20 соединений;
+- обновления одного пользователя обрабатываются строго по очереди
+  (двойные нажатия не гоняются в set_car_reaction и FSM);
+- у каждого обновления есть дедлайн: вместо минутного ожидания
+  command_timeout пользователь быстро получает вежливый ответ.
+  Админ от дедлайна освобожден: рассылка и профилирование идут дольше,
+  а обновлений от него единицы.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Collection, Dict, List
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from utils.logger import logger
+
+OVERLOAD_TEXT = "⏳ Сейчас много запросов, попробуйте еще раз через несколько секунд."
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    """Семафор + последовательная обработка по пользователю + дедлайн"""
+
+    def __init__(self, max_concurrent: int = 40, timeout: float = 15.0,
+                 exempt_user_ids: Collection[int] = ()):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        # Пользователи без дедлайна (админ)
+        self.exempt_user_ids = set(exempt_user_ids)
+        # user_id -> [lock, число ожидающих]; запись удаляется, когда очередь пуста
+        self._user_locks: Dict[int, List[Any]] = {}
+        self.in_flight = 0
+        self.timeouts = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        timeout = None if user is not None and user.id in self.exempt_user_ids else self.timeout
+        try:
+            async with asyncio.timeout(timeout):
+                if user is None:
+                    return await self._run(handler, event, data)
+
+                # Сначала очередь пользователя, потом общий слот:
+                # дубли одного пользователя не занимают слоты других
+                entry = self._user_locks.setdefault(user.id, [asyncio.Lock(), 0])
+                entry[1] += 1
+                try:
+                    async with entry[0]:
+                        return await self._run(handler, event, data)
+                finally:
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self._user_locks[user.id]
+        except TimeoutError:
+            self.timeouts += 1
+            update_id = event.update_id if isinstance(event, Update) else None
+            logger.warning("⏱ Обновление %s от %s не уложилось в %s с", update_id, user.id if user else '?', self.timeout)
+            await self._reply_overloaded(event)
+
+    async def _run(self, handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        async with self.semaphore:
+            self.in_flight += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self.in_flight -= 1
+
+    async def _reply_overloaded(self, event: TelegramObject):
+        """Сообщает пользователю о перегрузке, не трогая БД"""
+        if not isinstance(event, Update):
+            return
+        try:
+            if event.callback_query:
+                await event.callback_query.answer(OVERLOAD_TEXT, show_alert=False)
+            elif event.message:
+                await event.message.answer(OVERLOAD_TEXT)
+        except Exception as e:
+            logger.warning("Не удалось ответить о перегрузке: %s", e)
+
+    def stats(self) -> Dict[str, int]:
+        """Текущая загрузка для мониторинга"""
+        return {
+            'in_flight': self.in_flight,
+            'waiting_users': len(self._user_locks),
+            'timeouts': self.timeouts,
+        }
+
+
+def setup_concurrency(dp: Dispatcher, max_concurrent: int, timeout: float,
+                      exempt_user_ids: Collection[int] = ()) -> ConcurrencyMiddleware:
+    """
+    Подключает middleware так, чтобы она стояла перед FSM-middleware:
+    состояние пользователя должно читаться уже под его блокировкой.
+    """
+    middleware = ConcurrencyMiddleware(max_concurrent=max_concurrent, timeout=timeout,
+                                       exempt_user_ids=exempt_user_ids)
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(middleware)
+    dp.update.outer_middleware(dp.fsm)
+    return middleware
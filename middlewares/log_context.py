@@ -0,0 +1,65 @@
+"""
+Контекст обновления для логов: update_id, user_id и имя обработчика.
+
+Значения кладутся в contextvars, поэтому любой logger.* внутри обработки
+обновления (в том числе в db_manager и утилитах) получает их без передачи
+аргументов.
+"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from utils.logger import bind_log_context, reset_log_context
+
+
+class UpdateLogContextMiddleware(BaseMiddleware):
+    """Outer middleware обновления: update_id и user_id"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        token = bind_log_context(
+            update_id=event.update_id if isinstance(event, Update) else None,
+            user_id=user.id if user else None
+        )
+        try:
+            return await handler(event, data)
+        finally:
+            reset_log_context(token)
+
+
+class HandlerLogContextMiddleware(BaseMiddleware):
+    """Inner middleware: имя выбранного обработчика"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        callback = getattr(handler_object, 'callback', None)
+        token = bind_log_context(handler=getattr(callback, '__name__', None))
+        try:
+            return await handler(event, data)
+        finally:
+            reset_log_context(token)
+
+
+def setup_log_context(dp: Dispatcher):
+    """
+    Подключает middleware контекста логов. Вызывать до setup_concurrency:
+    контекст должен стоять сразу после UserContextMiddleware (он заполняет
+    event_from_user), чтобы его видели семафор, FSM и обработчики.
+    """
+    dp.update.outer_middleware(UpdateLogContextMiddleware())
+    handler_middleware = HandlerLogContextMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ('update', 'error'):
+            observer.middleware(handler_middleware)
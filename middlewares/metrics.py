@@ -0,0 +1,70 @@
+"""
+Сбор метрик обработчиков и запросов к Bot API.
+
+- HandlerMetricsMiddleware - inner middleware на всех типах событий:
+  время и исключения по имени выбранного обработчика;
+- TelegramMetricsMiddleware - middleware сессии бота: время и ошибки
+  по методу Bot API (после планировщика и повторов - чистое время запроса).
+
+На каждое событие - два вызова perf_counter и обновление словаря.
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from utils.metrics import API_ERRORS, API_LATENCY, HANDLER_ERRORS, HANDLER_LATENCY
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время и ошибки по обработчикам"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        callback = getattr(data.get('handler'), 'callback', None)
+        name = getattr(callback, '__name__', 'unknown')
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Время и ошибки по методам Bot API"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Any:
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - start, name)
+
+
+def setup_handler_metrics(dp: Dispatcher):
+    """Подключает сбор метрик ко всем обработчикам всех роутеров"""
+    middleware = HandlerMetricsMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ('update', 'error'):
+            observer.middleware(middleware)
@@ -0,0 +1,34 @@
+"""
+Запись входящих обновлений для воспроизведения (utils/update_recorder.py).
+"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from utils.logger import logger
+from utils.update_recorder import update_recorder
+
+
+class UpdateRecordingMiddleware(BaseMiddleware):
+    """Outer middleware обновления: копия обновления в очередь записи"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Update):
+            try:
+                update_recorder.record(event.model_dump(mode='json', exclude_none=True, by_alias=True))
+            except Exception as e:
+                # Запись не должна мешать обработке
+                logger.warning("Не удалось сохранить обновление для записи: %s", e)
+        return await handler(event, data)
+
+
+def setup_recording(dp: Dispatcher):
+    """Подключает запись; вызывать первым, чтобы записывались и отброшенные анти-флудом обновления"""
+    dp.update.outer_middleware(UpdateRecordingMiddleware())
@@ -0,0 +1,188 @@
+"""
+Защита от флуда: token bucket на пользователя и тип действия.
+
+Дневные квоты считают поиски и отзывы, но не мешают одному пользователю
+или скрипту отправить десятки запросов в секунду. Здесь у каждой пары
+(пользователь, действие) свое ведро токенов:
+
+- search   - ввод номера для поиска;
+- review   - шаги создания отзыва;
+- reaction - реакции на авто;
+- callback - остальные нажатия inline-кнопок;
+- message  - остальные сообщения.
+
+Лишние обновления отбрасываются без обращения к БД: на нажатие кнопки
+отвечаем всплывающим уведомлением, на сообщение - одним предупреждением
+за серию.
+
+Проверка в два этапа. Нажатия кнопок проверяются на уровне обновления,
+до ConcurrencyMiddleware: отброшенное нажатие не ждет блокировку
+пользователя и слот семафора. Ведро сообщения зависит от FSM-состояния
+(поиск, шаг отзыва или обычное сообщение), которое известно только после
+FSM-middleware, - сообщения проверяются вторым этапом, на уровне
+сообщений, и каждое забирает токен ровно из одного ведра.
+
+Ведра хранятся в LRU ограниченного размера, простаивающие (полностью
+восстановившиеся) ведра удаляются.
+"""
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import Dispatcher
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from config import config
+from utils.logger import logger
+
+THROTTLED_TEXT = "🐢 Слишком часто! Подождите пару секунд."
+
+# Префиксы callback_data -> действие
+CALLBACK_ACTIONS = (
+    ('react_', 'reaction'),
+    ('rate_', 'review'),
+)
+
+# Префиксы FSM-состояний -> действие
+STATE_ACTIONS = (
+    ('SearchForm:', 'search'),
+    ('ReviewForm:', 'review'),
+)
+
+# Как часто подчищать простаивающие ведра (в обращениях)
+SWEEP_EVERY = 1000
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Token bucket по (user_id, действие) с ограниченной памятью"""
+
+    def __init__(self, rates: Dict[str, float], burst: int = 5, max_buckets: int = 50_000):
+        # rates: действие -> токенов в секунду
+        self.rates = rates
+        self.burst = burst
+        self.max_buckets = max_buckets
+        # (user_id, действие) -> [токены, время обновления, предупрежден ли]
+        self._buckets: "OrderedDict[Tuple[int, str], list]" = OrderedDict()
+        self._calls = 0
+        # Метрики
+        self.throttled: Counter = Counter()
+        self.evicted = 0
+
+    @staticmethod
+    def classify(event: TelegramObject, raw_state: Optional[str]) -> str:
+        """Определяет тип действия без обращения к БД"""
+        if isinstance(event, CallbackQuery):
+            data = event.data or ''
+            for prefix, action in CALLBACK_ACTIONS:
+                if data.startswith(prefix):
+                    return action
+            return 'callback'
+
+        if isinstance(event, Message):
+            return ThrottlingMiddleware.state_action(raw_state) or 'message'
+        return 'message'
+
+    @staticmethod
+    def state_action(raw_state: Optional[str]) -> Optional[str]:
+        """Действие, которое определяется FSM-состоянием (поиск, отзыв)"""
+        if raw_state:
+            for prefix, action in STATE_ACTIONS:
+                if raw_state.startswith(prefix):
+                    return action
+        return None
+
+    def allow(self, user_id: int, action: str) -> Tuple[bool, list]:
+        """Забирает токен из ведра пользователя"""
+        now = time.monotonic()
+        rate = self.rates.get(action, self.rates['message'])
+        key = (user_id, action)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.burst), now, False]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        self._calls += 1
+        if self._calls % SWEEP_EVERY == 0:
+            self._sweep(now)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return True, bucket
+        return False, bucket
+
+    def _sweep(self, now: float):
+        """Удаляет ведра, которые за время простоя уже полностью наполнились"""
+        slowest = min(self.rates.values())
+        idle_after = self.burst / slowest
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < idle_after:
+                break  # дальше по LRU только более свежие
+            del self._buckets[key]
+            self.evicted += 1
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is None or user.id == config.ADMIN_ID:
+            return await handler(event, data)
+
+        if isinstance(event, Update):
+            # Первый этап - до блокировки пользователя: нажатия кнопок
+            target = event.callback_query
+            action = self.classify(target, None) if target else None
+        else:
+            # Второй этап - после FSM: сообщения (поиск, шаги отзыва, остальные)
+            target = event
+            action = self.classify(event, data.get('raw_state'))
+        if action is None:
+            return await handler(event, data)
+
+        allowed, bucket = self.allow(user.id, action)
+        if allowed:
+            return await handler(event, data)
+
+        self.throttled[action] += 1
+        if isinstance(target, CallbackQuery):
+            await target.answer(THROTTLED_TEXT)
+        elif isinstance(target, Message) and not bucket[2]:
+            # Предупреждаем один раз за серию, чтобы самим не флудить
+            bucket[2] = True
+            await target.answer(THROTTLED_TEXT)
+        if self.throttled[action] % 100 == 1:
+            logger.warning("🐢 Троттлинг %s для пользователя %s", action, user.id)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики троттлинга"""
+        return {
+            'buckets': len(self._buckets),
+            'throttled': dict(self.throttled),
+            'evicted': self.evicted,
+        }
+
+
+def setup_throttling(dp: Dispatcher, rates: Dict[str, float], burst: int) -> ThrottlingMiddleware:
+    """
+    Подключает middleware к обновлениям (вызывать до setup_concurrency,
+    чтобы отброшенные нажатия не ждали блокировку и семафор) и к
+    сообщениям - там уже известно FSM-состояние (raw_state).
+    """
+    middleware = ThrottlingMiddleware(rates=rates, burst=burst, max_buckets=config.THROTTLE_MAX_BUCKETS)
+    dp.update.outer_middleware(middleware)
+    dp.message.outer_middleware(middleware)
+    return middleware
@@ -0,0 +1,79 @@
+"""
+Трассировка обновлений: корневой span на обновление, span обработчика
+и span на каждый запрос к Bot API.
+
+Span вызовов БД создает instrument_queries в database/db_manager.py.
+"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from utils.tracing import KIND_CLIENT, tracer
+
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """Outer middleware обновления: корневой span"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        user = data.get('event_from_user')
+        with tracer.start_trace(
+            f"update {event.event_type}",
+            **{'update.id': event.update_id, 'update.type': event.event_type,
+               'user.id': user.id if user else None}
+        ):
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Inner middleware: span выбранного обработчика"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if tracer.current() is None:
+            return await handler(event, data)
+        callback = getattr(data.get('handler'), 'callback', None)
+        name = getattr(callback, '__name__', 'unknown')
+        tracer.set_root_attribute('handler', name)
+        with tracer.span(f"handler {name}"):
+            return await handler(event, data)
+
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    """Span на запрос к Bot API, включая ожидание планировщика и повторы"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Any:
+        if tracer.current() is None:
+            return await make_request(bot, method)
+        name = type(method).__name__
+        with tracer.span(f"telegram {name}", KIND_CLIENT, **{'telegram.method': name}):
+            return await make_request(bot, method)
+
+
+def setup_tracing(dp: Dispatcher):
+    """Подключает трассировку; вызывать первым, чтобы span покрывал все middleware"""
+    dp.update.outer_middleware(UpdateTracingMiddleware())
+    middleware = HandlerTracingMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ('update', 'error'):
+            observer.middleware(middleware)
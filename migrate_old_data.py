@@ -13,6 +13,8 @@ import asyncpg
 import os
 from datetime import datetime
 
+from utils.validators import clean_plate
+
 # URL старой базы данных (из вашего старого бота)
 OLD_DATABASE_URL = os.getenv('OLD_DATABASE_URL', '')
 
@@ -66,7 +68,7 @@ async def migrate_reviews():
                 INSERT INTO reviews (plate, rating, comment, photo_id, video_id, 
                                    latitude, longitude, user_id, created_at)
                 VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            ''', review['plate'], review['rating'], review['comment'],
+            ''', clean_plate(review['plate']), review['rating'], review['comment'],
                 review.get('photo_id'), review.get('video_id'),
                 review.get('latitude'), review.get('longitude'),
                 review['user_id'], datetime.now())
@@ -97,7 +99,7 @@ async def migrate_subscriptions():
                 INSERT INTO subscriptions (user_id, plate)
                 VALUES ($1, $2)
                 ON CONFLICT (user_id, plate) DO NOTHING
-            ''', sub['user_id'], sub['plate'])
+            ''', sub['user_id'], clean_plate(sub['plate']))
             migrated += 1
         except Exception as e:
             print(f"❌ Ошибка миграции подписки: {e}")
@@ -0,0 +1,184 @@
+"""
+Перевод существующих номеров на канонические ключи.
+
+Раньше clean_plate сохранял кириллицу, поэтому "777АВС02" и "777ABC02"
+лежат в БД под разными ключами. Скрипт заменяет кириллических двойников
+латиницей (тем же правилом, что и canonical_plate) в таблицах reviews,
+subscriptions, car_reactions и review_fingerprints (проверка дублей ищет
+отпечатки по номеру). Повторный запуск после обновления переведет только
+таблицы, которых раньше в списке не было.
+
+Работает порциями: каждая порция - короткая транзакция с lock_timeout,
+бот может продолжать работать. Прогресс хранится в таблице
+plate_rekey_progress, поэтому прерванный запуск продолжается с места
+остановки.
+
+Если у пользователя есть подписка (или реакция) и на кириллический, и на
+латинский вариант номера, после перевода они совпали бы по первичному
+ключу - остается самая свежая запись, остальные удаляются.
+
+Использование:
+    python renormalize_plates.py [--chunk 1000] [--pause 0.05] [--reset]
+"""
+import argparse
+import asyncio
+import os
+
+import asyncpg
+
+from utils.validators import HOMOGLYPHS_CYRILLIC, HOMOGLYPHS_LATIN
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
+# Таблица -> (колонка для порций, колонка времени для выбора записи при слиянии)
+TABLES = {
+    'reviews': ('id', None),
+    'subscriptions': ('user_id', 'subscribed_at'),
+    'car_reactions': ('user_id', 'created_at'),
+    'review_fingerprints': ('review_id', None),
+}
+
+LOCK_TIMEOUT = '2s'
+
+
+async def init_progress(conn: asyncpg.Connection, reset: bool):
+    """Создает таблицу прогресса"""
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS plate_rekey_progress (
+            table_name TEXT PRIMARY KEY,
+            last_key BIGINT NOT NULL DEFAULT 0,
+            rows_updated BIGINT NOT NULL DEFAULT 0,
+            rows_merged BIGINT NOT NULL DEFAULT 0,
+            finished_at TIMESTAMP
+        )
+    ''')
+    if reset:
+        await conn.execute('DELETE FROM plate_rekey_progress')
+    for table in TABLES:
+        await conn.execute(
+            'INSERT INTO plate_rekey_progress (table_name) VALUES ($1) ON CONFLICT DO NOTHING',
+            table
+        )
+
+
+async def rekey_chunk(conn: asyncpg.Connection, table: str, last_key: int, chunk: int):
+    """
+    Обрабатывает одну порцию.
+
+    Returns:
+        (новый last_key или None, если таблица закончилась, обновлено, слито)
+    """
+    key_col, time_col = TABLES[table]
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+
+        # Граница порции по ключу (keyset, без OFFSET)
+        upper = await conn.fetchval(f'''
+            SELECT MAX({key_col}) FROM (
+                SELECT DISTINCT {key_col} FROM {table}
+                WHERE {key_col} > $1
+                ORDER BY {key_col}
+                LIMIT $2
+            ) s
+        ''', last_key, chunk)
+        if upper is None:
+            return None, 0, 0
+
+        merged = 0
+        if time_col:
+            # Записи одного пользователя, которые совпадут после перевода:
+            # оставляем самую свежую
+            status = await conn.execute(f'''
+                DELETE FROM {table} WHERE ctid IN (
+                    SELECT ctid FROM (
+                        SELECT ctid, ROW_NUMBER() OVER (
+                            PARTITION BY user_id, translate(plate, $3, $4)
+                            ORDER BY {time_col} DESC NULLS LAST
+                        ) AS rn
+                        FROM {table}
+                        WHERE {key_col} > $1 AND {key_col} <= $2
+                    ) ranked
+                    WHERE rn > 1
+                )
+            ''', last_key, upper, HOMOGLYPHS_CYRILLIC, HOMOGLYPHS_LATIN)
+            merged = int(status.split()[-1])
+
+        status = await conn.execute(f'''
+            UPDATE {table} SET plate = translate(plate, $3, $4)
+            WHERE {key_col} > $1 AND {key_col} <= $2
+              AND plate <> translate(plate, $3, $4)
+        ''', last_key, upper, HOMOGLYPHS_CYRILLIC, HOMOGLYPHS_LATIN)
+        updated = int(status.split()[-1])
+
+        await conn.execute('''
+            UPDATE plate_rekey_progress
+            SET last_key = $2, rows_updated = rows_updated + $3, rows_merged = rows_merged + $4
+            WHERE table_name = $1
+        ''', table, upper, updated, merged)
+
+    return upper, updated, merged
+
+
+async def rekey_table(conn: asyncpg.Connection, table: str, chunk: int, pause: float):
+    """Переводит таблицу порциями с места последней остановки"""
+    progress = await conn.fetchrow('SELECT * FROM plate_rekey_progress WHERE table_name = $1', table)
+    if progress['finished_at']:
+        print(f"⏭ {table}: уже обработана")
+        return
+
+    last_key = progress['last_key']
+    total_updated = total_merged = 0
+    print(f"📊 {table}: начинаем с ключа {last_key}")
+
+    while True:
+        try:
+            next_key, updated, merged = await rekey_chunk(conn, table, last_key, chunk)
+        except asyncpg.exceptions.LockNotAvailableError:
+            print(f"⏳ {table}: порция после {last_key} заблокирована, повторяем")
+            await asyncio.sleep(1)
+            continue
+
+        if next_key is None:
+            break
+        last_key = next_key
+        total_updated += updated
+        total_merged += merged
+        if updated or merged:
+            print(f"   ...до ключа {last_key}: обновлено {total_updated}, слито {total_merged}")
+        await asyncio.sleep(pause)
+
+    await conn.execute(
+        'UPDATE plate_rekey_progress SET finished_at = CURRENT_TIMESTAMP WHERE table_name = $1',
+        table
+    )
+    print(f"✅ {table}: обновлено {total_updated}, слито дублей {total_merged}")
+
+
+async def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Перевод номеров на канонические ключи")
+    parser.add_argument('--chunk', type=int, default=1000, help="ключей в одной порции")
+    parser.add_argument('--pause', type=float, default=0.05, help="пауза между порциями, с")
+    parser.add_argument('--reset', action='store_true', help="начать заново")
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        print("❌ Ошибка: не указан DATABASE_URL")
+        return
+
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        await init_progress(conn, args.reset)
+        for table in TABLES:
+            if not await conn.fetchval('SELECT to_regclass($1) IS NOT NULL', table):
+                print(f"⏭ {table}: таблицы нет")
+                continue
+            await rekey_table(conn, table, args.chunk, args.pause)
+        print("\n✅ Перевод номеров завершен!")
+        print("⚠️  Перезапустите бота: кэш карточек и фильтр номеров строятся по старым ключам")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
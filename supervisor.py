@@ -0,0 +1,422 @@
+"""
+Driver Rating KZ Pro - многопроцессный запуск.
+
+Супервизор получает обновления (polling или webhook) и раздает их N
+процессам-воркерам по user_id % N, поэтому обновления одного пользователя
+всегда обрабатываются одним воркером и по порядку. У каждого воркера свой
+пул соединений с БД и свой Dispatcher. Супервизор следит за heartbeat
+воркеров и перезапускает упавшие или зависшие.
+
+Использование:
+    python supervisor.py
+"""
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import time
+from contextlib import suppress
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+from config import config
+from utils.logger import logger, use_process_log_file
+from utils.update_recorder import update_recorder
+
+# Типы обновлений, в которых отправитель лежит в поле "from"
+USER_UPDATE_TYPES = (
+    'message', 'edited_message', 'callback_query', 'inline_query',
+    'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+    'my_chat_member', 'chat_member', 'chat_join_request', 'poll_answer',
+    'message_reaction', 'business_message', 'edited_business_message',
+)
+
+# Сигнал воркеру завершиться после обработки очереди
+STOP = None
+
+
+def api_server() -> TelegramAPIServer:
+    """Bot API из TELEGRAM_API_URL (локальный сервер, фейковый API бенчмарков) или официальный"""
+    if config.TELEGRAM_API_URL:
+        return TelegramAPIServer.from_base(config.TELEGRAM_API_URL)
+    return PRODUCTION
+
+
+def extract_user_id(update: Dict[str, Any]) -> int:
+    """Достает id пользователя из сырого обновления без полного разбора"""
+    for update_type in USER_UPDATE_TYPES:
+        event = update.get(update_type)
+        if event is None:
+            continue
+        user = event.get('from') or event.get('user')
+        if user:
+            return user['id']
+        chat = event.get('chat') or (event.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+    return update.get('update_id', 0)
+
+
+# --- ВОРКЕР ---
+
+class Worker:
+    """Процесс-воркер: свой пул БД, свой Dispatcher, порядок обновлений по пользователю"""
+
+    def __init__(self, index: int, workers: int, updates: mp.Queue, heartbeat):
+        self.index = index
+        self.workers = workers
+        self.updates = updates
+        self.heartbeat = heartbeat
+        # user_id -> последняя задача пользователя, следующая ждет ее завершения
+        self._tails: Dict[int, asyncio.Task] = {}
+
+    async def _beat(self):
+        while True:
+            self.heartbeat.value = time.time()
+            await asyncio.sleep(1)
+
+    async def _process(self, bot, dp, update: Dict[str, Any], previous: Optional[asyncio.Task]):
+        if previous is not None:
+            with suppress(Exception):
+                await previous
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.error("[worker %s] Ошибка обработки обновления %s: %s", self.index, update.get('update_id'), e)
+
+    def _submit(self, bot, dp, update: Dict[str, Any]):
+        user_id = extract_user_id(update)
+        task = asyncio.create_task(self._process(bot, dp, update, self._tails.get(user_id)))
+        self._tails[user_id] = task
+
+        def forget(done: asyncio.Task):
+            if self._tails.get(user_id) is done:
+                del self._tails[user_id]
+
+        task.add_done_callback(forget)
+
+    async def run(self):
+        # Импорт здесь: роутеры можно подключить только к одному диспетчеру в процессе
+        from bot import create_bot, create_dispatcher, start_services, stop_services
+        from database.db_manager import db
+        from utils.outbound import outbound
+
+        # Общий бюджет соединений делим между воркерами
+        max_size = max(2, config.DB_POOL_MAX_SIZE // self.workers)
+        await db.init_pool(min_size=min(config.DB_POOL_MIN_SIZE, max_size), max_size=max_size)
+
+        # Лимит Telegram общий на бота - делим его между воркерами
+        outbound.rate = config.OUTBOUND_RATE / self.workers
+        bot = create_bot()
+        # Обновления записывает супервизор: один файл на всех воркеров
+        dp = create_dispatcher(record_updates=False)
+        # Фоновые задачи на всю базу достаточно выполнять в одном процессе;
+        # метрики у каждого воркера свои - на METRICS_PORT + номер воркера
+        await start_services(bot, dp, primary=self.index == 0, metrics_port=config.METRICS_PORT + self.index)
+
+        beat = asyncio.create_task(self._beat())
+        loop = asyncio.get_running_loop()
+        logger.info("👷 Воркер %s запущен (pid %s)", self.index, os.getpid())
+
+        try:
+            stopping = False
+            while not stopping:
+                # Блокирующее чтение в потоке, затем забираем все, что уже накопилось
+                batch = [await loop.run_in_executor(None, self.updates.get)]
+                with suppress(queue.Empty):
+                    while len(batch) < 100:
+                        batch.append(self.updates.get_nowait())
+
+                for update in batch:
+                    if update is STOP:
+                        stopping = True
+                        break
+                    self._submit(bot, dp, update)
+
+            # Дорабатываем начатое перед выходом
+            if self._tails:
+                await asyncio.gather(*self._tails.values(), return_exceptions=True)
+        finally:
+            beat.cancel()
+            await stop_services(dp)
+            await dp.fsm.close()
+            await db.close_pool()
+            await bot.session.close()
+            logger.info("👷 Воркер %s остановлен", self.index)
+
+
+def worker_main(index: int, workers: int, updates: mp.Queue, heartbeat):
+    """Точка входа процесса-воркера"""
+    # Остановкой управляет супервизор, Ctrl+C в группе процессов игнорируем
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Ротация одного файла несколькими процессами ломается: у воркера свой файл
+    use_process_log_file(f"worker{index}")
+    asyncio.run(Worker(index, workers, updates, heartbeat).run())
+
+
+# --- СУПЕРВИЗОР ---
+
+class WorkerHandle:
+    """Состояние одного воркера на стороне супервизора"""
+
+    def __init__(self, index: int, ctx, queue_size: int):
+        self.index = index
+        self.ctx = ctx
+        self.queue_size = queue_size
+        self.updates: mp.Queue = ctx.Queue(maxsize=queue_size)
+        self.heartbeat = ctx.Value('d', 0.0)
+        self.process: Optional[mp.Process] = None
+        self.restarts = 0
+        self.started_at = 0.0
+
+    def start(self, workers: int):
+        self.heartbeat.value = time.time()
+        self.process = self.ctx.Process(
+            target=worker_main,
+            args=(self.index, workers, self.updates, self.heartbeat),
+            name=f"bot-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        self.started_at = time.time()
+
+    def is_healthy(self, timeout: float) -> bool:
+        return (
+            self.process is not None
+            and self.process.is_alive()
+            and time.time() - self.heartbeat.value < timeout
+        )
+
+
+class Supervisor:
+    """Запускает воркеров, раздает им обновления и следит за их здоровьем"""
+
+    def __init__(self, workers: int):
+        self.workers_count = workers
+        self.ctx = mp.get_context('spawn')
+        self.handles: List[WorkerHandle] = [
+            WorkerHandle(i, self.ctx, config.WORKER_QUEUE_SIZE)
+            for i in range(workers)
+        ]
+        self._stopping = asyncio.Event()
+
+    # --- МАРШРУТИЗАЦИЯ ---
+
+    async def route(self, update: Dict[str, Any]):
+        """Отправляет обновление воркеру по user_id; при переполнении ждет (backpressure)"""
+        update_recorder.record(update)
+        handle = self.handles[extract_user_id(update) % self.workers_count]
+        while True:
+            try:
+                handle.updates.put_nowait(update)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.05)
+
+    # --- ЗДОРОВЬЕ ---
+
+    async def monitor(self):
+        """Перезапускает умершие и зависшие воркеры с экспоненциальной задержкой"""
+        while not self._stopping.is_set():
+            await asyncio.sleep(2)
+            for handle in self.handles:
+                if self._stopping.is_set() or handle.is_healthy(config.WORKER_HEARTBEAT_TIMEOUT):
+                    continue
+                await self._restart(handle)
+
+    async def _restart(self, handle: WorkerHandle):
+        process = handle.process
+        hung = process.is_alive()
+        if hung:
+            logger.error("💀 Воркер %s не отвечает, перезапускаем", handle.index)
+            process.terminate()
+        else:
+            logger.error("💀 Воркер %s завершился с кодом %s, перезапускаем", handle.index, process.exitcode)
+        await asyncio.get_running_loop().run_in_executor(None, process.join, 5)
+        if process.is_alive():
+            process.kill()
+
+        if hung:
+            # Процесс убит посреди чтения очереди - она могла повредиться, берем новую
+            lost = handle.updates.qsize()
+            handle.updates = self.ctx.Queue(maxsize=handle.queue_size)
+            if lost:
+                logger.warning("Потеряно %s обновлений в очереди воркера %s", lost, handle.index)
+
+        # Сбрасываем счетчик, если воркер до этого долго работал стабильно
+        if time.time() - handle.started_at > 300:
+            handle.restarts = 0
+        delay = min(30, 2 ** handle.restarts) if handle.restarts else 0
+        handle.restarts += 1
+        if delay:
+            await asyncio.sleep(delay)
+        handle.start(self.workers_count)
+
+    # --- ИСТОЧНИКИ ОБНОВЛЕНИЙ ---
+
+    async def poll(self, allowed_updates: List[str]):
+        """Long polling без разбора обновлений в pydantic-модели"""
+        url = api_server().api_url(config.BOT_TOKEN, 'getUpdates')
+        offset = 0
+        backoff = 1
+        timeout = aiohttp.ClientTimeout(total=60)
+
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while not self._stopping.is_set():
+                try:
+                    async with session.post(url, json={
+                        'offset': offset,
+                        'timeout': 30,
+                        'allowed_updates': allowed_updates
+                    }) as response:
+                        payload = await response.json()
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning("Ошибка getUpdates: %s, повтор через %s с", e, backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+
+                if not payload.get('ok'):
+                    retry_after = (payload.get('parameters') or {}).get('retry_after', backoff)
+                    logger.warning("getUpdates вернул ошибку: %s, повтор через %s с",
+                                   payload.get('description'), retry_after)
+                    await asyncio.sleep(retry_after)
+                    backoff = min(backoff * 2, 30)
+                    continue
+
+                backoff = 1
+                for update in payload['result']:
+                    await self.route(update)
+                    offset = update['update_id'] + 1
+
+    async def serve_webhook(self):
+        """Webhook-сервер, который раздает обновления воркерам"""
+        from web.webhook import WebhookServer
+
+        supervisor = self
+
+        class ShardedWebhookServer(WebhookServer):
+            async def process_update(self, update: Dict[str, Any]):
+                await supervisor.route(update)
+
+            def readiness_checks(self) -> Dict[str, bool]:
+                return {
+                    'started': self._ready,
+                    'workers': all(h.is_healthy(config.WORKER_HEARTBEAT_TIMEOUT) for h in supervisor.handles),
+                    'queue': self.queue_has_room(),
+                }
+
+        server = ShardedWebhookServer(
+            None, None,
+            queue_size=config.WEBHOOK_QUEUE_SIZE,
+            # Воркеры вебхука только перекладывают в очереди процессов
+            workers=max(2, self.workers_count)
+        )
+        await server.start(config.WEBAPP_HOST, config.WEBAPP_PORT)
+        try:
+            await self._stopping.wait()
+        finally:
+            await server.stop()
+
+    # --- ЖИЗНЕННЫЙ ЦИКЛ ---
+
+    async def prepare(self, bot: Bot) -> List[str]:
+        """Однократная инициализация до запуска воркеров"""
+        from bot import create_dispatcher, set_bot_commands
+        from database.db_manager import db
+
+        # Таблицы создаем один раз, чтобы воркеры не гонялись на DDL
+        await db.init_pool(min_size=1, max_size=2)
+        try:
+            await db.init_tables()
+        finally:
+            await db.close_pool()
+
+        await set_bot_commands(bot)
+        return create_dispatcher().resolve_used_update_types()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            with suppress(NotImplementedError):
+                loop.add_signal_handler(sig, self._stopping.set)
+
+        bot = Bot(token=config.BOT_TOKEN, session=AiohttpSession(api=api_server()))
+        try:
+            allowed_updates = await self.prepare(bot)
+
+            for handle in self.handles:
+                handle.start(self.workers_count)
+            logger.info("🚀 Супервизор запустил %s воркеров", self.workers_count)
+
+            if config.BOT_MODE == 'webhook':
+                await bot.set_webhook(
+                    config.get_webhook_url(),
+                    secret_token=config.WEBHOOK_SECRET,
+                    allowed_updates=allowed_updates,
+                    max_connections=100
+                )
+                source = asyncio.create_task(self.serve_webhook())
+            else:
+                await bot.delete_webhook(drop_pending_updates=False)
+                source = asyncio.create_task(self.poll(allowed_updates))
+
+            monitor = asyncio.create_task(self.monitor())
+            with suppress(Exception):
+                await bot.send_message(config.ADMIN_ID, "✅ <b>Бот запущен!</b>\n\n"
+                                       f"Воркеров: {self.workers_count}", parse_mode="HTML")
+
+            await self._stopping.wait()
+            logger.info("🛑 Остановка супервизора...")
+
+            monitor.cancel()
+            # Вебхук-сервер сам доработает свою очередь по _stopping
+            if config.BOT_MODE == 'webhook':
+                await source
+            else:
+                source.cancel()
+                with suppress(asyncio.CancelledError):
+                    await source
+
+            await self.shutdown_workers()
+            update_recorder.stop()
+            with suppress(Exception):
+                await bot.send_message(config.ADMIN_ID, "⚠️ <b>Бот остановлен</b>", parse_mode="HTML")
+        finally:
+            await bot.session.close()
+
+    async def shutdown_workers(self, timeout: float = 30):
+        """Просит воркеров доработать очереди и выйти"""
+        for handle in self.handles:
+            with suppress(Exception):
+                handle.updates.put(STOP, timeout=5)
+
+        loop = asyncio.get_running_loop()
+        deadline = time.time() + timeout
+        for handle in self.handles:
+            if handle.process is None:
+                continue
+            await loop.run_in_executor(None, handle.process.join, max(0, deadline - time.time()))
+            if handle.process.is_alive():
+                logger.warning("Воркер %s не завершился вовремя, принудительная остановка", handle.index)
+                handle.process.terminate()
+        logger.info("✅ Все воркеры остановлены")
+
+
+def main():
+    if not config.validate():
+        logger.error("❌ Ошибка конфигурации. Бот не запущен.")
+        sys.exit(1)
+
+    workers = config.WORKERS or os.cpu_count() or 1
+    asyncio.run(Supervisor(workers).run())
+
+
+if __name__ == "__main__":
+    main()
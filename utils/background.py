@@ -0,0 +1,49 @@
+"""
+Фоновые задачи обработчиков: уведомления подписчиков, рассылка,
+профилирование.
+
+Обработчик не ждет их завершения (не держит блокировку пользователя,
+слот семафора и дедлайн обновления), но задачи не теряются: ссылки
+хранятся до завершения (иначе сборщик мусора может удалить задачу),
+исключения пишутся в лог, при остановке бота задачи дорабатывают.
+"""
+import asyncio
+from typing import Coroutine, Set
+
+from utils.logger import logger
+
+_tasks: Set[asyncio.Task] = set()
+
+
+def spawn(coro: Coroutine, name: str) -> asyncio.Task:
+    """Запускает корутину в фоне"""
+    task = asyncio.create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_done)
+    return task
+
+
+def _done(task: asyncio.Task):
+    _tasks.discard(task)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error("❌ Фоновая задача %s упала: %r", task.get_name(), error, exc_info=error)
+
+
+async def drain(timeout: float):
+    """Дает фоновым задачам доработать, оставшиеся отменяет"""
+    if not _tasks:
+        return
+    logger.info("⏳ Ожидание фоновых задач: %s", len(_tasks))
+    _, pending = await asyncio.wait(set(_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning("Отменено незавершенных фоновых задач: %s", len(pending))
+
+
+def pending() -> int:
+    return len(_tasks)
@@ -0,0 +1,129 @@
+"""
+Отпечатки текста отзывов для поиска дублей и спама.
+
+- normalize_text: регистр, ё/е, латинские двойники кириллицы, пунктуация,
+  растянутые буквы ("ооочень") - чтобы мелкие правки не меняли отпечаток;
+- text_hash: 64-битный хеш нормализованного текста (точные дубли);
+- simhash: 64-битный SimHash по символьным 3-граммам (почти дубли).
+
+Для поиска почти-дублей SimHash режется на 4 полосы по 16 бит. Если два
+отпечатка отличаются не более чем в 3 битах, хотя бы одна полоса у них
+совпадает целиком, поэтому кандидатов можно найти точным поиском по индексу
+каждой полосы, а затем проверить расстояние Хэмминга. Отпечатки с большим
+расстоянием (до NEAR_DUPLICATE_DISTANCE) находятся, если совпала хотя бы
+одна полоса - на коротких отзывах замена слова дает 5-10 бит разницы.
+"""
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+SIMHASH_BITS = 64
+BAND_BITS = 16
+BANDS = SIMHASH_BITS // BAND_BITS
+
+# Порог расстояния Хэмминга для почти-дублей
+NEAR_DUPLICATE_DISTANCE = 6
+
+SHINGLE_SIZE = 3
+
+# Латинские буквы, которыми подменяют кириллицу, чтобы обойти фильтры
+_LATIN_TO_CYRILLIC = str.maketrans('aeopcyxABEKMHOPCTYX', 'аеорсухавекмнорстух')
+_NON_WORD = re.compile(r'[^\w]+')
+_STRETCHED = re.compile(r'(\w)\1{2,}')
+
+
+@dataclass
+class Fingerprint:
+    """Отпечаток одного текста"""
+    text_hash: int
+    simhash: int
+
+    @property
+    def bands(self) -> Tuple[int, ...]:
+        return simhash_bands(self.simhash)
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к виду, устойчивому к мелким правкам"""
+    text = text.translate(_LATIN_TO_CYRILLIC).lower().replace('ё', 'е')
+    text = _NON_WORD.sub(' ', text).replace('_', ' ')
+    text = _STRETCHED.sub(r'\1', text)
+    return ' '.join(text.split())
+
+
+def _hash64(data: str) -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), 'big')
+
+
+def _to_signed(value: int) -> int:
+    """uint64 -> int64 (для колонки BIGINT)"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def simhash(normalized: str) -> int:
+    """64-битный SimHash по символьным шинглам"""
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = [normalized]
+    else:
+        shingles = [normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = _hash64(shingle)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return _to_signed(value)
+
+
+def simhash_bands(value: int) -> Tuple[int, ...]:
+    """Режет SimHash на полосы по 16 бит"""
+    value &= (1 << SIMHASH_BITS) - 1
+    mask = (1 << BAND_BITS) - 1
+    return tuple((value >> (i * BAND_BITS)) & mask for i in range(BANDS))
+
+
+def hamming(a: int, b: int) -> int:
+    """Число различающихся бит"""
+    return ((a ^ b) & ((1 << SIMHASH_BITS) - 1)).bit_count()
+
+
+def fingerprint(text: str) -> Fingerprint:
+    """Отпечаток комментария"""
+    normalized = normalize_text(text)
+    return Fingerprint(text_hash=_to_signed(_hash64(normalized)), simhash=simhash(normalized))
+
+
+def near_duplicates(fp: Fingerprint, candidates: List[dict]) -> List[dict]:
+    """Оставляет кандидатов, совпадающих точно или почти"""
+    return [
+        c for c in candidates
+        if c['text_hash'] == fp.text_hash or hamming(c['simhash'], fp.simhash) <= NEAR_DUPLICATE_DISTANCE
+    ]
+
+
+@dataclass
+class DuplicateVerdict:
+    """Решение по новому отзыву"""
+    action: str                       # 'ok' | 'flag' | 'reject'
+    cluster_id: Optional[int] = None  # группа дублей, к которой относится отзыв
+
+
+def judge_duplicates(fp: Fingerprint, candidates: List[dict], user_id: int) -> DuplicateVerdict:
+    """
+    Свой же текст повторно (на любой номер) - отклоняем.
+    Такой же текст от других пользователей - публикуем, но помечаем для модерации:
+    короткие отзывы вроде "вежливый водитель" легитимно совпадают.
+    """
+    matches = near_duplicates(fp, candidates)
+    if not matches:
+        return DuplicateVerdict('ok')
+    cluster_id = matches[0]['cluster_id']
+    if any(m['user_id'] == user_id for m in matches):
+        return DuplicateVerdict('reject', cluster_id)
+    return DuplicateVerdict('flag', cluster_id)
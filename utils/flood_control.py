@@ -0,0 +1,166 @@
+"""
+Учет flood control Telegram для всех исходящих запросов.
+
+RetryMiddleware подключается к сессии бота и:
+- выдерживает retry_after из TelegramRetryAfter (с джиттером) и повторяет запрос;
+- держит паузу для конкретного чата и, при массовых 429, глобальную паузу;
+- повторяет при сетевых ошибках и 5xx только идемпотентные методы;
+- считает события троттлинга для мониторинга.
+"""
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError,
+    TelegramRetryAfter, TelegramServerError
+)
+from aiogram.methods import GetUpdates, SendChatAction, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from config import config
+from database.db_manager import db
+from utils.logger import logger
+
+# Повтор этих методов не создает дублей у пользователя
+IDEMPOTENT_PREFIXES = ('Get', 'Edit', 'Set', 'Delete', 'Answer')
+
+# Столько 429 за секунду по разным чатам означает глобальный лимит
+GLOBAL_THROTTLE_THRESHOLD = 3
+
+
+def is_idempotent(method: TelegramMethod) -> bool:
+    """Можно ли безопасно повторить запрос, результат которого неизвестен"""
+    return isinstance(method, SendChatAction) or type(method).__name__.startswith(IDEMPOTENT_PREFIXES)
+
+
+def _jitter(delay: float) -> float:
+    return delay + random.uniform(0, 0.1 * delay + 0.25)
+
+
+class RetryMiddleware(BaseRequestMiddleware):
+    """Повторы с учетом retry_after, паузы по чатам и глобальная пауза"""
+
+    def __init__(self, max_retries: int = 3, max_retry_after: float = 30.0):
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self._global_until = 0.0
+        self._chat_until: Dict[Union[int, str], float] = {}
+        self._recent_throttles: Deque[float] = deque()
+        # Метрики
+        self.throttled: Counter = Counter()
+        self.retries = 0
+        self.gave_up = 0
+        self.global_pauses = 0
+
+    async def _wait_backoff(self, chat_id: Optional[Union[int, str]]):
+        now = time.monotonic()
+        until = max(self._global_until, self._chat_until.get(chat_id, 0.0) if chat_id is not None else 0.0)
+        if until > now:
+            await asyncio.sleep(until - now)
+
+    def _on_retry_after(self, method: TelegramMethod, chat_id, retry_after: float) -> float:
+        now = time.monotonic()
+        delay = _jitter(retry_after)
+        self.throttled[type(method).__name__] += 1
+
+        self._recent_throttles.append(now)
+        while self._recent_throttles and now - self._recent_throttles[0] > 1.0:
+            self._recent_throttles.popleft()
+
+        if chat_id is None or len(self._recent_throttles) >= GLOBAL_THROTTLE_THRESHOLD:
+            # Упираемся в общий лимит бота - притормаживаем все отправки
+            if now + delay > self._global_until:
+                self._global_until = now + delay
+                self.global_pauses += 1
+                logger.warning("🚦 Глобальная пауза отправки на %.1f с", delay)
+        else:
+            self._chat_until[chat_id] = now + delay
+
+        # Старые паузы по чатам больше не нужны
+        if len(self._chat_until) > 1000:
+            self._chat_until = {k: v for k, v in self._chat_until.items() if v > now}
+        return delay
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Any:
+        if isinstance(method, GetUpdates):
+            # У polling своя логика повторов
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, 'chat_id', None)
+        attempt = 0
+        while True:
+            await self._wait_backoff(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                # Telegram запрос не выполнил - повтор безопасен для любого метода
+                if attempt >= self.max_retries or e.retry_after > self.max_retry_after:
+                    self.gave_up += 1
+                    raise
+                delay = self._on_retry_after(method, chat_id, e.retry_after)
+                logger.warning("⏳ Flood control на %s (чат %s): ждем %.1f с", type(method).__name__, chat_id, delay)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt >= self.max_retries or not is_idempotent(method):
+                    self.gave_up += 1
+                    raise
+                await asyncio.sleep(_jitter(0.5 * 2 ** attempt))
+                logger.warning("Повтор %s после ошибки: %s", type(method).__name__, e)
+            attempt += 1
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики троттлинга"""
+        return {
+            'throttled': dict(self.throttled),
+            'retries': self.retries,
+            'gave_up': self.gave_up,
+            'global_pauses': self.global_pauses,
+        }
+
+
+def is_unreachable_error(error: Exception) -> bool:
+    """Ошибка означает, что писать пользователю бесполезно"""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and 'chat not found' in error.message.lower()
+
+
+async def safe_send_message(bot: Bot, chat_id: int, text: str, **kwargs) -> bool:
+    """
+    Отправляет сообщение и не бросает исключений для ожидаемых отказов
+    (пользователь заблокировал бота, чат не найден и т.п.).
+    Недоступные пользователи помечаются в БД и исключаются из рассылок.
+
+    Returns:
+        True, если сообщение доставлено
+    """
+    try:
+        await bot.send_message(chat_id, text, **kwargs)
+        return True
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        logger.info("Сообщение пользователю %s не доставлено: %s", chat_id, e.message)
+        if is_unreachable_error(e):
+            try:
+                await db.mark_user_unreachable(chat_id)
+            except Exception as db_error:
+                logger.warning("Не удалось отметить пользователя %s недоступным: %s", chat_id, db_error)
+    except Exception as e:
+        logger.warning("Не удалось отправить сообщение пользователю %s: %s", chat_id, e)
+    return False
+
+
+# Глобальный слой повторов процесса
+retry_middleware = RetryMiddleware(
+    max_retries=config.TELEGRAM_MAX_RETRIES,
+    max_retry_after=config.TELEGRAM_MAX_RETRY_AFTER
+)
@@ -1,6 +1,7 @@
 """
 Форматтеры для красивого отображения сообщений.
 """
+import html
 from typing import List, Dict, Any
 from datetime import datetime
 
@@ -43,11 +44,12 @@ def format_single_review(index: int, rating: int, comment: str, has_media: bool
     """
     stars = '⭐' * rating
     media_icon = "📸 " if has_media else ""
-    author_text = f" от {author_name}" if author_name else ""
+    author_text = f" от {html.escape(author_name)}" if author_name else ""
     
+    # Текст пользователя экранируем: сообщение отправляется с parse_mode=HTML
     return (
         f"<b>Отзыв #{index}{author_text}</b>: {stars}\n"
-        f"{media_icon}<i>{comment}</i>"
+        f"{media_icon}<i>{html.escape(comment)}</i>"
     )
 
 
@@ -142,6 +144,178 @@ def format_admin_stats(stats: Dict[str, Any]) -> str:
     )
 
 
+def format_outbound_stats(stats: Dict[str, Dict[str, Any]], flood: Dict[str, Any] = None) -> str:
+    """
+    Форматирует метрики очереди исходящих сообщений.
+    
+    Args:
+        stats: Метрики по классам приоритета (OutboundScheduler.stats())
+        flood: Метрики flood control (RetryMiddleware.stats())
+        
+    Returns:
+        Отформатированные метрики
+    """
+    names = {
+        'interactive': '💬 Ответы',
+        'transactional': '💳 Транзакции',
+        'notification': '🔔 Уведомления',
+        'bulk': '📢 Рассылки'
+    }
+    lines = [
+        f"{names.get(cls, cls)}: в очереди {s['depth']}, "
+        f"ожидание ср. {s['wait_avg_ms']} мс / макс. {s['wait_max_ms']} мс"
+        for cls, s in stats.items()
+    ]
+    if flood:
+        lines.append(
+            f"🚦 Flood control: {sum(flood['throttled'].values())} раз, "
+            f"повторов {flood['retries']}, отказов {flood['gave_up']}, "
+            f"глобальных пауз {flood['global_pauses']}"
+        )
+    return "📤 <b>Очередь отправки</b>\n\n" + "\n".join(lines)
+
+
+def format_cache_stats(stats: Dict[str, Any], bloom: Dict[str, Any] = None) -> str:
+    """
+    Форматирует метрики кэша карточек номеров.
+    
+    Args:
+        stats: Метрики кэша (PlateCardCache.stats())
+        bloom: Метрики фильтра номеров (PlateFilter.stats())
+        
+    Returns:
+        Отформатированные метрики
+    """
+    text = (
+        f"🗂 <b>Кэш карточек номеров</b>\n\n"
+        f"Заполнен: {stats['size']}/{stats['maxsize']}\n"
+        f"Попаданий: {stats['hits']} ({stats['hit_rate']}%), промахов: {stats['misses']}\n"
+        f"Вытеснено: {stats['evictions']}, устарело: {stats['expirations']}, "
+        f"сброшено записью: {stats['invalidations']}"
+    )
+    if bloom:
+        state = f"{bloom['plates']} номеров, {bloom['size_kb']} КБ" if bloom['ready'] else "строится"
+        text += (
+            f"\n🧮 Фильтр номеров: {state}\n"
+            f"Ответов без БД: {bloom['skipped']}, запросов в БД: {bloom['passed']}"
+        )
+    return text
+
+
+def format_single_flight_stats(stats: Dict[str, Any]) -> str:
+    """
+    Форматирует метрики схлопывания одинаковых запросов к БД.
+    
+    Args:
+        stats: Метрики (DatabaseManager.single_flight_stats())
+        
+    Returns:
+        Отформатированные метрики
+    """
+    text = (
+        f"🛬 <b>Схлопывание запросов</b>\n\n"
+        f"Запросов в БД: {stats['flights']}, присоединилось: {stats['collapsed']}, "
+        f"сейчас в полете: {stats['in_flight']}"
+    )
+    for key, count in stats['top_keys']:
+        text += f"\n• <code>{key}</code>: {count}"
+    return text
+
+
+def format_throttle_stats(stats: Dict[str, Any]) -> str:
+    """
+    Форматирует метрики анти-флуда.
+    
+    Args:
+        stats: Метрики (ThrottlingMiddleware.stats())
+        
+    Returns:
+        Отформатированные метрики
+    """
+    throttled = ", ".join(f"{action}: {count}" for action, count in stats['throttled'].items()) or "нет"
+    return (
+        f"🐢 <b>Анти-флуд</b>\n\n"
+        f"Активных ведер: {stats['buckets']}, удалено простаивающих: {stats['evicted']}\n"
+        f"Отклонено: {throttled}"
+    )
+
+
+def format_slow_queries(queries: List[Dict[str, Any]], stats: Dict[str, Any]) -> str:
+    """
+    Форматирует журнал медленных запросов.
+    
+    Args:
+        queries: Запросы с последним планом (DatabaseManager.get_slow_query_summary())
+        stats: Метрики журнала (SlowQueryLog.stats())
+        
+    Returns:
+        Отформатированный список
+    """
+    by_method = ", ".join(f"{method}: {count}" for method, count in stats['by_method']) or "нет"
+    text = (
+        f"🐌 <b>Медленные запросы</b>\n\n"
+        f"С запуска: {stats['slow']}, снято планов: {stats['explained']}\n"
+        f"По методам: {by_method}\n"
+    )
+    if not queries:
+        return text + "\nСохраненных планов пока нет"
+    
+    for q in queries:
+        scans = f"\n⚠️ Seq Scan: {', '.join(q['seq_scans'])}" if q['seq_scans'] else ""
+        explain = f"{q['explain_ms']:.0f}" if q['explain_ms'] is not None else "?"
+        text += (
+            f"\n<b>{html.escape(q['method'] or '?')}</b> — до {q['max_duration_ms']:.0f} мс "
+            f"(EXPLAIN: {explain} мс), снимков: {q['captures']}{scans}\n"
+            f"<code>{html.escape(q['query'][:150])}</code>\n"
+            f"План: /plan {q['id']}\n"
+        )
+    return text
+
+
+def _format_bytes(size: int) -> str:
+    """Размер в КБ/МБ со знаком"""
+    if abs(size) >= 1024 * 1024:
+        return f"{size / 1024 / 1024:+.1f} МБ"
+    return f"{size / 1024:+.0f} КБ"
+
+
+def format_memory_report(report) -> str:
+    """
+    Форматирует отчет о памяти.
+    
+    Args:
+        report: Снимок памяти (MemoryProfiler.snapshot())
+        
+    Returns:
+        Отформатированный отчет
+    """
+    rss_diff = f" ({report.rss_diff_mb:+.1f} МБ)" if report.rss_diff_mb is not None else ""
+    text = (
+        f"🧠 <b>Память</b> ({report.taken_at:%d.%m %H:%M:%S})\n\n"
+        f"RSS: {report.rss_mb:.1f} МБ{rss_diff}\n"
+        f"tracemalloc: {report.traced_mb:.1f} МБ, пик {report.traced_peak_mb:.1f} МБ\n"
+    )
+    if report.top_growth:
+        text += "\n📈 <b>Рост с прошлого снимка</b>\n"
+        text += "\n".join(
+            f"{_format_bytes(size)} ({count:+d}) <code>{html.escape(location)}</code>"
+            for location, size, count in report.top_growth
+        ) + "\n"
+    text += "\n📦 <b>Больше всего держат</b>\n"
+    text += "\n".join(
+        f"{_format_bytes(size)[1:]} ({count}) <code>{html.escape(location)}</code>"
+        for location, size, count in report.top_allocators
+    ) + "\n"
+    if report.type_growth:
+        title = "Рост объектов по типам" if report.type_growth[0][2] else "Объекты по типам"
+        text += f"\n🔢 <b>{title}</b>\n"
+        text += "\n".join(
+            f"<code>{html.escape(name)}</code>: {count}" + (f" ({delta:+d})" if delta else "")
+            for name, count, delta in report.type_growth
+        )
+    return text
+
+
 def format_car_list(cars: List[Dict[str, Any]]) -> str:
     """
     Форматирует список автомобилей в гараже.
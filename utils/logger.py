@@ -1,53 +1,193 @@
 """
 Модуль для работы с логированием.
-Настраивает структурированное логирование с ротацией файлов.
+
+Обработчики событий не пишут в консоль и файл сами: запись кладется в
+очередь (QueueHandler), а вывод и ротацию файлов выполняет фоновый поток
+QueueListener. Так медленный диск не блокирует event loop.
+
+Форматы (LOG_FORMAT):
+- text - человекочитаемые строки;
+- json - одна JSON-строка на запись с update_id, user_id и handler
+  текущего обновления (берутся из contextvars, см. middlewares/log_context.py).
+
+Сообщения передаются в %-стиле: logger.info("Пользователь %s", user_id) -
+строка собирается, только если уровень включен.
 """
+import atexit
+import json
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Any, Dict, Optional
 from config import config
 
+# Поля контекста, которые попадают в каждую запись
+CONTEXT_FIELDS = ('update_id', 'user_id', 'handler')
+
+# Контекст текущего обновления (у каждой задачи asyncio своя копия)
+_log_context: ContextVar[Dict[str, Any]] = ContextVar('log_context', default={})
+
+
+def bind_log_context(**fields):
+    """
+    Добавляет поля к контексту текущего обновления.
+
+    Returns:
+        Токен для reset_log_context
+    """
+    return _log_context.set({**_log_context.get(), **fields})
+
+
+def reset_log_context(token):
+    """Возвращает контекст, который был до bind_log_context"""
+    _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Переносит контекст обновления в атрибуты записи.
+
+    Работает в потоке event loop, до постановки записи в очередь:
+    фоновый поток контекста задачи уже не видит.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, context.get(field))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Текстовый формат; контекст обновления дописывается, если он есть"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = ' '.join(
+            f"{field}={getattr(record, field)}"
+            for field in CONTEXT_FIELDS
+            if getattr(record, field, None) is not None
+        )
+        return f"{line} | {context}" if context else line
+
+
+def _create_formatter() -> logging.Formatter:
+    if config.LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return TextFormatter(
+        '%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+
+def _create_file_handler(filename: str, formatter: logging.Formatter) -> RotatingFileHandler:
+    log_dir = Path("logs")
+    log_dir.mkdir(exist_ok=True)
+    handler = RotatingFileHandler(
+        log_dir / filename,
+        maxBytes=10 * 1024 * 1024,  # 10 MB
+        backupCount=5,
+        encoding='utf-8',
+        # Файл открывается при первой записи: воркер успевает переключиться на свой
+        delay=True
+    )
+    handler.setFormatter(formatter)
+    return handler
+
+
+# Фоновый поток вывода (один на процесс)
+_listener: Optional[QueueListener] = None
+
+
+def _stop_listener():
+    """Дописывает оставшиеся в очереди записи при выходе"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logger(name: str = "driver_rating_bot") -> logging.Logger:
     """
-    Настраивает и возвращает логгер с форматированием и ротацией файлов.
-    
+    Настраивает и возвращает логгер с фоновым выводом и ротацией файлов.
+
     Args:
         name: Имя логгера
-        
+
     Returns:
         Настроенный логгер
     """
+    global _listener
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, config.LOG_LEVEL))
-    
-    # Формат логов
-    formatter = logging.Formatter(
-        '%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
+
+    formatter = _create_formatter()
+
     # Консольный вывод
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+
     # Файловый вывод с ротацией (макс 10MB, 5 файлов)
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
-    file_handler = RotatingFileHandler(
-        log_dir / config.LOG_FILE,
-        maxBytes=10 * 1024 * 1024,  # 10 MB
-        backupCount=5,
-        encoding='utf-8'
-    )
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
+    file_handler = _create_file_handler(config.LOG_FILE, formatter)
+
+    # В event loop - только постановка в очередь
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
     return logger
 
 
+def use_process_log_file(suffix: str):
+    """
+    Переключает файловый вывод процесса на свой файл: bot.log -> bot.<suffix>.log.
+
+    Для процессов-воркеров: RotatingFileHandler не согласует ротацию между
+    процессами, и общий файл при ротации теряет или перемешивает записи.
+    """
+    global _listener
+    if _listener is None:
+        return
+    path = Path(config.LOG_FILE)
+    handlers = []
+    for handler in _listener.handlers:
+        if isinstance(handler, RotatingFileHandler):
+            handler = _create_file_handler(f"{path.stem}.{suffix}{path.suffix}", handler.formatter)
+        handlers.append(handler)
+    # stop() дописывает накопленные записи старыми обработчиками
+    _listener.stop()
+    for handler in _listener.handlers:
+        if handler not in handlers:
+            handler.close()
+    _listener = QueueListener(_listener.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
 # Глобальный логгер
 logger = setup_logger()
@@ -0,0 +1,126 @@
+"""
+Сторож event loop: находит синхронный код, который блокирует всех.
+
+Задача в event loop просыпается каждые CHECK_INTERVAL и меряет, насколько
+позже положенного ее разбудили (задержка планирования). Отдельный поток
+следит за ее отметками: если отметки нет дольше порога, loop стоит прямо
+сейчас - поток снимает стек потока event loop, пока блокирующий код еще
+выполняется. Когда loop оживает, задержка пишется в метрики, а в лог
+уходит стек и имя обработчика (ближайшая к вершине функция из handlers/).
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional, Tuple
+
+from config import config
+from utils.logger import logger
+from utils.metrics import LOOP_LAG, LOOP_STALLS
+
+CHECK_INTERVAL = 0.1  # секунды
+STACK_LIMIT = 15
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_HANDLERS_DIR = os.path.join(_ROOT, 'handlers') + os.sep
+
+
+def _capture_stack(frame) -> Tuple[str, str]:
+    """Стек (от вершины вниз) и имя обработчика"""
+    summary = traceback.StackSummary.extract(traceback.walk_stack(frame), limit=STACK_LIMIT * 4)
+    handler = '?'
+    for entry in summary:
+        if entry.filename.startswith(_HANDLERS_DIR):
+            handler = entry.name
+            break
+    lines = []
+    for entry in list(summary)[:STACK_LIMIT]:
+        filename = entry.filename
+        if filename.startswith(_ROOT):
+            filename = os.path.relpath(filename, _ROOT)
+        lines.append(f"  {filename}:{entry.lineno} {entry.name}: {entry.line or ''}")
+    return handler, '\n'.join(lines)
+
+
+class LoopWatchdog:
+    """Измерение задержки event loop и стеки блокировок"""
+
+    def __init__(self, threshold_ms: float, interval: float = CHECK_INTERVAL):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self._beat_at = time.monotonic()
+        self._captured: Optional[Tuple[str, str]] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Метрики
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        """Запускает сторож в текущем event loop"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat_at = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    async def _beat(self):
+        """Отметки из event loop и замер задержки"""
+        loop = asyncio.get_running_loop()
+        self._beat_at = time.monotonic()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            # Отметка - до разбора снятого стека: иначе поток успевает
+            # снять стек уже закончившейся блокировки и отнести его к следующей
+            self._beat_at = time.monotonic()
+            lag = max(0.0, loop.time() - started - self.interval)
+            LOOP_LAG.observe(lag)
+            captured, self._captured = self._captured, None
+            if lag >= self.threshold:
+                self._report(lag, captured)
+
+    def _watch(self):
+        """Поток: снимает стек, пока loop заблокирован"""
+        while not self._stop.wait(self.interval / 2):
+            blocked = time.monotonic() - self._beat_at - self.interval
+            if blocked < self.threshold or self._captured is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._captured = _capture_stack(frame)
+                del frame
+
+    def _report(self, lag: float, captured: Optional[Tuple[str, str]]):
+        handler, stack = captured or ('?', '  (стек не снят: блокировка короче интервала проверки)')
+        self.stalls += 1
+        self.max_lag = max(self.max_lag, lag)
+        LOOP_STALLS.inc(handler)
+        logger.warning("🧊 Event loop заблокирован на %.0f мс, обработчик: %s\n%s", lag * 1000, handler, stack)
+
+    def stats(self):
+        return {'stalls': self.stalls, 'max_lag_ms': round(self.max_lag * 1000, 1)}
+
+
+# Глобальный сторож процесса
+loop_watchdog = LoopWatchdog(config.LOOP_LAG_THRESHOLD_MS)
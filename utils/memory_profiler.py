@@ -0,0 +1,223 @@
+"""
+Профилирование памяти: снимки tracemalloc и отчеты о росте.
+
+- snapshot() снимает tracemalloc и счетчики объектов по типам и сравнивает
+  их с предыдущим снимком: где выросло, кто больше всего держит;
+- watch-режим периодически снимает память и присылает админу отчет, если
+  RSS вырос больше порога с момента последнего отчета.
+
+tracemalloc включается при первом снимке (он замедляет выделение памяти)
+и выключается командой админа. Тяжелые подсчеты выполняются в потоке,
+чтобы не держать event loop дольше необходимого.
+"""
+import asyncio
+import gc
+import os
+import resource
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+
+from config import config
+from utils.formatters import format_memory_report
+from utils.logger import logger
+from utils.outbound import outbound_priority, Priority
+
+# Кадров стека на одно выделение: для отчета по файлу и строке хватает одного
+TRACE_FRAMES = 1
+TOP_LIMIT = 10
+
+# Выделения самого профилировщика и импорта модулей не интересны
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+# Корень проекта: пути показываем относительно него
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса, МБ (на Linux; иначе - пиковый)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _location(frame: tracemalloc.Frame) -> str:
+    filename = frame.filename
+    if filename.startswith(_ROOT):
+        filename = os.path.relpath(filename, _ROOT)
+    else:
+        filename = '/'.join(filename.replace('\\', '/').split('/')[-2:])
+    return f"{filename}:{frame.lineno}"
+
+
+def _count_types() -> Counter:
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+@dataclass
+class MemoryReport:
+    """Снимок памяти и разница с предыдущим"""
+    taken_at: datetime
+    rss_mb: float
+    rss_diff_mb: Optional[float]
+    traced_mb: float
+    traced_peak_mb: float
+    # (место, байт, число блоков)
+    top_allocators: List[Tuple[str, int, int]] = field(default_factory=list)
+    # (место, прирост байт, прирост блоков)
+    top_growth: List[Tuple[str, int, int]] = field(default_factory=list)
+    # (тип, объектов, прирост)
+    type_growth: List[Tuple[str, int, int]] = field(default_factory=list)
+
+
+class MemoryProfiler:
+    """Снимки памяти процесса и фоновое наблюдение за ростом"""
+
+    def __init__(self):
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._types: Optional[Counter] = None
+        self._rss: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        self.watch_interval = 0.0
+        self.watch_threshold_mb = 0.0
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    @property
+    def watching(self) -> bool:
+        return self._watch_task is not None and not self._watch_task.done()
+
+    async def snapshot(self) -> MemoryReport:
+        """Снимает память и сравнивает с предыдущим снимком"""
+        async with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACE_FRAMES)
+                logger.info("🧠 tracemalloc включен")
+
+            # Снимок и фильтрация трасс на большом процессе занимают секунды
+            snapshot = await asyncio.to_thread(_take_snapshot)
+            traced, peak = tracemalloc.get_traced_memory()
+            previous, previous_types, previous_rss = self._snapshot, self._types, self._rss
+            types = await asyncio.to_thread(_count_types)
+            rss = rss_mb()
+
+            report = await asyncio.to_thread(
+                self._build_report, snapshot, previous, types, previous_types, rss, previous_rss
+            )
+            report.traced_mb = traced / 1024 / 1024
+            report.traced_peak_mb = peak / 1024 / 1024
+
+            self._snapshot, self._types, self._rss = snapshot, types, rss
+            return report
+
+    @staticmethod
+    def _build_report(snapshot, previous, types, previous_types, rss, previous_rss) -> MemoryReport:
+        report = MemoryReport(
+            taken_at=datetime.now(),
+            rss_mb=rss,
+            rss_diff_mb=rss - previous_rss if previous_rss is not None else None,
+            traced_mb=0.0,
+            traced_peak_mb=0.0
+        )
+        for stat in snapshot.statistics('lineno')[:TOP_LIMIT]:
+            report.top_allocators.append((_location(stat.traceback[0]), stat.size, stat.count))
+
+        if previous is not None:
+            growth = [s for s in snapshot.compare_to(previous, 'lineno') if s.size_diff > 0]
+            for stat in growth[:TOP_LIMIT]:
+                report.top_growth.append((_location(stat.traceback[0]), stat.size_diff, stat.count_diff))
+
+        if previous_types is not None:
+            diff = Counter(types)
+            diff.subtract(previous_types)
+            for name, delta in diff.most_common(TOP_LIMIT):
+                if delta <= 0:
+                    break
+                report.type_growth.append((name, types[name], delta))
+        else:
+            for name, count in types.most_common(TOP_LIMIT):
+                report.type_growth.append((name, count, 0))
+        return report
+
+    def stop_tracing(self):
+        """Выключает tracemalloc и забывает снимки"""
+        if self.watching:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("🧠 tracemalloc выключен")
+        self._snapshot = self._types = self._rss = None
+
+    # --- НАБЛЮДЕНИЕ ---
+
+    def start_watch(self, bot: Bot, interval: float, threshold_mb: float):
+        """Периодические снимки с отчетом админу при росте RSS больше порога"""
+        if self.watching:
+            self._watch_task.cancel()
+        self.watch_interval = interval
+        self.watch_threshold_mb = threshold_mb
+        self._watch_task = asyncio.create_task(self._watch(bot))
+
+    async def stop_watch(self):
+        if self.watching:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+        self._watch_task = None
+
+    async def _watch(self, bot: Bot):
+        logger.info(
+            "🧠 Наблюдение за памятью: раз в %s с, порог %s МБ",
+            self.watch_interval, self.watch_threshold_mb
+        )
+        try:
+            baseline = (await self.snapshot()).rss_mb
+        except Exception as e:
+            logger.error("Ошибка снимка памяти: %s", e)
+            baseline = rss_mb()
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                report = await self.snapshot()
+            except Exception as e:
+                logger.error("Ошибка снимка памяти: %s", e)
+                continue
+            growth = report.rss_mb - baseline
+            if growth < self.watch_threshold_mb:
+                continue
+            logger.warning("🧠 Память выросла на %.1f МБ (RSS %.1f МБ)", growth, report.rss_mb)
+            baseline = report.rss_mb
+            try:
+                with outbound_priority(Priority.TRANSACTIONAL):
+                    await bot.send_message(
+                        config.ADMIN_ID,
+                        f"⚠️ <b>Память выросла на {growth:.1f} МБ</b>\n\n" + format_memory_report(report),
+                        parse_mode="HTML"
+                    )
+            except Exception as e:
+                logger.warning("Не удалось отправить отчет о памяти: %s", e)
+
+
+# Глобальный профилировщик процесса
+memory_profiler = MemoryProfiler()
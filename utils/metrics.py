@@ -0,0 +1,219 @@
+"""
+Метрики в текстовом формате Prometheus.
+
+Без внешних зависимостей: счетчики и гистограммы - это словари в памяти
+процесса, обновляются из event loop за O(1) (гистограмма - bisect по
+границам корзин). Гейджи не хранят значений, а вызывают функцию при
+каждом снятии метрик, поэтому существующие stats() подключаются как есть.
+
+Эндпоинт /metrics поднимается отдельным aiohttp-сервером (METRICS_ENABLED,
+METRICS_PORT), см. start_metrics_server.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from aiohttp import web
+
+from utils.logger import logger
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы корзин по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+GaugeValue = Union[float, Dict[Labels, float]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонно растущий счетчик"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счетчики корзин (+Inf последняя), сумма, количество]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = []
+        bounds = self.buckets + (float('inf'),)
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Gauge:
+    """Значение, которое вычисляется в момент снятия метрик"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = (),
+                 callback: Optional[Callable[[], GaugeValue]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        if self.callback is None:
+            return []
+        value = self.callback()
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in value.items()
+        ]
+
+
+class MetricsRegistry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Histogram, Gauge]] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Labels = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], GaugeValue],
+              labelnames: Labels = ()) -> Gauge:
+        """Регистрирует (или заменяет) гейдж с функцией-источником"""
+        gauge = Gauge(name, documentation, labelnames, callback)
+        self._metrics[name] = gauge
+        return gauge
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.collect()
+            except Exception as e:
+                logger.warning("Не удалось снять метрику %s: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+# Глобальный реестр процесса
+registry = MetricsRegistry()
+
+# --- МЕТРИКИ ---
+
+HANDLER_LATENCY = registry.histogram(
+    'bot_handler_duration_seconds', 'Время работы обработчика', ('handler',)
+)
+HANDLER_ERRORS = registry.counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках', ('handler', 'error')
+)
+DB_LATENCY = registry.histogram(
+    'bot_db_query_duration_seconds', 'Время выполнения метода DatabaseManager', ('method',)
+)
+DB_ERRORS = registry.counter(
+    'bot_db_errors_total', 'Исключения в методах DatabaseManager', ('method', 'error')
+)
+DB_POOL_WAIT = registry.histogram(
+    'bot_db_pool_acquire_seconds', 'Ожидание свободного соединения в пуле'
+)
+API_LATENCY = registry.histogram(
+    'bot_telegram_api_duration_seconds', 'Время запроса к Bot API', ('method',)
+)
+API_ERRORS = registry.counter(
+    'bot_telegram_api_errors_total', 'Ошибки запросов к Bot API', ('method', 'error')
+)
+
+LOOP_LAG = registry.histogram(
+    'bot_event_loop_lag_seconds', 'Задержка планирования event loop',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_STALLS = registry.counter(
+    'bot_event_loop_stalls_total', 'Блокировки event loop дольше порога', ('handler',)
+)
+
+
+# --- HTTP ЭНДПОИНТ ---
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=registry.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднимает /metrics на отдельном порту"""
+    app = web.Application()
+    app.router.add_get('/metrics', _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("📈 Метрики доступны на %s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,165 @@
+"""
+Приоритетный планировщик исходящих запросов к Telegram Bot API.
+
+Все отправки делят один лимит Telegram (~30 сообщений в секунду). Планировщик
+выдает "токены" на отправку строго по приоритету: пока ждут интерактивные
+ответы, рассылка не получает ни одного токена.
+
+Приоритет задается контекстом вызывающего кода:
+
+    with outbound_priority(Priority.BULK):
+        await bot.send_message(user_id, text)
+
+По умолчанию все отправки считаются интерактивными.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Deque, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import (
+    AnswerCallbackQuery, DeleteWebhook, GetMe, GetUpdates, GetWebhookInfo, SetWebhook, TelegramMethod
+)
+from aiogram.methods.base import TelegramType
+
+from config import config
+
+
+class Priority(IntEnum):
+    """Классы приоритета: меньше значение - выше приоритет"""
+    INTERACTIVE = 0     # ответы на действия пользователя
+    TRANSACTIONAL = 1   # платежи, уведомления админа
+    NOTIFICATION = 2    # уведомления подписчикам
+    BULK = 3            # рассылки
+
+
+_current_priority: ContextVar[Priority] = ContextVar('outbound_priority', default=Priority.INTERACTIVE)
+
+# Служебные методы не расходуют лимит отправки сообщений
+EXEMPT_METHODS = (GetUpdates, GetMe, SetWebhook, DeleteWebhook, GetWebhookInfo, AnswerCallbackQuery)
+
+
+@contextmanager
+def outbound_priority(priority: Priority):
+    """Задает приоритет всех отправок внутри блока"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class _ClassStats:
+    """Метрики одного класса приоритета"""
+
+    def __init__(self):
+        self.granted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, waited: float):
+        self.granted += 1
+        self.wait_total += waited
+        if waited > self.wait_max:
+            self.wait_max = waited
+
+
+class OutboundScheduler:
+    """Token bucket с очередями по приоритетам"""
+
+    def __init__(self, rate: float = 25.0, burst: int = 5):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._queues: Dict[Priority, Deque[asyncio.Future]] = {p: deque() for p in Priority}
+        self._stats: Dict[Priority, _ClassStats] = {p: _ClassStats() for p in Priority}
+        self._pump: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _has_waiters(self, up_to: Priority) -> bool:
+        return any(self._queues[p] for p in Priority if p <= up_to)
+
+    async def acquire(self, priority: Priority):
+        """Ждет разрешения на одну отправку"""
+        self._refill()
+        if self._tokens >= 1 and not self._has_waiters(priority):
+            self._tokens -= 1
+            self._stats[priority].record(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued = time.monotonic()
+        self._queues[priority].append(future)
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run_pump())
+
+        await future
+        self._stats[priority].record(time.monotonic() - enqueued)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        """Самый старый ожидающий из самого приоритетного непустого класса"""
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue:
+                future = queue.popleft()
+                if not future.done():  # отмененные ожидания пропускаем
+                    return future
+        return None
+
+    async def _run_pump(self):
+        while self._has_waiters(Priority.BULK):
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            future = self._next_waiter()
+            if future is None:
+                break
+            self._tokens -= 1
+            future.set_result(None)
+            # Даем получателю токена выполнить запрос до выдачи следующего
+            await asyncio.sleep(0)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Глубина очереди и время ожидания по классам"""
+        result = {}
+        for priority in Priority:
+            s = self._stats[priority]
+            result[priority.name.lower()] = {
+                'depth': sum(1 for f in self._queues[priority] if not f.done()),
+                'granted': s.granted,
+                'wait_avg_ms': round(s.wait_total / s.granted * 1000, 1) if s.granted else 0.0,
+                'wait_max_ms': round(s.wait_max * 1000, 1),
+            }
+        return result
+
+
+class OutboundSchedulerMiddleware(BaseRequestMiddleware):
+    """Пропускает каждый запрос бота через планировщик"""
+
+    def __init__(self, scheduler: OutboundScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Any:
+        if not isinstance(method, EXEMPT_METHODS):
+            await self.scheduler.acquire(_current_priority.get())
+        return await make_request(bot, method)
+
+
+# Глобальный планировщик процесса
+outbound = OutboundScheduler(rate=config.OUTBOUND_RATE, burst=config.OUTBOUND_BURST)
@@ -0,0 +1,190 @@
+"""
+LRU-кэш готовых карточек номера.
+
+Карточка - это все, что бот показывает по номеру: заголовок, подписи отзывов
+с медиа и клавиатуры. Популярные номера ищут постоянно, поэтому повторный
+поиск отдается из памяти без запросов к БД и без повторного форматирования.
+
+Запись в кэше привязана к версии номера. create_review, delete_reviews_by_plate
+и set_car_reaction повышают версию - старая карточка перестает отдаваться,
+даже если ее загрузка шла параллельно с изменением. TTL ограничивает
+устаревание между процессами и репликами, которые не видят чужих изменений.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from config import config
+from keyboards.inline_keyboards import get_location_map_keyboard, get_reaction_keyboard
+from utils.formatters import format_review_header, format_single_review
+
+
+@dataclass
+class ReviewCard:
+    """Один отзыв, готовый к отправке"""
+    caption: str
+    photo_id: Optional[str] = None
+    video_id: Optional[str] = None
+    keyboard: Optional[InlineKeyboardMarkup] = None
+
+
+@dataclass
+class PlateCard:
+    """Карточка номера со всеми отзывами"""
+    plate: str
+    region: str
+    header: str
+    review_count: int
+    likes: int
+    dislikes: int
+    reviews: List[ReviewCard]
+    # Клавиатуры реакций по голосу пользователя (None / 'like' / 'dislike')
+    _reaction_keyboards: Dict[Optional[str], InlineKeyboardMarkup] = field(default_factory=dict, repr=False)
+
+    @property
+    def reactions_line(self) -> str:
+        return f"🤝 Красавчик: {self.likes}  |  🖕 Мудак: {self.dislikes}"
+
+    def reaction_keyboard(self, user_vote: Optional[str]) -> InlineKeyboardMarkup:
+        """Клавиатура реакций с отметкой голоса пользователя"""
+        keyboard = self._reaction_keyboards.get(user_vote)
+        if keyboard is None:
+            keyboard = get_reaction_keyboard(self.plate, self.likes, self.dislikes, user_vote)
+            self._reaction_keyboards[user_vote] = keyboard
+        return keyboard
+
+
+def build_plate_card(
+    plate: str,
+    reviews: List[Dict[str, Any]],
+    stats: Dict[str, Any],
+    reactions: Dict[str, int]
+) -> PlateCard:
+    """Форматирует карточку из данных БД"""
+    region = config.get_region_name(plate)
+    review_cards = []
+    for i, review in enumerate(reviews, 1):
+        has_media = bool(review['photo_id'] or review['video_id'])
+        author_name = review.get('author_name') or review.get('author_username') or 'Аноним'
+        keyboard = None
+        if review['latitude'] and review['longitude']:
+            keyboard = get_location_map_keyboard(review['latitude'], review['longitude'])
+        review_cards.append(ReviewCard(
+            caption=format_single_review(i, review['rating'], review['comment'], has_media, author_name),
+            photo_id=review['photo_id'],
+            video_id=review['video_id'],
+            keyboard=keyboard
+        ))
+
+    review_count = stats['review_count'] or 0
+    header = format_review_header(plate, region, stats['avg_rating'], review_count) if reviews else ""
+    return PlateCard(
+        plate=plate,
+        region=region,
+        header=header,
+        review_count=review_count,
+        likes=reactions['likes'],
+        dislikes=reactions['dislikes'],
+        reviews=review_cards
+    )
+
+
+class PlateCardCache:
+    """Ограниченный LRU-кэш карточек с версиями номеров и TTL"""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # plate -> (версия, время загрузки, карточка)
+        self._cards: "OrderedDict[str, Tuple[int, float, PlateCard]]" = OrderedDict()
+        # Версии изменявшихся номеров; у остальных версия равна _floor
+        self._versions: Dict[str, int] = {}
+        self._clock = 0
+        self._floor = 0
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def version(self, plate: str) -> int:
+        return self._versions.get(plate, self._floor)
+
+    def bump(self, plate: str):
+        """Помечает карточку номера устаревшей"""
+        self._clock += 1
+        self._versions[plate] = self._clock
+        if self._cards.pop(plate, None) is not None:
+            self.invalidations += 1
+
+        # Версии копятся по всем изменявшимся номерам - периодически сбрасываем.
+        # Новый _floor больше любой выданной версии, поэтому загрузки,
+        # начатые до сброса, не попадут в кэш.
+        if len(self._versions) > self.maxsize * 4:
+            self._clock += 1
+            self._floor = self._clock
+            self._versions.clear()
+            self.invalidations += len(self._cards)
+            self._cards.clear()
+
+    def get(self, plate: str) -> Optional[PlateCard]:
+        entry = self._cards.get(plate)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        version, loaded_at, card = entry
+        if version != self.version(plate) or time.monotonic() - loaded_at > self.ttl:
+            del self._cards[plate]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._cards.move_to_end(plate)
+        self.hits += 1
+        return card
+
+    def put(self, plate: str, version: int, card: PlateCard):
+        """Сохраняет карточку, если номер не менялся с начала ее загрузки"""
+        if self.maxsize <= 0 or version != self.version(plate):
+            return
+        self._cards[plate] = (version, time.monotonic(), card)
+        self._cards.move_to_end(plate)
+        while len(self._cards) > self.maxsize:
+            self._cards.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, plate: str, loader: Callable[[str], Awaitable[PlateCard]]) -> PlateCard:
+        """Карточка из кэша или свежая через loader"""
+        card = self.get(plate)
+        if card is not None:
+            return card
+        version = self.version(plate)
+        card = await loader(plate)
+        self.put(plate, version, card)
+        return card
+
+    def clear(self):
+        self._cards.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики кэша"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._cards),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+# Глобальный кэш карточек процесса
+plate_cache = PlateCardCache(maxsize=config.PLATE_CACHE_SIZE, ttl=config.PLATE_CACHE_TTL)
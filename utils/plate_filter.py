@@ -0,0 +1,184 @@
+"""
+Фильтр Блума номеров, по которым есть отзывы.
+
+Большинство поисков - по номерам без единого отзыва. Если фильтр говорит
+"номера точно нет", обработчик отвечает "пока нет отзывов", не занимая
+соединение из пула. Ответ "возможно есть" (в т.ч. ложноположительный)
+просто ведет к обычному запросу в БД.
+
+- при старте фильтр строится потоковым сканированием DISTINCT plate;
+- create_review сразу добавляет номер в фильтр своего процесса;
+- каждые PLATE_FILTER_REFRESH секунд подтягиваются новые отзывы по id
+  (их мог создать другой воркер или реплика);
+- раз в PLATE_FILTER_REBUILD секунд фильтр строится заново и атомарно
+  подменяется - так уходят номера, все отзывы которых удалены.
+
+Пока фильтр не построен, он отвечает "возможно есть" на любой номер.
+"""
+import asyncio
+import hashlib
+import math
+from typing import Any, Dict, Optional
+
+from config import config
+from utils.logger import logger
+
+# Новые отзывы подтягиваются с перекрытием: id из последовательности могут
+# фиксироваться не по порядку
+REFRESH_OVERLAP = 100
+
+
+class BloomFilter:
+    """Битовый массив + k хешей (double hashing поверх blake2b)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1000)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        added = False
+        for pos in self._positions(key):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not self._bits[byte] & bit:
+                self._bits[byte] |= bit
+                added = True
+        # Повторное добавление того же ключа счетчик не увеличивает
+        if added:
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class PlateFilter:
+    """Фильтр номеров с отзывами с фоновым обновлением"""
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.01,
+                 refresh_interval: int = 10, rebuild_interval: int = 3600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._filter: Optional[BloomFilter] = None
+        self._last_id = 0
+        # Номера, добавленные во время перестройки, переносятся в новый фильтр
+        self._pending: Optional[set] = None
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+        # Метрики
+        self.skipped = 0
+        self.passed = 0
+        self.rebuilds = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def might_have_reviews(self, plate: str) -> bool:
+        """False - отзывов по номеру точно нет"""
+        if self._filter is None or plate in self._filter:
+            self.passed += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def add(self, plate: str):
+        if self._filter is not None:
+            self._filter.add(plate)
+        if self._pending is not None:
+            self._pending.add(plate)
+
+    async def rebuild(self):
+        """Строит новый фильтр по БД и подменяет текущий"""
+        db = self._db
+        self._pending = set()
+        try:
+            last_id = await db.get_reviews_max_id()
+            estimate = await db.estimate_review_count()
+            new_filter = BloomFilter(max(self.capacity, int(estimate * 1.2)), self.error_rate)
+            async for plate in db.iter_reviewed_plates():
+                new_filter.add(plate)
+            for plate in self._pending:
+                new_filter.add(plate)
+        finally:
+            self._pending = None
+
+        self._filter = new_filter
+        self._last_id = last_id
+        self.rebuilds += 1
+        logger.info(
+            "🧮 Фильтр номеров построен: %s номеров, %s КБ, %s хешей",
+            new_filter.count, new_filter.size // 8 // 1024, new_filter.hashes
+        )
+
+    async def refresh(self):
+        """Добавляет номера отзывов, созданных после последней проверки"""
+        if self._filter is None:
+            return
+        rows = await self._db.get_reviewed_plates_after(max(0, self._last_id - REFRESH_OVERLAP))
+        for row in rows:
+            self._filter.add(row['plate'])
+            if row['id'] > self._last_id:
+                self._last_id = row['id']
+
+    async def _run(self):
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error("Ошибка построения фильтра номеров: %s", e)
+
+            elapsed = 0
+            while elapsed < self.rebuild_interval:
+                await asyncio.sleep(self.refresh_interval)
+                elapsed += self.refresh_interval
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.warning("Ошибка обновления фильтра номеров: %s", e)
+
+    def start(self, db):
+        """Запускает построение и обновление фильтра в фоне"""
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики фильтра"""
+        f = self._filter
+        return {
+            'ready': f is not None,
+            'plates': f.count if f else 0,
+            'size_kb': f.size // 8 // 1024 if f else 0,
+            'skipped': self.skipped,
+            'passed': self.passed,
+            'rebuilds': self.rebuilds,
+        }
+
+
+# Глобальный фильтр процесса
+plate_filter = PlateFilter(
+    capacity=config.PLATE_FILTER_CAPACITY,
+    refresh_interval=config.PLATE_FILTER_REFRESH,
+    rebuild_interval=config.PLATE_FILTER_REBUILD
+)
@@ -0,0 +1,128 @@
+"""
+Семплирующий CPU-профилировщик для работающего бота.
+
+Фоновый поток раз в SAMPLE_INTERVAL снимает стек потока event loop
+(sys._current_frames) и считает одинаковые стеки. Сам event loop никто не
+трогает: профилировщик не вставляет хуков в вызовы функций, поэтому его
+можно включать на живом трафике - цена ~100 снимков стека в секунду.
+
+Результат - collapsed stacks ("корень;...;лист число"), формат, который
+понимают flamegraph.pl, speedscope и inferno.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import logger
+
+SAMPLE_INTERVAL = 0.01  # секунды
+MAX_DURATION = 300       # секунды
+MAX_DEPTH = 128
+
+# Корень проекта: пути в стеках показываем относительно него
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_ROOT):
+        filename = os.path.relpath(filename, _ROOT)
+    else:
+        # Библиотеки: достаточно пути от site-packages / lib
+        parts = filename.replace('\\', '/').split('/')
+        filename = '/'.join(parts[-2:])
+    return f"{filename}:{code.co_name}:{code.co_firstlineno}"
+
+
+class ProfileResult:
+    """Снятые стеки"""
+
+    def __init__(self, stacks: Counter, samples: int, duration: float):
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+
+    def collapsed(self) -> str:
+        """Collapsed stacks для flamegraph"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, n: int = 10) -> List[Tuple[str, int]]:
+        """Функции, на которых поток стоял чаще всего (собственное время)"""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(n)
+
+
+class SamplingProfiler:
+    """Профилировщик потока event loop; одновременно идет только один сеанс"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self._running = False
+        # Кэш подписей кадров: код-объекты живут весь процесс
+        self._labels: Dict[object, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _sample_loop(self, thread_id: int, stop: threading.Event, stacks: Counter) -> int:
+        samples = 0
+        labels = self._labels
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            names = []
+            while frame is not None and len(names) < MAX_DEPTH:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                names.append(label)
+                frame = frame.f_back
+            del frame
+            names.reverse()
+            stacks[';'.join(names)] += 1
+            samples += 1
+        return samples
+
+    async def profile(self, seconds: float) -> Optional[ProfileResult]:
+        """
+        Профилирует текущий event loop заданное время.
+
+        Returns:
+            Результат или None, если профилирование уже идет
+        """
+        if self._running:
+            return None
+        self._running = True
+        seconds = min(seconds, MAX_DURATION)
+        stacks: Counter = Counter()
+        stop = threading.Event()
+        result = {}
+
+        def worker():
+            result['samples'] = self._sample_loop(loop_thread, stop, stacks)
+
+        loop_thread = threading.get_ident()
+        thread = threading.Thread(target=worker, name='cpu-profiler', daemon=True)
+        started = time.monotonic()
+        logger.info("🔬 CPU-профилирование на %s с", seconds)
+        try:
+            thread.start()
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(thread.join)
+            self._running = False
+        return ProfileResult(stacks, result.get('samples', 0), time.monotonic() - started)
+
+
+# Глобальный профилировщик процесса
+cpu_profiler = SamplingProfiler()
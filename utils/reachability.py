@@ -0,0 +1,74 @@
+"""
+Фоновая перепроверка недоступных пользователей.
+
+Пользователи, заблокировавшие бота, исключаются из рассылок и уведомлений.
+Раз в интервал небольшая пачка таких пользователей проверяется через
+getChat: пользователь ничего не видит (sendChatAction показал бы
+"печатает..." без сообщения), а заблокировавшим бота Telegram отвечает
+Forbidden. Если бот снова доступен, отметка снимается.
+"""
+import asyncio
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+from database.db_manager import db
+from utils.flood_control import is_unreachable_error
+from utils.logger import logger
+from utils.outbound import outbound_priority, Priority
+
+
+class ReachabilityProber:
+    """Медленная перепроверка пользователей с отметкой unreachable_since"""
+
+    def __init__(self, bot: Bot, interval: int = 60, batch: int = 20, recheck_hours: int = 24):
+        self.bot = bot
+        self.interval = interval
+        self.batch = batch
+        self.recheck_hours = recheck_hours
+        self._task: Optional[asyncio.Task] = None
+
+    async def probe_batch(self) -> int:
+        """Проверяет одну пачку, возвращает число вернувшихся пользователей"""
+        user_ids = await db.get_users_to_reprobe(self.batch, self.recheck_hours)
+        if not user_ids:
+            return 0
+
+        revived = 0
+        with outbound_priority(Priority.BULK):
+            for user_id in user_ids:
+                try:
+                    await self.bot.get_chat(user_id)
+                except TelegramAPIError as e:
+                    if not is_unreachable_error(e):
+                        logger.warning("Проверка доступности %s не удалась: %s", user_id, e)
+                    continue
+                await db.mark_user_reachable(user_id)
+                revived += 1
+
+        await db.touch_reachability_check(user_ids)
+        if revived:
+            logger.info("🔁 Снова доступны %s из %s пользователей", revived, len(user_ids))
+        return revived
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.probe_batch()
+            except Exception as e:
+                logger.error("Ошибка перепроверки доступности: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
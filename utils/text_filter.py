@@ -0,0 +1,254 @@
+"""
+Маскировка нецензурной лексики и персональных данных в отзывах.
+
+Нецензурные слова на казахском, русском и английском собираются в автомат
+Ахо-Корасик и ищутся за один линейный проход по тексту, сколько бы записей
+ни было в словаре, - вместо отдельного регулярного выражения на каждую.
+Телефоны и ИИН ищутся одним общим регулярным выражением.
+
+Список слов лежит в PROFANITY_FILE и перечитывается при изменении файла:
+mtime проверяется не чаще раза в RELOAD_CHECK_INTERVAL секунд.
+"""
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+from utils.logger import logger
+
+RELOAD_CHECK_INTERVAL = 5.0
+
+# Латинские двойники кириллицы и ё -> е
+_LOOKALIKES = {
+    'а': 'a', 'е': 'eё', 'о': 'o', 'р': 'p', 'с': 'c', 'у': 'y', 'х': 'x',
+    'в': 'b', 'к': 'k', 'м': 'm', 'н': 'h', 'т': 't',
+}
+_FOLD = str.maketrans({variant: base for base, variants in _LOOKALIKES.items() for variant in variants})
+
+# Режимы записей словаря
+PREFIX, ANYWHERE, WORD = 'prefix', 'any', 'word'
+
+# Участки текста, где вообще может быть телефон или ИИН: быстрый отсев
+PII_CANDIDATE = re.compile(r'[+(\d][\d\s\-()+]{9,}')
+_PHONE = r'(?<!\d)(?:(?:\+\s?7|8)[\s\-]*)?\(?7\d{2}\)?[\s\-]*\d{3}[\s\-]*\d{2}[\s\-]*\d{2}(?!\d)'
+_IIN = r'(?<!\d)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{6}(?!\d)'
+PII_PATTERN = re.compile(f'(?P<phone>{_PHONE})|(?P<iin>{_IIN})')
+PII_REPLACEMENTS = {
+    'phone': '[телефон скрыт]',
+    'iin': '[ИИН скрыт]',
+}
+
+
+def mask_pii(text: str) -> Tuple[str, int]:
+    """Заменяет телефоны и ИИН заглушками; возвращает текст и число замен"""
+    count = 0
+
+    def replace(match: re.Match) -> str:
+        nonlocal count
+        count += 1
+        return PII_REPLACEMENTS[match.lastgroup]
+
+    if PII_CANDIDATE.search(text):
+        text = PII_CANDIDATE.sub(lambda m: PII_PATTERN.sub(replace, m.group()), text)
+    return text, count
+
+
+def fold(text: str) -> str:
+    """Нижний регистр и замена двойников (для записей словаря)"""
+    return text.lower().translate(_FOLD)
+
+
+def _variants(ch: str) -> set:
+    """Все написания символа, которые автомат считает одинаковыми"""
+    result = {ch}
+    for variant in _LOOKALIKES.get(ch, ''):
+        result.add(variant)
+    for variant in list(result):
+        upper = variant.upper()
+        if len(upper) == 1:
+            result.add(upper)
+    return result
+
+
+class AhoCorasick:
+    """
+    Автомат для поиска всех вхождений множества строк за один проход.
+    
+    Регистр и двойники вшиты в переходы автомата, поэтому текст не нужно
+    предварительно переводить в нижний регистр, а позиции совпадений
+    соответствуют исходной строке.
+    """
+
+    def __init__(self, patterns: List[Tuple[str, str]]):
+        # Узел: переходы, суффиксная ссылка, выходы (длина, режим)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]
+
+        for word, mode in patterns:
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(word), mode))
+
+        # Суффиксные ссылки обходом в ширину
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        # Переходы по всем написаниям символа
+        for edges in self._goto:
+            for ch, nxt in list(edges.items()):
+                for variant in _variants(ch):
+                    edges.setdefault(variant, nxt)
+
+    @property
+    def size(self) -> int:
+        return len(self._goto)
+
+    def iter_matches(self, text: str):
+        """Выдает (начало, конец, режим) для каждого вхождения"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            nxt = goto[node].get(ch)
+            while nxt is None and node:
+                node = fail[node]
+                nxt = goto[node].get(ch)
+            node = nxt or 0
+            if out[node]:
+                for length, mode in out[node]:
+                    yield i - length + 1, i + 1, mode
+
+
+@dataclass
+class FilterResult:
+    """Результат фильтрации"""
+    text: str
+    profanity: int = 0
+    pii: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.profanity or self.pii)
+
+
+def parse_wordlist(lines) -> List[Tuple[str, str]]:
+    """Разбирает словарь: 'корень', '*корень', '=слово'"""
+    patterns = []
+    for line in lines:
+        entry = line.strip()
+        if not entry or entry.startswith('#'):
+            continue
+        mode = PREFIX
+        if entry[0] == '*':
+            mode, entry = ANYWHERE, entry[1:]
+        elif entry[0] == '=':
+            mode, entry = WORD, entry[1:]
+        if entry:
+            patterns.append((fold(entry), mode))
+    return patterns
+
+
+class TextFilter:
+    """Маскировка мата и персональных данных с горячей перезагрузкой словаря"""
+
+    def __init__(self, path: str, reload_interval: float = RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._automaton: Optional[AhoCorasick] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.patterns = 0
+        self.reloads = 0
+
+    def load(self):
+        """Перечитывает словарь и пересобирает автомат"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding='utf-8') as f:
+                patterns = parse_wordlist(f)
+        except OSError as e:
+            if self._automaton is None:
+                logger.warning("Словарь нецензурных слов недоступен (%s): %s", self.path, e)
+            return
+
+        self._automaton = AhoCorasick(patterns)
+        self._mtime = mtime
+        self.patterns = len(patterns)
+        self.reloads += 1
+        logger.info("🧹 Словарь фильтра загружен: %s записей, %s узлов", len(patterns), self._automaton.size)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self.load()
+
+    def _profanity_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Границы слов, которые нужно замаскировать"""
+        if self._automaton is None:
+            return []
+        n = len(text)
+        spans = []
+        for start, end, mode in self._automaton.iter_matches(text):
+            at_word_start = start == 0 or not text[start - 1].isalnum()
+            if mode == PREFIX and not at_word_start:
+                continue
+            if mode == WORD and not (at_word_start and (end == n or not text[end].isalnum())):
+                continue
+            # Маскируем слово целиком
+            while start > 0 and text[start - 1].isalnum():
+                start -= 1
+            while end < n and text[end].isalnum():
+                end += 1
+            spans.append((start, end))
+        return spans
+
+    def mask(self, text: str) -> FilterResult:
+        """Возвращает текст с замаскированными матом, телефонами и ИИН"""
+        self._maybe_reload()
+
+        text, pii = mask_pii(text)
+
+        spans = self._profanity_spans(text)
+        if not spans:
+            return FilterResult(text, 0, pii)
+
+        chars = list(text)
+        masked_words = set()
+        for start, end in spans:
+            if (start, end) in masked_words:
+                continue
+            masked_words.add((start, end))
+            # Первую букву оставляем, чтобы текст читался
+            for i in range(start + 1, end):
+                chars[i] = '*'
+        return FilterResult(''.join(chars), len(masked_words), pii)
+
+
+# Глобальный фильтр процесса
+text_filter = TextFilter(config.PROFANITY_FILE)
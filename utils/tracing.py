@@ -0,0 +1,292 @@
+"""
+Трассировка обработки обновлений.
+
+На каждое обновление открывается корневой span, внутри него - дочерние:
+обработчик, каждый вызов DatabaseManager и каждый запрос к Bot API.
+Текущий span хранится в contextvars, поэтому код обработчиков ничего не
+передает явно.
+
+Выборка:
+- TRACE_SAMPLE_RATE - доля обновлений, трассы которых пишутся всегда;
+- TRACE_SLOW_MS - остальные обновления тоже записываются в память, но
+  сохраняются, только если обработка заняла дольше порога или упала
+  (0 - не записывать невыбранные обновления совсем).
+
+Готовые трассы сериализуются и пишутся фоновым потоком в ротируемый файл
+logs/TRACE_FILE - по одной строке на трассу в JSON-формате OTLP
+(resourceSpans/scopeSpans/spans), который понимают коллектор
+OpenTelemetry и Jaeger.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import config
+from utils.logger import logger
+
+SERVICE_NAME = 'driver-rating-bot'
+
+# Виды span в OTLP
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+# Рассылка из одного обновления может отправить тысячи сообщений
+MAX_SPANS_PER_TRACE = 256
+
+TRACE_FILE_MAX_BYTES = 50 * 1024 * 1024
+TRACE_FILE_BACKUPS = 3
+
+
+class Span:
+    """Один замер внутри трассы"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'status_message', '_token')
+
+    def __init__(self, trace: '_Trace', name: str, kind: int, parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.status_message = ''
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.status = STATUS_ERROR
+            self.status_message = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+
+
+class _Trace:
+    """Span одного обновления"""
+
+    __slots__ = ('trace_id', 'spans', 'sampled', 'closed', 'dropped')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.sampled = sampled
+        self.closed = False
+        self.dropped = 0
+
+
+class _NoopSpan:
+    """Заглушка, когда обновление не трассируется"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+class _RootSpan(Span):
+    """Корневой span: по выходу решает, сохранять ли трассу"""
+
+    __slots__ = ('tracer',)
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        self.trace.closed = True
+        self.tracer._finish(self)
+
+
+class Tracer:
+    """Создание span и решение о выборке"""
+
+    def __init__(self, enabled: bool, sample_rate: float, slow_ms: float, path: Path):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_ns = int(slow_ms * 1_000_000)
+        self.path = path
+        self._exporter: Optional[TraceExporter] = None
+        # Метрики
+        self.started = 0
+        self.exported = 0
+
+    def start_trace(self, name: str, **attributes) -> Span:
+        """Корневой span обновления (или заглушка, если трасса не пишется)"""
+        if not self.enabled:
+            return NOOP_SPAN
+        sampled = random.random() < self.sample_rate
+        if not sampled and not self.slow_ns:
+            return NOOP_SPAN
+        self.started += 1
+        trace = _Trace(sampled)
+        span = _RootSpan(trace, name, KIND_SERVER, None, attributes)
+        span.tracer = self
+        trace.spans.append(span)
+        return span
+
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes) -> Span:
+        """Дочерний span текущей трассы"""
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        trace = parent.trace
+        if trace.closed or len(trace.spans) >= MAX_SPANS_PER_TRACE:
+            # Фоновая задача пережила обновление или трасса слишком длинная
+            trace.dropped += 1
+            return NOOP_SPAN
+        span = Span(trace, name, kind, parent.span_id, attributes)
+        trace.spans.append(span)
+        return span
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current_span.get()
+
+    @staticmethod
+    def set_root_attribute(key: str, value: Any):
+        """Атрибут корневого span текущего обновления"""
+        span = _current_span.get()
+        if span is not None:
+            span.trace.spans[0].set_attribute(key, value)
+
+    def _finish(self, root: Span):
+        trace = root.trace
+        if not trace.sampled:
+            slow = root.end_ns - root.start_ns >= self.slow_ns
+            failed = any(s.status == STATUS_ERROR for s in trace.spans)
+            if not (slow or failed):
+                return
+        if trace.dropped:
+            root.attributes['trace.dropped_spans'] = trace.dropped
+        if self._exporter is None:
+            self._exporter = TraceExporter(self.path)
+        self._exporter.export(tuple(trace.spans))
+        self.exported += 1
+
+    def stop(self):
+        if self._exporter is not None:
+            self._exporter.stop()
+            self._exporter = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {'started': self.started, 'exported': self.exported}
+
+
+# --- ЭКСПОРТ ---
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': k, 'value': _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def to_otlp(spans: tuple) -> Dict[str, Any]:
+    """Трасса в формате OTLP/JSON (ExportTraceServiceRequest)"""
+    otlp_spans = []
+    for span in spans:
+        item = {
+            'traceId': span.trace.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': span.kind,
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns or span.start_ns),
+            'attributes': _otlp_attributes(span.attributes),
+            'status': {'code': span.status},
+        }
+        if span.parent_id:
+            item['parentSpanId'] = span.parent_id
+        if span.status_message:
+            item['status']['message'] = span.status_message
+        otlp_spans.append(item)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({
+                'service.name': SERVICE_NAME,
+                'process.pid': os.getpid(),
+            })},
+            'scopeSpans': [{'scope': {'name': 'driver_rating_bot'}, 'spans': otlp_spans}],
+        }]
+    }
+
+
+class TraceExporter:
+    """Фоновый поток: сериализация и запись трасс с ротацией файла"""
+
+    _STOP = object()
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(exist_ok=True)
+        self._handler = RotatingFileHandler(
+            path, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding='utf-8'
+        )
+        self._handler.setFormatter(logging.Formatter('%(message)s'))
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def export(self, spans: tuple):
+        self._queue.put(spans)
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            if spans is self._STOP:
+                break
+            try:
+                line = json.dumps(to_otlp(spans), ensure_ascii=False, separators=(',', ':'))
+                # RotatingFileHandler сам ротирует файл по размеру
+                self._handler.handle(logging.makeLogRecord({'msg': line}))
+            except Exception as e:
+                logger.warning("Не удалось записать трассу: %s", e)
+        self._handler.close()
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout=5)
+
+
+# Глобальный трассировщик процесса
+tracer = Tracer(
+    enabled=config.TRACING_ENABLED,
+    sample_rate=config.TRACE_SAMPLE_RATE,
+    slow_ms=config.TRACE_SLOW_MS,
+    path=Path("logs") / config.TRACE_FILE
+)
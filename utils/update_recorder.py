@@ -0,0 +1,248 @@
+"""
+Запись входящих обновлений для воспроизведения (benchmarks/replay.py).
+
+Включается RECORD_UPDATES_ENABLED. Каждое обновление - строка JSON
+{"t": время получения, "u": обновление} в logs/RECORD_UPDATES_FILE,
+сжатом gzip. Файл только дописывается (новый gzip-член на каждый
+сброс), при превышении RECORD_UPDATES_MAX_MB ротируется: .1, .2, ...
+
+Перед записью обновление обезличивается:
+- id пользователей и чатов заменяются на HMAC-SHA256 от id с ключом
+  RECORD_UPDATES_SECRET - один и тот же пользователь получает один и
+  тот же псевдоним, поэтому его сессии и FSM воспроизводятся как были;
+- имена заменяются на "User"; username, телефоны, vCard контактов и
+  адреса удаляются;
+- координаты округляются до ~1 км;
+- админ (ADMIN_ID) получает фиксированный ADMIN_PSEUDO_ID, чтобы при
+  воспроизведении работала админка.
+В текстах и подписях телефоны и ИИН маскируются так же, как в отзывах
+(utils/text_filter.py), остальное не меняется: номера и нажатия кнопок -
+то, ради чего трафик записывается.
+
+RECORD_UPDATES_SAMPLE_RATE - доля пользователей (не обновлений): сессии
+выбранных пользователей записываются целиком.
+
+Сериализация, сжатие и запись - в фоновом потоке.
+"""
+import atexit
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import config
+from utils.logger import logger
+from utils.text_filter import mask_pii
+
+# Псевдоним админа в записи
+ADMIN_PSEUDO_ID = 1
+
+RECORD_FILE_BACKUPS = 10
+
+# Поля с пользователем или чатом (их id заменяется псевдонимом)
+PERSON_KEYS = {
+    'from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat',
+    'new_chat_member', 'old_chat_member', 'left_chat_member', 'new_chat_members', 'contact',
+}
+# Удаляются везде
+PRIVATE_KEYS = {'username', 'last_name', 'phone_number', 'vcard', 'title', 'address', 'bio', 'email'}
+# Тексты, в которых маскируются телефоны и ИИН
+TEXT_KEYS = {'text', 'caption'}
+# Координаты округляются: 2 знака - около километра
+COORDINATE_KEYS = {'latitude', 'longitude'}
+COORDINATE_DIGITS = 2
+
+# Сброс в файл не реже, чем раз в столько секунд
+FLUSH_INTERVAL = 5.0
+
+
+def pseudonymize(value: int, secret: bytes, admin_id: Optional[int] = None) -> int:
+    """Стабильный псевдоним id; знак сохраняется (у групп id отрицательные)"""
+    if admin_id is not None and value == admin_id:
+        return ADMIN_PSEUDO_ID
+    digest = hmac.new(secret, str(abs(value)).encode(), hashlib.sha256).digest()
+    # 48 бит: коллизии на миллионах пользователей практически исключены
+    pseudo = int.from_bytes(digest[:6], 'big') + 1_000_000_000
+    return -pseudo if value < 0 else pseudo
+
+
+def anonymize(update: Dict[str, Any], secret: bytes, admin_id: Optional[int] = None) -> Dict[str, Any]:
+    """Копия обновления без персональных данных"""
+    def person(obj: Dict[str, Any]) -> Dict[str, Any]:
+        obj = walk(obj)
+        if obj.get('is_bot'):
+            return obj
+        if isinstance(obj.get('id'), int):
+            obj['id'] = pseudonymize(obj['id'], secret, admin_id)
+        if 'first_name' in obj:
+            obj['first_name'] = 'User'
+        return obj
+
+    def walk(value: Any) -> Any:
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, item in value.items():
+            if key in PRIVATE_KEYS:
+                continue
+            if key in PERSON_KEYS and isinstance(item, dict):
+                result[key] = person(item)
+            elif key in PERSON_KEYS and isinstance(item, list):
+                result[key] = [person(i) if isinstance(i, dict) else i for i in item]
+            elif key == 'user_id' and isinstance(item, int):
+                result[key] = pseudonymize(item, secret, admin_id)
+            elif key in TEXT_KEYS and isinstance(item, str):
+                result[key] = mask_pii(item)[0]
+            elif key in COORDINATE_KEYS and isinstance(item, (int, float)):
+                result[key] = round(item, COORDINATE_DIGITS)
+            else:
+                result[key] = walk(item)
+        return result
+
+    return walk(update)
+
+
+def sender_id(update: Dict[str, Any]) -> Optional[int]:
+    """id отправителя обновления"""
+    for key, value in update.items():
+        if isinstance(value, dict):
+            user = value.get('from') or value.get('user')
+            if isinstance(user, dict):
+                return user.get('id')
+    return None
+
+
+def recording_files(path: Path) -> List[Path]:
+    """Файлы записи от старых к новым: path.N, ..., path.1, path"""
+    backups = [path.with_name(f"{path.name}.{i}") for i in range(RECORD_FILE_BACKUPS, 0, -1)]
+    return [p for p in backups + [path] if p.exists()]
+
+
+def read_recording(paths: List[Path]) -> Iterator[Dict[str, Any]]:
+    """Записи {'t': ..., 'u': ...} по порядку; оборванный хвост файла пропускается"""
+    for path in paths:
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # Строка, недописанная при аварийной остановке
+                        continue
+        except (EOFError, gzip.BadGzipFile) as e:
+            logger.warning("Файл записи %s оборван: %s", path, e)
+
+
+class UpdateRecorder:
+    """Обезличивает обновления и дописывает их в сжатый файл"""
+
+    _STOP = object()
+
+    def __init__(self, enabled: bool, path: Path, secret: str, sample_rate: float, max_bytes: int):
+        self.enabled = enabled
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        if secret:
+            self._secret = secret.encode()
+        else:
+            # Без ключа псевдонимы меняются при каждом перезапуске
+            self._secret = os.urandom(32)
+            if enabled:
+                logger.warning("⚠️ RECORD_UPDATES_SECRET не задан: псевдонимы действуют до перезапуска")
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._recorded = 0
+        self._dropped = 0
+
+    def record(self, update: Dict[str, Any]):
+        """Ставит обновление в очередь записи (без обращения к диску)"""
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self._start()
+        self._queue.put((time.time(), update))
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.path.parent.mkdir(exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='update-recorder', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            logger.info("📼 Запись обновлений в %s", self.path)
+
+    def _sampled(self, update: Dict[str, Any]) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        user_id = sender_id(update)
+        if user_id is None:
+            return False
+        digest = hmac.new(self._secret, f"sample:{user_id}".encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:4], 'big') < self.sample_rate * 2 ** 32
+
+    def _run(self):
+        file = None
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            try:
+                if item is not None and self._sampled(item[1]):
+                    if file is None:
+                        file = gzip.open(self.path, 'at', encoding='utf-8')
+                    record = {'t': round(item[0], 3), 'u': anonymize(item[1], self._secret, config.ADMIN_ID)}
+                    file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    self._recorded += 1
+                if file is not None and time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    # Закрытие дописывает gzip-член целиком: файл читается даже после падения процесса
+                    file.close()
+                    file = None
+                    last_flush = time.monotonic()
+                    self._rotate_if_needed()
+            except Exception as e:
+                self._dropped += 1
+                logger.warning("Не удалось записать обновление: %s", e)
+        if file is not None:
+            file.close()
+
+    def _rotate_if_needed(self):
+        if not self.path.exists() or self.path.stat().st_size < self.max_bytes:
+            return
+        for i in range(RECORD_FILE_BACKUPS - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{i}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'enabled': self.enabled, 'recorded': self._recorded, 'dropped': self._dropped}
+
+
+# Глобальный регистратор процесса
+update_recorder = UpdateRecorder(
+    enabled=config.RECORD_UPDATES_ENABLED,
+    path=Path("logs") / config.RECORD_UPDATES_FILE,
+    secret=config.RECORD_UPDATES_SECRET,
+    sample_rate=config.RECORD_UPDATES_SAMPLE_RATE,
+    max_bytes=int(config.RECORD_UPDATES_MAX_MB * 1024 * 1024)
+)
@@ -2,12 +2,38 @@
 Валидаторы для проверки пользовательского ввода.
 """
 import re
+from functools import lru_cache
 from typing import Optional
 
+# Кириллические буквы, которые на номерах выглядят как латинские.
+# Казахстанские номера пишутся латиницей, поэтому "777АВС02", набранный
+# кириллицей, должен давать тот же ключ, что и "777ABC02".
+# Эта же пара строк используется в SQL translate() скрипта renormalize_plates.py
+HOMOGLYPHS_CYRILLIC = 'АВЕКМНОРСТУХІ'
+HOMOGLYPHS_LATIN = 'ABEKMHOPCTYXI'
+_HOMOGLYPH_TABLE = str.maketrans(HOMOGLYPHS_CYRILLIC, HOMOGLYPHS_LATIN)
+
+_NON_PLATE_CHARS = re.compile(r'[^A-ZА-Я0-9]')
+
+
+@lru_cache(maxsize=8192)
+def canonical_plate(plate: str) -> str:
+    """
+    Приводит номер к каноническому ключу: верхний регистр, кириллические
+    двойники заменены латиницей, лишние символы удалены.
+    
+    Args:
+        plate: Исходный номер
+        
+    Returns:
+        Канонический номер
+    """
+    return _NON_PLATE_CHARS.sub('', plate.upper().translate(_HOMOGLYPH_TABLE))
+
 
 def clean_plate(plate: str) -> str:
     """
-    Очищает номер от лишних символов и приводит к верхнему регистру.
+    Очищает номер от лишних символов и приводит к каноническому виду.
     
     Args:
         plate: Исходный номер
@@ -15,7 +41,7 @@ def clean_plate(plate: str) -> str:
     Returns:
         Очищенный номер (только буквы и цифры)
     """
-    return re.sub(r'[^A-ZА-Я0-9]', '', plate.upper())
+    return canonical_plate(plate)
 
 
 def validate_plate(plate: str) -> tuple[bool, Optional[str]]:
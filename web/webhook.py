@@ -0,0 +1,158 @@
+"""
+Webhook-сервер на aiohttp: альтернатива long polling.
+
+Принимает обновления от Telegram, проверяет секретный токен и складывает
+их в ограниченную очередь, которую разбирают фоновые воркеры.
+Отдает /healthz и /readyz для балансировщика нагрузки.
+"""
+import asyncio
+import hmac
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+from config import config
+from database.db_manager import db
+from utils.logger import logger
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """HTTP-сервер для приема обновлений Telegram через вебхук"""
+
+    def __init__(
+        self,
+        bot: Bot,
+        dp: Dispatcher,
+        queue_size: int = 1000,
+        workers: int = 16
+    ):
+        self.bot = bot
+        self.dp = dp
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.workers_count = workers
+        self._workers: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+        self._ready = False
+        self._secret = config.WEBHOOK_SECRET.encode()
+
+    # --- HTTP ОБРАБОТЧИКИ ---
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Принимает обновление и ставит его в очередь"""
+        token = request.headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(token, self._secret):
+            logger.warning("Отклонен запрос вебхука с неверным токеном от %s", request.remote)
+            return web.Response(status=401)
+
+        if not self._ready:
+            # Telegram повторит доставку позже
+            return web.Response(status=503)
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Очередь переполнена - просим Telegram повторить, а не копим память
+            logger.warning("Очередь вебхука переполнена, обновление отклонено")
+            return web.Response(status=503)
+
+        return web.Response(status=200)
+
+    async def health(self, request: web.Request) -> web.Response:
+        """Liveness: процесс жив и отвечает"""
+        return web.json_response({'status': 'ok'})
+
+    async def ready(self, request: web.Request) -> web.Response:
+        """Readiness: можно ли направлять трафик на этот инстанс"""
+        checks = self.readiness_checks()
+        status = 200 if all(checks.values()) else 503
+        return web.json_response(
+            {'ready': status == 200, 'checks': checks, 'queue': self.queue.qsize()},
+            status=status
+        )
+
+    def readiness_checks(self) -> Dict[str, bool]:
+        """Набор проверок готовности"""
+        return {
+            'started': self._ready,
+            'database': db.pool is not None,
+            'queue': self.queue_has_room(),
+        }
+
+    def queue_has_room(self) -> bool:
+        """Очередь заполнена меньше чем на 90% (maxsize=0 - без ограничения)"""
+        return self.queue.maxsize <= 0 or self.queue.qsize() < self.queue.maxsize * 0.9
+
+    # --- ОБРАБОТКА ОЧЕРЕДИ ---
+
+    async def _worker(self, index: int):
+        """Разбирает очередь и передает обновления в диспетчер"""
+        while True:
+            update = await self.queue.get()
+            update_id = None
+            try:
+                update_id = update.get('update_id')
+                await self.process_update(update)
+            except Exception as e:
+                # Обработчик ошибок не должен падать сам: иначе воркер теряется насовсем
+                logger.error("Ошибка обработки обновления %s: %s", update_id, e)
+            finally:
+                self.queue.task_done()
+
+    async def process_update(self, update: Dict[str, Any]):
+        """Передает одно обновление в диспетчер"""
+        await self.dp.feed_raw_update(self.bot, update)
+
+    # --- ЖИЗНЕННЫЙ ЦИКЛ ---
+
+    def build_app(self) -> web.Application:
+        """Создает aiohttp-приложение с маршрутами"""
+        app = web.Application()
+        app.router.add_post(config.WEBHOOK_PATH, self.handle_update)
+        app.router.add_get("/healthz", self.health)
+        app.router.add_get("/readyz", self.ready)
+        return app
+
+    async def start(self, host: str, port: int):
+        """Запускает воркеры и HTTP-сервер"""
+        self._workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(self.workers_count)
+        ]
+
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        self._ready = True
+        logger.info("🌐 Webhook-сервер слушает %s:%s%s", host, port, config.WEBHOOK_PATH)
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Останавливает прием, дорабатывает очередь и гасит воркеры"""
+        self._ready = False
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не дождались обработки очереди, осталось %s обновлений", self.queue.qsize())
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+        logger.info("🌐 Webhook-сервер остановлен")